@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, redirect, send_file, stream_with_context, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import uuid
 import base64
@@ -11,24 +12,44 @@ from clarifai_grpc.grpc.api.status import status_code_pb2
 from supabase import create_client, Client
 import traceback
 import json
-import tempfile
+import math
 import re
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import nltk
-import requests
 import time
+import hashlib
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import grpc
 import groq
+from translation import Translator, TranslationCache
+from language_detection import needs_translation
+from kb_bundles import KnowledgeBaseBundles, DEFAULT_BUNDLE_DIR
+from knowledge_base import KnowledgeBase, DEFAULT_COMPILED_PATH, DEFAULT_SOURCE_PATH
+from kb_retrieval import ContextRetriever
+from chat_router import ChatRouter, scan_message
+from chat_sessions import ChatSessionStore
+from treatment_summaries import TreatmentSummaries, DEFAULT_SUMMARY_DIR
+from deadlines import RequestDeadlines, DeadlineExceeded
+from bulkheads import Bulkheads, BulkheadFull
+from access_tokens import bearer_subject
+from rate_limits import AdmissionController, Limit, MemoryBucketStore, SQLiteBucketStore
+from circuit_breaker import CircuitBreaker
+from prediction_cache import PredictionResultCache
+from prediction_wal import PredictionLog
+from idempotency import IdempotencyStore, CONFLICT, IN_PROGRESS, REPLAYED, replayable
+from uploads import UploadSessions, UploadError
 
-# Try to import Google Cloud TextToSpeech
-try:
-    from google.cloud import texttospeech
-    TEXT_TO_SPEECH_AVAILABLE = True
-except ImportError:
+# Google Cloud TextToSpeech is optional; tts_service handles the import
+from tts_service import TTSService, TTSJobQueue, TEXT_TO_SPEECH_AVAILABLE
+from audio_janitor import AudioJanitor
+from audio_pack import AudioPack, DEFAULT_PACK_DIR
+if not TEXT_TO_SPEECH_AVAILABLE:
     print("Google Cloud Text-to-Speech not available. Chat responses will not have audio.")
     print("To enable text-to-speech functionality, install the package with: pip install google-cloud-texttospeech")
-    TEXT_TO_SPEECH_AVAILABLE = False
 
 # Initialize variables at module level
 SUPABASE_URL = None
@@ -38,12 +59,71 @@ supabase = None
 # Load environment variables from .env file
 load_dotenv()
 
+# Total time budget per endpoint; every upstream call gets the time left
+request_deadlines = RequestDeadlines(
+    budgets={
+        'predict': float(os.environ.get("REQUEST_BUDGET_PREDICT", 20)),
+        'chatbot': float(os.environ.get("REQUEST_BUDGET_CHATBOT", 25)),
+        'treatment_bundle': float(os.environ.get("REQUEST_BUDGET_TREATMENT_BUNDLE", 20)),
+        'history': float(os.environ.get("REQUEST_BUDGET_HISTORY", 10))
+    },
+    default_budget=float(os.environ.get("REQUEST_BUDGET_DEFAULT", 15)),
+    min_stage_seconds=float(os.environ.get("REQUEST_MIN_STAGE_SECONDS", 0.25))
+)
+
+# One bounded worker pool and queue per upstream dependency, so a slow
+# dependency cannot take every request thread; /predict work runs before
+# /chatbot work, and both before TTS
+bulkheads = Bulkheads({
+    'clarifai': (int(os.environ.get("CLARIFAI_WORKERS", 8)), int(os.environ.get("CLARIFAI_QUEUE", 16))),
+    'supabase': (int(os.environ.get("SUPABASE_WORKERS", 8)), int(os.environ.get("SUPABASE_QUEUE", 32))),
+    'groq': (int(os.environ.get("GROQ_WORKERS", 8)), int(os.environ.get("GROQ_QUEUE", 16))),
+    'translation': (int(os.environ.get("TRANSLATION_POOL_SIZE", 10)), int(os.environ.get("TRANSLATION_QUEUE", 50))),
+    'tts': (int(os.environ.get("TTS_CHUNK_WORKERS", 4)), int(os.environ.get("TTS_QUEUE", 20)))
+})
+
+# Token buckets per user and overall, protecting the Clarifai and Groq quotas.
+# RATE_LIMIT_PATH shares the buckets between the worker processes of a host
+rate_limit_store = None
+if os.environ.get("RATE_LIMIT_PATH"):
+    try:
+        rate_limit_store = SQLiteBucketStore(os.environ["RATE_LIMIT_PATH"])
+        print(f"Rate limits shared through {os.environ['RATE_LIMIT_PATH']}")
+    except Exception as e:
+        print(f"Could not open shared rate limit store, limiting per process: {str(e)}")
+admission = AdmissionController(
+    limits={
+        'predict': {
+            'user': Limit(float(os.environ.get("RATE_LIMIT_PREDICT_PER_USER", 10)), int(os.environ.get("RATE_LIMIT_PREDICT_USER_BURST", 5))),
+            'global': Limit(float(os.environ.get("RATE_LIMIT_PREDICT_GLOBAL", 120)), int(os.environ.get("RATE_LIMIT_PREDICT_GLOBAL_BURST", 30)))
+        },
+        'chatbot': {
+            'user': Limit(float(os.environ.get("RATE_LIMIT_CHATBOT_PER_USER", 20)), int(os.environ.get("RATE_LIMIT_CHATBOT_USER_BURST", 10))),
+            'global': Limit(float(os.environ.get("RATE_LIMIT_CHATBOT_GLOBAL", 300)), int(os.environ.get("RATE_LIMIT_CHATBOT_GLOBAL_BURST", 60)))
+        }
+    },
+    store=rate_limit_store or MemoryBucketStore(),
+    enabled=os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+)
+
 app = Flask(__name__)
-CORS(app)  # Enable CORS for cross-origin requests from frontend
+CORS(app, expose_headers=['Retry-After', 'Idempotent-Replayed'])  # Enable CORS for cross-origin requests from frontend
 
 # Set up static folder for serving TTS audio files
 app.static_folder = 'static'
 
+# Let a fronting proxy (e.g. nginx) send audio files itself when configured
+app.config['USE_X_SENDFILE'] = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
+
+# Behind TRUSTED_PROXY_HOPS reverse proxies, the client address is the one the
+# outermost of them appended to X-Forwarded-For; anything before it is client-supplied
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+# Verifies Supabase access tokens, so rate limits key on the signed-in user
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+
 # Configure Clarifai API credentials
 CLARIFAI_PAT = os.environ.get("CLARIFAI_PAT")
 if not CLARIFAI_PAT:
@@ -88,10 +168,20 @@ GROQ_MODELS = {
     'primary': 'llama3-70b-8192',  # Powerful primary model
     'fallback': 'llama3-8b-8192'   # Smaller fallback model
 }
+# Reported as the model for answers served from the knowledge base without an LLM call
+KNOWLEDGE_BASE_MODEL = 'knowledge-base'
+CHAT_ERROR_RESPONSE = "I'm sorry, I'm having trouble connecting to my knowledge base right now. Please try again in a few moments."
+CHAT_UNAVAILABLE_RESPONSE = "I'm currently operating with limited capabilities. Please ensure Groq API is properly configured."
+# How often each model was chosen first for a chat message; chat messages
+# are handled on many request and bulkhead threads at once
+model_route_counts = {'primary': 0, 'fallback': 0}
+model_route_lock = threading.Lock()
 
 if GROQ_API_KEY:
     try:
-        groq_client = groq.Client(api_key=GROQ_API_KEY)
+        # No SDK retries: the fallback model is the retry, and retries of a
+        # timed-out call would run past the request deadline
+        groq_client = groq.Client(api_key=GROQ_API_KEY, max_retries=0)
         print(f"Successfully initialized Groq client with API key prefix: {GROQ_API_KEY[:5] if len(GROQ_API_KEY) > 5 else '***'}...")
         GROQ_AVAILABLE = True
         
@@ -105,97 +195,219 @@ if GROQ_API_KEY:
 else:
     print("GROQ_API_KEY environment variable is not set. Groq LLM will not be available.")
 
+# Shared translation client: pooled keep-alive session plus LRU+TTL cache
+translator = Translator(
+    cache=TranslationCache(
+        max_entries=int(os.environ.get("TRANSLATION_CACHE_SIZE", 2000)),
+        ttl_seconds=int(os.environ.get("TRANSLATION_CACHE_TTL", 24 * 3600)),
+        persistent_path=os.environ.get("TRANSLATION_CACHE_PATH") or None
+    ),
+    timeout=(3.05, float(os.environ.get("TRANSLATION_TIMEOUT", 10))),
+    pool_size=int(os.environ.get("TRANSLATION_POOL_SIZE", 10)),
+    on_timeout=lambda: request_deadlines.record_timeout('translation'),
+    executor=bulkheads['translation']
+)
+
+# Plant disease knowledge base, compiled from data/knowledge_base.json and
+# hot-reloaded when the compiled file changes
+knowledge_base = KnowledgeBase(
+    compiled_path=os.environ.get("KB_COMPILED_PATH", DEFAULT_COMPILED_PATH),
+    source_path=os.environ.get("KB_SOURCE_PATH", DEFAULT_SOURCE_PATH),
+    check_interval=float(os.environ.get("KB_RELOAD_INTERVAL", 5))
+)
+
+# Precomputed knowledge-base translations, built offline with kb_bundles.py
+kb_bundles = KnowledgeBaseBundles(os.environ.get("KB_BUNDLE_DIR", DEFAULT_BUNDLE_DIR))
+
+# LLM treatment summaries per disease class and language, built offline with treatment_summaries.py
+treatment_summaries = TreatmentSummaries(
+    os.environ.get("TREATMENT_SUMMARY_DIR", DEFAULT_SUMMARY_DIR),
+    check_interval=float(os.environ.get("TREATMENT_SUMMARY_RELOAD_INTERVAL", 30))
+)
+
+# BM25 retrieval of knowledge-base passages for chatbot prompts
+context_retriever = ContextRetriever(
+    knowledge_base,
+    max_passages=int(os.environ.get("CHAT_CONTEXT_PASSAGES", 4)),
+    max_tokens=int(os.environ.get("CHAT_CONTEXT_TOKENS", 600)),
+    min_score=float(os.environ.get("CHAT_SMALL_MODEL_MIN_SCORE", 3.0))
+)
+
+# Answers clear disease questions from the knowledge base before falling back to the LLM
+chat_router = ChatRouter(
+    knowledge_base,
+    translate_known=kb_bundles.translate_known,
+    translate=lambda text, language_code: translate_text(text, language_code, 'en'),
+    max_words=int(os.environ.get("CHAT_FAST_PATH_MAX_WORDS", 30))
+)
+
+# Server-side conversation history for multi-turn chats
+chat_sessions = ChatSessionStore(
+    max_sessions=int(os.environ.get("CHAT_SESSION_MAX", 1000)),
+    ttl_seconds=int(os.environ.get("CHAT_SESSION_TTL", 1800)),
+    persistent_path=os.environ.get("CHAT_SESSION_PATH") or None,
+    max_turns=int(os.environ.get("CHAT_SESSION_MAX_TURNS", 12))
+)
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", 600))
+
+# Assembled /treatment_bundle payloads, keyed by disease, language and data versions
+treatment_bundle_cache = TranslationCache(
+    max_entries=int(os.environ.get("TREATMENT_BUNDLE_CACHE_SIZE", 500)),
+    ttl_seconds=int(os.environ.get("TREATMENT_BUNDLE_CACHE_TTL", 3600))
+)
+treatment_bundle_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TREATMENT_BUNDLE_WORKERS", 8)),
+    thread_name_prefix="treatment-bundle"
+)
+
+try:
+    print(f"Knowledge-base retrieval index ready: {len(context_retriever.index().passages)} passages")
+except Exception as e:
+    print(f"Error building knowledge-base retrieval index: {str(e)}")
+
 # Your specific Clarifai configuration
 USER_ID = 'xv221gj2xl57'
 APP_ID = 'CropCareProject'
 MODEL_ID = 'CC'
 MODEL_VERSION_ID = '8063e28392ff49dc9167993ce6f55b19'
 
+# Stop calling Clarifai while it keeps failing; /predict then answers from
+# recent results for the same or a near-identical image
+clarifai_breaker = CircuitBreaker(
+    'clarifai',
+    failure_threshold=int(os.environ.get("CLARIFAI_BREAKER_FAILURES", 5)),
+    slow_call_seconds=float(os.environ.get("CLARIFAI_BREAKER_SLOW_SECONDS", 10)),
+    reset_seconds=float(os.environ.get("CLARIFAI_BREAKER_RESET_SECONDS", 30))
+)
+prediction_results = PredictionResultCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_SIZE", 1000)),
+    max_distance=int(os.environ.get("PREDICTION_CACHE_MAX_DISTANCE", 6))
+)
+
+# Responses of /predict requests by Idempotency-Key, replayed to client retries
+idempotent_requests = IdempotencyStore(
+    max_entries=int(os.environ.get("IDEMPOTENCY_MAX_KEYS", 2000)),
+    ttl_seconds=float(os.environ.get("IDEMPOTENCY_TTL", 86400))
+)
+
+# Resumable uploads: images sent in chunks to a spool, then finalized into a prediction
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 256 * 1024))
+upload_sessions = UploadSessions(
+    os.environ.get("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "uploads")),
+    max_bytes=int(os.environ.get("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)),
+    ttl_seconds=float(os.environ.get("UPLOAD_TTL", 3600)),
+    max_sessions=int(os.environ.get("UPLOAD_MAX_SESSIONS", 200)),
+    max_attempts=int(os.environ.get("UPLOAD_MAX_FINALIZE_ATTEMPTS", 3))
+)
+
 # In-memory fallback for storing predictions when Supabase is not available
 in_memory_predictions = {}
 
-# Enhanced treatments with more detailed information
-treatments = {
-    "Apple___Apple_scab": {
-        "treatment": "Apply fungicide, remove infected leaves, improve air circulation around trees.",
-        "details": "Apple scab is a fungal disease that affects apple trees, causing dark, scaly lesions on leaves and fruit. To treat it, apply fungicide sprays according to label instructions, starting at bud break and continuing at 7-14 day intervals during rainy periods. Remove and destroy infected leaves and fallen debris. Prune trees to improve air circulation, which helps reduce humidity and infection rates."
-    },
-    "Apple___Black_rot": {
-        "treatment": "Prune infected branches, apply appropriate fungicides, remove mummified fruits.",
-        "details": "Black rot is a fungal disease affecting apples, causing leaf spots and fruit rot. Treatment includes pruning infected branches (cutting at least 8 inches below visible infection), applying fungicides labeled for black rot during the growing season, and removing all mummified fruits from trees and ground. Maintaining good orchard sanitation is essential for control."
-    },
-    "Apple___Cedar_apple_rust": {
-        "treatment": "Remove nearby cedar trees if possible, apply fungicides preventively.",
-        "details": "Cedar apple rust requires both cedar and apple trees to complete its life cycle. Remove nearby cedar trees if practical. Apply protective fungicides (like myclobutanil or propiconazole) starting at pink bud stage and continuing until about 2-3 weeks after petal fall. Some apple varieties have resistance to this disease."
-    },
-    "Apple___healthy": {
-        "treatment": "Continue good agricultural practices to maintain health.",
-        "details": "Your apple tree appears healthy. Continue with regular watering, appropriate fertilization, and preventive fungicide applications during the growing season to maintain plant health. Monitor regularly for early signs of diseases or pests."
-    },
-    # Additional detailed treatments for other diseases
-    "Tomato___Early_blight": {
-        "treatment": "Apply fungicides, remove lower infected leaves, mulch around plants.",
-        "details": "Early blight is caused by the fungus Alternaria solani. Remove and destroy infected lower leaves. Apply copper-based fungicides or approved commercial fungicides every 7-10 days. Mulch around the base of plants to prevent spores splashing from soil to leaves. Provide adequate spacing between plants for good air circulation and avoid overhead watering."
-    },
-    "Tomato___Late_blight": {
-        "treatment": "Apply fungicides, remove infected plants, ensure proper spacing.",
-        "details": "Late blight is caused by Phytophthora infestans, the same pathogen that caused the Irish potato famine. It spreads rapidly in cool, wet conditions. Apply copper-based fungicides or specific late blight fungicides preventatively. Remove and destroy infected plants immediately to prevent spread. Space plants properly and stake them to improve air circulation. Water at the base and avoid overhead irrigation."
-    },
-    "Potato___Early_blight": {
-        "treatment": "Apply fungicides, ensure proper spacing, avoid overhead irrigation.",
-        "details": "For potato early blight, apply approved fungicides like chlorothalonil or copper-based products when plants are 6-8 inches tall, and continue at 7-10 day intervals. Remove and destroy infected leaves. Practice crop rotation (3-4 year cycle). Maintain adequate soil fertility as stressed plants are more susceptible. Water at the base of plants to keep foliage dry."
-    },
-    "Grape___Black_rot": {
-        "treatment": "Apply fungicides, prune infected areas, improve air flow in the canopy.",
-        "details": "Black rot in grapes requires integrated management. Apply fungicides like myclobutanil or mancozeb starting at bud break and continuing until veraison (when grapes begin to ripen). Timing is critical—ensure coverage before rain events. Prune and destroy infected wood in winter. Remove mummified berries and infected leaves. Train vines to maximize air circulation and sun exposure."
-    }
-}
+def endpoint_name(path):
+    """Budget name of a request path: '/treatment_bundle' -> 'treatment_bundle'"""
+    return path.strip('/').split('/')[0] or 'index'
 
-# Basic treatments for other diseases
-basic_treatments = {
-    "Blueberry___healthy": "Continue good agricultural practices to maintain health.",
-    "Cherry___healthy": "Continue good agricultural practices to maintain health.",
-    "Cherry___Powdery_mildew": "Apply sulfur-based fungicides, ensure proper spacing for air circulation.",
-    "Corn___Cercospora_leaf_spot": "Rotate crops, apply appropriate fungicides, remove crop debris.",
-    "Corn___Common_rust": "Apply fungicides, plant resistant varieties, avoid overhead irrigation.",
-    "Corn___healthy": "Continue good agricultural practices to maintain health.",
-    "Corn___Northern_Leaf_Blight": "Apply fungicides, crop rotation, till under crop debris after harvest.",
-    "Grape___Esca": "Prune during dry weather, apply wound protectants, remove infected vines.",
-    "Grape___healthy": "Continue good agricultural practices to maintain health.",
-    "Grape___Leaf_blight": "Apply fungicides, proper canopy management, sanitize equipment.",
-    "Orange___Haunglongbing": "Remove infected trees, control psyllid vectors, use disease-free nursery stock.",
-    "Peach___Bacterial_spot": "Apply copper-based sprays, prune during dry weather, avoid overhead irrigation.",
-    "Peach___healthy": "Continue good agricultural practices to maintain health.",
-    "Pepper___Bacterial_spot": "Rotate crops, use copper-based fungicides, avoid working with wet plants.",
-    "Pepper___healthy": "Continue good agricultural practices to maintain health.",
-    "Potato___healthy": "Continue good agricultural practices to maintain health.",
-    "Potato___Late_blight": "Apply fungicides, destroy infected plants, harvest during dry weather.",
-    "Squash___Powdery_mildew": "Apply fungicides, space plants for good air circulation, water at base.",
-    "Strawberry___healthy": "Continue good agricultural practices to maintain health.",
-    "Strawberry___Leaf_scorch": "Remove infected leaves, apply fungicides, provide adequate spacing.",
-    "Tomato___Bacterial_spot": "Rotate crops, use copper-based sprays, avoid overhead irrigation.",
-    "Tomato___healthy": "Continue good agricultural practices to maintain health.",
-    "Tomato___Leaf_Mold": "Improve air circulation, reduce humidity, apply fungicides.",
-    "Tomato___Septoria_leaf_spot": "Apply fungicides, avoid watering leaves, practice crop rotation.",
-    "Tomato___Spider_mites": "Apply miticides, increase humidity, introduce predatory mites.",
-    "Tomato___Target_Spot": "Apply fungicides, practice crop rotation, avoid overhead irrigation.",
-    "Tomato___Mosaic_virus": "Remove and destroy infected plants, control aphids, disinfect tools."
-}
+@app.before_request
+def start_request_deadline():
+    g.deadline_token = request_deadlines.start(endpoint_name(request.path))
+
+@app.teardown_request
+def finish_request_deadline(error=None):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        request_deadlines.finish(token)
+
+def rate_limit_key(authorization, client_address):
+    """
+    Whose bucket a request draws from: the user of a verified access token in
+    the Authorization header, else the client address. The user_id a client
+    sends in the body is not checked, so it never selects a bucket.
+    """
+    user_id = bearer_subject(authorization, SUPABASE_JWT_SECRET)
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{client_address}"
+
+def rate_limit_error(endpoint, user_key):
+    """(payload, 429, headers) when a request is over its rate limit, else None"""
+    admitted, retry_after = admission.admit(endpoint, user_key)
+    if admitted:
+        return None
+    seconds = max(1, math.ceil(retry_after))
+    print(f"Rate limited {endpoint} request from {user_key} for {seconds}s")
+    return {
+        "success": False,
+        "error": f"Too many requests. Please try again in {seconds} seconds.",
+        "retryAfter": seconds
+    }, 429, {"Retry-After": str(seconds)}
+
+@app.before_request
+def admit_request():
+    endpoint = endpoint_name(request.path)
+    if request.method != 'POST' or endpoint not in admission.limits:
+        return None
+    # Replaying a stored response costs nothing upstream; any other finalize
+    # calls Clarifai and is charged like a /predict request
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if request.endpoint == 'finalize_upload':
+        idempotency_key = finalize_key(request.view_args['upload_id'])
+    if idempotency_key and idempotent_requests.has_response(idempotency_key):
+        return None
+    error = rate_limit_error(endpoint, rate_limit_key(request.headers.get('Authorization'), request.remote_addr))
+    if error is not None:
+        payload, status, headers = error
+        return jsonify(payload), status, headers
+    return None
+
+def upstream_call(dependency, stage, call):
+    """
+    Run a blocking upstream call on its dependency's bulkhead and wait for it
+    within the request deadline. Raises BulkheadFull when the dependency's
+    queue is full and DeadlineExceeded when the request runs out of time
+    first (the Supabase client, for one, has no per-call timeout).
+    """
+    timeout = request_deadlines.timeout(stage)
+    future = bulkheads[dependency].submit(call)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        request_deadlines.record_timeout(stage)
+        raise DeadlineExceeded(stage)
+
+def busy_response(error):
+    """(payload, 503) for a call shed by a full bulkhead, else None"""
+    if not isinstance(error, BulkheadFull):
+        return None
+    print(f"Shedding request: {str(error)}")
+    return {
+        "success": False,
+        "error": "The server is busy right now. Please try again in a few seconds.",
+        "busy": error.dependency
+    }, 503
 
 # Disease treatment information
-def get_treatment_for_disease(disease_name):
+def localized_treatment_tables(language_code='en-US'):
+    """Treatment tables in the requested language, from the precomputed bundles"""
+    kb = knowledge_base.snapshot()
+    return (
+        kb_bundles.localize('treatments', kb.treatments, language_code),
+        kb_bundles.localize('basic_treatments', kb.basic_treatments, language_code)
+    )
+
+def get_treatment_for_disease(disease_name, language_code='en-US'):
     """Get detailed treatment information for a detected disease"""
-    global treatments, basic_treatments
+    detailed, basic = localized_treatment_tables(language_code)
     
     # Special case for Applescab - handle directly
     if disease_name.lower() == "applescab":
         print("Special case: Applescab detected, returning Apple___Apple_scab treatment")
-        return treatments["Apple___Apple_scab"]["details"]
+        return detailed["Apple___Apple_scab"]["details"]
     
     # First try the direct disease name
-    if disease_name in treatments:
+    if disease_name in detailed:
         print(f"Found treatment for exact match: {disease_name}")
-        return treatments[disease_name]["details"]
+        return detailed[disease_name]["details"]
     
     # Try various formats of the disease name
     cleaned_names = [
@@ -211,34 +423,34 @@ def get_treatment_for_disease(disease_name):
     
     # Try to match with treatments
     for name in cleaned_names:
-        if name in treatments:
+        if name in detailed:
             print(f"Found treatment using cleaned name: {name}")
-            return treatments[name]["details"]
+            return detailed[name]["details"]
         
     # Check for partial matches in treatments
-    for treatment_key in treatments.keys():
+    for treatment_key in detailed.keys():
         for name in cleaned_names:
             if name in treatment_key or treatment_key in name:
                 print(f"Found treatment using partial match: '{name}' in '{treatment_key}'")
-                return treatments[treatment_key]["details"]
+                return detailed[treatment_key]["details"]
     
     # Try direct disease name
-    if disease_name in basic_treatments:
+    if disease_name in basic:
         print(f"Found basic treatment for direct match: {disease_name}")
-        return basic_treatments[disease_name]
+        return basic[disease_name]
     
     # Try cleaned names in basic treatments
     for name in cleaned_names:
-        if name in basic_treatments:
+        if name in basic:
             print(f"Found basic treatment using cleaned name: {name}")
-            return basic_treatments[name]
+            return basic[name]
             
     # Check for partial matches in basic treatments
-    for treatment_key in basic_treatments.keys():
+    for treatment_key in basic.keys():
         for name in cleaned_names:
             if name in treatment_key or treatment_key in name:
                 print(f"Found basic treatment using partial match: '{name}' in '{treatment_key}'")
-                return basic_treatments[treatment_key]
+                return basic[treatment_key]
     
     # Try to match based on the crop type and disease type
     if '___' in disease_name:
@@ -246,111 +458,346 @@ def get_treatment_for_disease(disease_name):
         print(f"Trying to match based on crop type '{crop_type}' and disease type '{disease_type}'")
         
         # Look for similar disease in other crops
-        for key in treatments.keys():
+        for key in detailed.keys():
             if disease_type in key:
                 print(f"Found similar disease in treatments: {key}")
-                return f"Treatment for {disease_name}: Similar to {key} - {treatments[key]['details']}"
+                return f"Treatment for {disease_name}: Similar to {key} - {detailed[key]['details']}"
         
-        for key in basic_treatments.keys():
+        for key in basic.keys():
             if disease_type in key:
                 print(f"Found similar disease in basic treatments: {key}")
-                return f"Treatment for {disease_name}: Similar to {key} - {basic_treatments[key]}"
+                return f"Treatment for {disease_name}: Similar to {key} - {basic[key]}"
     
     print(f"No specific treatment found for: {disease_name}")
     return f"No specific treatment information available for {disease_name}. Consult a local agricultural extension office for personalized advice based on your location and specific conditions."
 
+def get_treatment_summary(disease_name, language_code='en-US', kb=None):
+    """
+    Precomputed LLM summary entry for a disease class, or None when there is
+    none or it was generated from treatment notes that have changed since
+    """
+    kb = kb or knowledge_base.snapshot()
+    class_keys = kb.all_treatment_keys
+    if disease_name not in class_keys:
+        compact = re.sub(r'[\s_-]+', '', disease_name.lower())
+        disease_name = next((key for key in class_keys if re.sub(r'[\s_-]+', '', key.lower()) == compact), None)
+        if disease_name is None:
+            return None
+    return treatment_summaries.get(disease_name, language_code, kb)
+
 # Function to translate text using Google Translate
-def translate_text(text, target_language):
+def translate_text(text, target_language, source_language='auto'):
     """Translate text to the specified language"""
-    if target_language.startswith('en'):
-        # No need to translate if target is English
-        print("Target language is English, no translation needed")
+    if source_language == 'auto':
+        # Detect the source locally so text already in the target language
+        # never reaches the translation API
+        needed, source_language = needs_translation(text, target_language)
+        if not needed:
+            print(f"Text is already in {target_language}, no translation needed")
+            return text
+    
+    try:
+        timeout = request_deadlines.timeout('translation')
+    except DeadlineExceeded:
+        print("No time left in the request budget, returning the text untranslated")
         return text
     
-    # Extract just the language code if a locale is provided
-    if '-' in target_language:
-        target_language = target_language.split('-')[0]
-    
-    # Map to language codes supported by the translation API
-    language_map = {
-        'en': 'en',   # English
-        'hi': 'hi',   # Hindi
-        'te': 'te',   # Telugu
-        'ta': 'ta',   # Tamil
-        'kn': 'kn',   # Kannada
-        'ml': 'ml'    # Malayalam
+    print(f"Translating text from {source_language} to {target_language} (length: {len(text)})")
+    translated_text = translator.translate(text, target_language, source_language, timeout=timeout)
+    if translated_text != text:
+        print(f"Translation successful: {translated_text[:100]}...")
+    return translated_text
+
+def clarifai_metadata():
+    """gRPC metadata authenticating with the Clarifai PAT"""
+    return (("authorization", f"Key {CLARIFAI_PAT}"),)
+
+def build_clarifai_request(image_bytes):
+    """PostModelOutputs request classifying one image with the crop disease model"""
+    return service_pb2.PostModelOutputsRequest(
+        user_app_id=resources_pb2.UserAppIDSet(user_id=USER_ID, app_id=APP_ID),
+        model_id=MODEL_ID,
+        version_id=MODEL_VERSION_ID,
+        inputs=[
+            resources_pb2.Input(
+                data=resources_pb2.Data(
+                    image=resources_pb2.Image(
+                        base64=image_bytes
+                    )
+                )
+            )
+        ]
+    )
+
+def clarifai_error(status):
+    """(payload, http_status) for a failed Clarifai response status"""
+    error_details = {
+        "code": status.code,
+        "description": status.description,
+        "details": status.details
+    }
+    print(f"Clarifai API error: {error_details}")
+    
+    # More detailed error handling
+    error_message = status.description
+    if "Invalid API key" in error_message or "authorization" in error_message.lower():
+        print("Authentication error with Clarifai API. Check your PAT in the .env file.")
+        return {
+            "success": False,
+            "error": f"Clarifai API authentication failed: {error_message}. Please check your API credentials."
+        }, 401
+    
+    return {
+        "success": False,
+        "error": f"Clarifai API request failed: {error_message}"
+    }, 500
+
+def clarifai_timeout_error(error):
+    """(payload, 504) when a Clarifai call failed for lack of request time, else None"""
+    if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+        request_deadlines.record_timeout('clarifai')
+    elif not isinstance(error, DeadlineExceeded):
+        return None
+    print("Clarifai API call ran out of request time")
+    return {
+        "success": False,
+        "error": "Image analysis timed out. Please try again."
+    }, 504
+
+def clarifai_failure_counts(error_or_status):
+    """
+    Whether a failed Clarifai call counts against the circuit breaker: any
+    gRPC error or timeout, and any error status except a rejected input
+    """
+    if isinstance(error_or_status, (grpc.RpcError, DeadlineExceeded)):
+        return True
+    code = getattr(error_or_status, 'code', None)
+    return isinstance(code, int) and not 30000 <= code < 40000
+
+def clarifai_unavailable_response(image_bytes, language_code):
+    """
+    (payload, status, headers) for /predict while the Clarifai breaker is
+    open: the cached result for the same or a near-identical image, flagged
+    as degraded and not stored again, or a fast 503
+    """
+    retry_after = max(1, math.ceil(clarifai_breaker.retry_after()))
+    headers = {"Retry-After": str(retry_after)}
+    outputs, match = prediction_results.lookup(image_bytes)
+    if outputs is None:
+        print("Clarifai circuit is open and no cached result matches, failing fast")
+        return {
+            "success": False,
+            "error": f"Image analysis is temporarily unavailable. Please try again in {retry_after} seconds.",
+            "degraded": True,
+            "circuit": clarifai_breaker.state,
+            "retryAfter": retry_after
+        }, 503, headers
+    
+    print(f"Clarifai circuit is open, serving a cached {match} result")
+    highest_prediction = max(outputs, key=lambda x: x["value"])
+    # A cached result is not a new prediction, so it is not added to the history
+    prediction_id = str(uuid.uuid4())
+    timestamp = datetime.now().isoformat()
+    return {
+        "success": True,
+        "prediction": build_prediction_response(prediction_id, highest_prediction, outputs, timestamp, language_code),
+        "degraded": True,
+        "degradedMatch": match,
+        "circuit": clarifai_breaker.state
+    }, 200, headers
+
+def clarifai_outputs(response):
+    """Concepts of a successful Clarifai response as [{'name', 'value'}] percentages"""
+    outputs = []
+    for concept in response.outputs[0].data.concepts:
+        outputs.append({
+            "name": concept.name,
+            "value": round(concept.value * 100, 2)
+        })
+    return outputs
+
+def remember_prediction(prediction_data):
+    """Add a prediction row, without its image, to the in-memory history"""
+    user_id = prediction_data["user_id"]
+    if user_id not in in_memory_predictions:
+        in_memory_predictions[user_id] = []
+    in_memory_predictions[user_id].append({
+        "id": prediction_data["id"],
+        "user_id": user_id,
+        "image_name": prediction_data["image_name"],
+        "prediction": prediction_data["prediction"],
+        "confidence": prediction_data["confidence"],
+        "created_at": prediction_data["created_at"]
+    })
+
+def record_prediction(user_id, filename, highest_prediction, image_bytes):
+    """
+    Prepare the Supabase row of a prediction and add it to the in-memory history.
+    
+    Returns:
+        tuple: (prediction_id, timestamp, prediction_data)
+    """
+    # Convert image bytes to base64 string for storage
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+    
+    prediction_id = str(uuid.uuid4())
+    timestamp = datetime.now().isoformat()
+    
+    # Prepare prediction data
+    prediction_data = {
+        "id": prediction_id,
+        "user_id": user_id,
+        "image_name": filename,
+        "image_data": image_base64,
+        "prediction": highest_prediction["name"],
+        "confidence": highest_prediction["value"],
+        "created_at": timestamp
     }
     
-    # Use mapped language code or default to original
-    target_language = language_map.get(target_language, target_language)
+    # Check data format to ensure it matches database schema
+    # Ensure prediction_id is UUID format 
+    if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', prediction_id):
+        prediction_id = str(uuid.uuid4())
+        prediction_data["id"] = prediction_id
+        print(f"Updated prediction_id to valid UUID: {prediction_id}")
+    
+    # Ensure confidence is a float
+    if not isinstance(prediction_data["confidence"], float):
+        try:
+            prediction_data["confidence"] = float(prediction_data["confidence"])
+        except:
+            prediction_data["confidence"] = 0.0
     
+    # Use proper ISO format for timestamp
     try:
-        print(f"Translating text to {target_language} (length: {len(text)})")
-        
-        # Use Google Translate API
-        url = "https://translate.googleapis.com/translate_a/single"
-        params = {
-            "client": "gtx",
-            "sl": "auto",  # Source language (auto-detect)
-            "tl": target_language,  # Target language
-            "dt": "t",  # Return text
-            "q": text
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            print(f"Translation API error: {response.status_code}")
-            return text
-            
-        # Parse the response (it comes in a nested list structure)
-        result = response.json()
-        
-        # Extract all translated parts and join them
-        translated_text = ""
-        for part in result[0]:
-            if part[0]:
-                translated_text += part[0]
-        
-        print(f"Translation successful: {translated_text[:100]}...")
-        return translated_text
+        if not isinstance(prediction_data["created_at"], str) or not prediction_data["created_at"].endswith('Z'):
+            dt = datetime.fromisoformat(prediction_data["created_at"].replace('Z', '+00:00'))
+            prediction_data["created_at"] = dt.isoformat()
+    except:
+        prediction_data["created_at"] = datetime.now().isoformat()
+    
+    # Store in memory
+    remember_prediction(prediction_data)
+    
+    return prediction_id, timestamp, prediction_data
+
+def store_prediction(prediction_data):
+    """
+    Durably log a prediction row for the background replayer to store in
+    Supabase; the request only waits for the local append
+    """
+    try:
+        prediction_log.append(prediction_data)
     except Exception as e:
-        print(f"*** Translation error: {str(e)} ***")
-        return text
+        error_traceback = traceback.format_exc()
+        print(f"Error writing prediction to the log, kept in memory only: {str(e)}")
+        print(f"Error traceback: {error_traceback}")
 
-@app.route("/predict", methods=["POST"])
-def predict():
+def upsert_predictions(rows):
+    """
+    Sink of the prediction log: upsert logged rows by id, so a row replayed
+    twice is stored once. Returns True once Supabase has them.
+    """
     # Declare global supabase to modify the module-level variable
     global supabase
     
-    print("Predict endpoint called")
+    if not supabase:
+        return False
     
-    if "image" not in request.files:
-        return jsonify({"error": "No image file provided"}), 400
+    try:
+        future = bulkheads['supabase'].submit(supabase.table("predictions").upsert(rows, on_conflict="id").execute)
+        result = future.result(timeout=PREDICTION_LOG_UPSERT_TIMEOUT)
+    except BulkheadFull:
+        return False
+    except Exception as e:
+        print(f"Error storing logged predictions in Supabase: {str(e) or type(e).__name__}")
+        # The connection may have been lost; the next replay uses a new client
+        try:
+            supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        except Exception as reconnect_err:
+            print(f"Reconnection failed: {str(reconnect_err)}")
+        raise
     
-    # Get the user ID from the request
-    user_id = request.form.get("user_id", "anonymous")
-    print(f"Processing request for user: {user_id}")
+    if not getattr(result, 'data', None):
+        print(f"Supabase upsert returned unexpected result: {result}")
+        return False
+    print(f"Stored {len(result.data)} logged predictions in Supabase")
+    return True
+
+# Write-ahead log of predictions, drained to Supabase in the background; the
+# rows it still holds from before a restart go back into in-memory history
+PREDICTION_LOG_UPSERT_TIMEOUT = float(os.environ.get("PREDICTION_LOG_UPSERT_TIMEOUT", 30))
+prediction_log = PredictionLog(
+    os.environ.get("PREDICTION_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "prediction_log")),
+    sink=upsert_predictions,
+    segment_bytes=int(os.environ.get("PREDICTION_LOG_SEGMENT_BYTES", 16 * 1024 * 1024)),
+    sync_delay=float(os.environ.get("PREDICTION_LOG_SYNC_DELAY", 0.005)),
+    replay_interval=float(os.environ.get("PREDICTION_LOG_REPLAY_INTERVAL", 5)),
+    batch_size=int(os.environ.get("PREDICTION_LOG_BATCH_SIZE", 50)),
+    max_backoff=float(os.environ.get("PREDICTION_LOG_MAX_BACKOFF", 300)),
+    max_sync_failures=int(os.environ.get("PREDICTION_LOG_MAX_SYNC_FAILURES", 3))
+)
+for logged_prediction in prediction_log.records():
+    remember_prediction(logged_prediction)
+prediction_log.start()
+
+def build_prediction_response(prediction_id, highest_prediction, outputs, timestamp, language_code):
+    """The prediction payload returned by /predict, with treatment information"""
+    response_prediction = {
+        "id": prediction_id,
+        "name": highest_prediction["name"],
+        "value": highest_prediction["value"],
+        "details": highest_prediction.get("details", ""),
+        "created_at": timestamp,
+        "all_predictions": outputs
+    }
+
+    # Handle special disease name cases like Applescab
+    disease_name = highest_prediction["name"]
+    print(f"Getting treatment for disease: {disease_name}")
+
+    # Special case for Apple Scab variants
+    if disease_name.lower() == "applescab":
+        print("Special case: Converting Applescab to Apple___Apple_scab for treatment lookup")
+        treatment_info = get_treatment_for_disease("Apple___Apple_scab", language_code)
+    else:
+        treatment_info = get_treatment_for_disease(disease_name, language_code)
+
+    response_prediction["treatment"] = treatment_info
     
-    image_file = request.files["image"]
-    image_bytes = image_file.read()
-    print(f"Received image of size: {len(image_bytes)} bytes")
+    # Precomputed LLM explanation, so the result page needs no chatbot call
+    summary = get_treatment_summary(
+        "Apple___Apple_scab" if disease_name.lower() == "applescab" else disease_name, language_code
+    )
+    if summary:
+        response_prediction["treatmentSummary"] = summary["summary"]
+
+    print(f"Returning prediction with name: {highest_prediction['name']}, confidence: {highest_prediction['value']}%")
+    print(f"Treatment information included: {len(treatment_info)} characters")
+    return response_prediction
+
+def run_prediction(user_id, image_bytes, language_code):
+    """
+    Classify an image with Clarifai, record the prediction and build the
+    /predict payload.
     
+    Returns:
+        tuple: (payload, status, headers)
+    """
     # Generate a unique filename for the image
     filename = f"{uuid.uuid4()}.jpg"
     
-    # Setup Clarifai API client
-    print("Setting up Clarifai client")
-    channel = ClarifaiChannel.get_grpc_channel()
-    stub = service_pb2_grpc.V2Stub(channel)
-    
-    # Create metadata for authentication using PAT
-    metadata = (("authorization", f"Key {CLARIFAI_PAT}"),)
-    print(f"PAT length: {len(CLARIFAI_PAT)}")
-    
-    # Create the user data object
-    user_data_object = resources_pb2.UserAppIDSet(user_id=USER_ID, app_id=APP_ID)
+    # Fail fast, or answer from recent results, while Clarifai is unavailable
+    if not clarifai_breaker.allow():
+        return clarifai_unavailable_response(image_bytes, language_code)
     
     try:
+        # Setup Clarifai API client
+        print("Setting up Clarifai client")
+        channel = ClarifaiChannel.get_grpc_channel()
+        stub = service_pb2_grpc.V2Stub(channel)
+        print(f"PAT length: {len(CLARIFAI_PAT)}")
+        
         # Print request details for debugging
         print(f"Making Clarifai API request with:")
         print(f"- PAT prefix: {CLARIFAI_PAT[:5]}...")
@@ -359,194 +806,209 @@ def predict():
         print(f"- MODEL_ID: {MODEL_ID}")
         print(f"- MODEL_VERSION_ID: {MODEL_VERSION_ID}")
         
-        # Create the request object
-        request_object = service_pb2.PostModelOutputsRequest(
-            user_app_id=user_data_object,
-            model_id=MODEL_ID,
-            version_id=MODEL_VERSION_ID,
-            inputs=[
-                resources_pb2.Input(
-                    data=resources_pb2.Data(
-                        image=resources_pb2.Image(
-                            base64=image_bytes
-                        )
-                    )
-                )
-            ]
-        )
-        
         # Call the Clarifai API
         print("Calling Clarifai API...")
-        response = stub.PostModelOutputs(request_object, metadata=metadata)
+        clarifai_request = build_clarifai_request(image_bytes)
+        call_started = time.time()
+        try:
+            response = upstream_call('clarifai', 'clarifai', lambda: stub.PostModelOutputs(
+                clarifai_request,
+                metadata=clarifai_metadata(),
+                timeout=request_deadlines.timeout('clarifai')
+            ))
+        except Exception as call_error:
+            if clarifai_failure_counts(call_error):
+                clarifai_breaker.record_failure(str(call_error) or type(call_error).__name__)
+            raise
         print("Received response from Clarifai API")
         
         if response.status.code != status_code_pb2.SUCCESS:
-            error_details = {
-                "code": response.status.code,
-                "description": response.status.description,
-                "details": response.status.details
-            }
-            print(f"Clarifai API error: {error_details}")
-            
-            # More detailed error handling
-            error_message = response.status.description
-            if "Invalid API key" in error_message or "authorization" in error_message.lower():
-                print("Authentication error with Clarifai API. Check your PAT in the .env file.")
-                return jsonify({
-                    "success": False,
-                    "error": f"Clarifai API authentication failed: {error_message}. Please check your API credentials."
-                }), 401
-            
-            return jsonify({
-                "success": False,
-                "error": f"Clarifai API request failed: {error_message}"
-            }), 500
-        
-        # Process the response
-        outputs = []
-        for concept in response.outputs[0].data.concepts:
-            outputs.append({
-                "name": concept.name,
-                "value": round(concept.value * 100, 2)
-            })
+            if clarifai_failure_counts(response.status):
+                clarifai_breaker.record_failure(response.status.description)
+            payload, status = clarifai_error(response.status)
+            return payload, status, {}
+        clarifai_breaker.record_success(time.time() - call_started)
         
         # Find the prediction with the highest confidence
+        outputs = clarifai_outputs(response)
+        prediction_results.add(image_bytes, outputs)
         highest_prediction = max(outputs, key=lambda x: x["value"])
         
-        # Convert image bytes to base64 string for storage
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
-        # Store prediction in memory
-        prediction_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
-        
-        memory_prediction = {
-            "id": prediction_id,
-            "user_id": user_id,
-            "image_name": filename,
-            "prediction": highest_prediction["name"],
-            "confidence": highest_prediction["value"],
-            "created_at": timestamp
-        }
-        
-        # Store in memory
-        if user_id not in in_memory_predictions:
-            in_memory_predictions[user_id] = []
-        in_memory_predictions[user_id].append(memory_prediction)
+        prediction_id, timestamp, prediction_data = record_prediction(user_id, filename, highest_prediction, image_bytes)
+        store_prediction(prediction_data)
         
-        # Try to store in Supabase if available
-        if supabase:
-            try:
-                print(f"Attempting to store prediction in Supabase for user {user_id}")
-                
-                # First verify connection is still active by making a simple query
-                try:
-                    test_query = supabase.table("predictions").select("count", count="exact").limit(1).execute()
-                    print(f"Connection test successful. Database is accessible.")
-                except Exception as conn_err:
-                    print(f"Supabase connection test failed: {str(conn_err)}")
-                    print(f"Attempting to reconnect...")
-                    # Try to reconnect without using global keyword
-                    try:
-                        # Access the module-level variables directly
-                        new_supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-                        # If we get here, connection succeeded
-                        supabase = new_supabase  # This now updates the module-level variable
-                        print("Successfully reconnected to Supabase")
-                    except Exception as reconnect_err:
-                        print(f"Reconnection failed: {str(reconnect_err)}")
-                        raise Exception("Failed to connect to database") from reconnect_err
-                
-                # Prepare prediction data
-                prediction_data = {
-                    "id": prediction_id,
-                    "user_id": user_id,
-                    "image_name": filename,
-                    "image_data": image_base64,
-                    "prediction": highest_prediction["name"],
-                    "confidence": highest_prediction["value"],
-                    "created_at": timestamp
-                }
-                
-                print(f"Prediction data prepared, inserting into Supabase table 'predictions'")
-                print(f"Data sample: id={prediction_id}, user={user_id}, prediction={highest_prediction['name']}, confidence={highest_prediction['value']}")
-                
-                # Check data format to ensure it matches database schema
-                # Ensure prediction_id is UUID format 
-                if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', prediction_id):
-                    prediction_id = str(uuid.uuid4())
-                    prediction_data["id"] = prediction_id
-                    print(f"Updated prediction_id to valid UUID: {prediction_id}")
-                
-                # Ensure confidence is a float
-                if not isinstance(prediction_data["confidence"], float):
-                    try:
-                        prediction_data["confidence"] = float(prediction_data["confidence"])
-                    except:
-                        prediction_data["confidence"] = 0.0
-                
-                # Use proper ISO format for timestamp
-                try:
-                    if not isinstance(prediction_data["created_at"], str) or not prediction_data["created_at"].endswith('Z'):
-                        dt = datetime.fromisoformat(prediction_data["created_at"].replace('Z', '+00:00'))
-                        prediction_data["created_at"] = dt.isoformat()
-                except:
-                    prediction_data["created_at"] = datetime.now().isoformat()
-                
-                result = supabase.table("predictions").insert(prediction_data).execute()
-                
-                if hasattr(result, 'data') and len(result.data) > 0:
-                    print(f"Successfully stored prediction in Supabase. Result data: {json.dumps(result.data[0])[:100]}...")
-                else:
-                    print(f"Supabase insert returned unexpected result: {result}")
-            except Exception as e:
-                error_traceback = traceback.format_exc()
-                print(f"Error storing prediction in Supabase: {str(e)}")
-                print(f"Error traceback: {error_traceback}")
-        else:
-            print("Supabase client not available, storing prediction in memory only")
-        
-        # Store in-memory prediction for response
-        response_prediction = {
-            "id": prediction_id,
-            "name": highest_prediction["name"],
-            "value": highest_prediction["value"],
-            "details": highest_prediction.get("details", ""),
-            "created_at": timestamp,
-            "all_predictions": outputs
-        }
-
-        # Handle special disease name cases like Applescab
-        disease_name = highest_prediction["name"]
-        print(f"Getting treatment for disease: {disease_name}")
-
-        # Special case for Apple Scab variants
-        if disease_name.lower() == "applescab":
-            print("Special case: Converting Applescab to Apple___Apple_scab for treatment lookup")
-            treatment_info = get_treatment_for_disease("Apple___Apple_scab")
-        else:
-            treatment_info = get_treatment_for_disease(disease_name)
-
-        response_prediction["treatment"] = treatment_info
-
-        print(f"Returning prediction with name: {highest_prediction['name']}, confidence: {highest_prediction['value']}%")
-        print(f"Treatment information included: {len(treatment_info)} characters")
-        
-        return jsonify({
+        return {
             "success": True,
-            "prediction": response_prediction
-        })
+            "prediction": build_prediction_response(prediction_id, highest_prediction, outputs, timestamp, language_code)
+        }, 200, {}
         
     except Exception as e:
+        error_response = busy_response(e) or clarifai_timeout_error(e)
+        if error_response is not None:
+            payload, status = error_response
+            return payload, status, {}
+        
         error_traceback = traceback.format_exc()
         error_message = str(e) if str(e) else "Unknown error occurred"
         print(f"Exception in Clarifai API call: {error_message}")
         print(f"Traceback: {error_traceback}")
         
-        return jsonify({
+        return {
             "error": f"Error calling Clarifai API: {error_message}",
             "details": error_traceback
-        }), 500
+        }, 500, {}
+    finally:
+        # A half-open probe that recorded no outcome lets the next one through
+        clarifai_breaker.release_probe()
+
+def prediction_fingerprint(user_id, image_bytes, language_code):
+    """Hash of what makes two /predict requests the same request"""
+    digest = hashlib.sha256()
+    digest.update(f"{user_id}\0{language_code}\0".encode('utf-8'))
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+def idempotent_response(idempotency_key, outcome, response):
+    """(payload, status, headers) for the outcome of an IdempotencyStore.run"""
+    if outcome == CONFLICT:
+        print(f"Idempotency-Key {idempotency_key} reused for a different request")
+        return {
+            "success": False,
+            "error": "This Idempotency-Key was already used for a different request."
+        }, 422, {}
+    if outcome == IN_PROGRESS:
+        print(f"Idempotency-Key {idempotency_key} is still being processed")
+        return {
+            "success": False,
+            "error": "A request with this Idempotency-Key is still being processed. Please try again shortly.",
+            "retryAfter": 1
+        }, 409, {"Retry-After": "1"}
+    payload, status, headers = response
+    if outcome == REPLAYED:
+        print(f"Replaying the response for Idempotency-Key {idempotency_key}")
+        headers = dict(headers, **{"Idempotent-Replayed": "true"})
+    return payload, status, headers
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    print("Predict endpoint called")
+    
+    if "image" not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
+    
+    # Get the user ID and preferred language from the request
+    user_id = request.form.get("user_id", "anonymous")
+    language_code = request.form.get("language", "en-US")
+    print(f"Processing request for user: {user_id}")
+    
+    image_file = request.files["image"]
+    image_bytes = image_file.read()
+    print(f"Received image of size: {len(image_bytes)} bytes")
+    
+    # A retried upload with the same key gets the original response, and
+    # waits for it if the original is still running
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key:
+        response, outcome = idempotent_requests.run(
+            idempotency_key,
+            prediction_fingerprint(user_id, image_bytes, language_code),
+            lambda: run_prediction(user_id, image_bytes, language_code),
+            timeout=request_deadlines.remaining()
+        )
+        payload, status, headers = idempotent_response(idempotency_key, outcome, response)
+    else:
+        payload, status, headers = run_prediction(user_id, image_bytes, language_code)
+    return jsonify(payload), status, headers
+
+def upload_error_response(error):
+    """Flask response for an UploadError, with the offset to resume from"""
+    payload = {"success": False, "error": str(error)}
+    if error.offset is not None:
+        payload["offset"] = error.offset
+    return jsonify(payload), error.status
+
+@app.route("/predict/uploads", methods=["POST"])
+def create_upload():
+    """
+    Start a resumable upload. JSON body: user_id, language and size (bytes).
+    The image is then sent with PUT /predict/uploads/<upload_id> in chunks
+    carrying a Content-Range header, and POST .../finalize runs the prediction.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get("size", 0))
+    except (TypeError, ValueError):
+        size = 0
+    
+    try:
+        session = upload_sessions.create(data.get("user_id", "anonymous"), data.get("language", "en-US"), size)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    print(f"Started upload {session.id} of {size} bytes for user: {session.user_id}")
+    return jsonify({"success": True, "chunkSize": UPLOAD_CHUNK_SIZE, **session.to_dict()}), 201
+
+@app.route("/predict/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """How much of an upload was received, to resume after a dropped connection"""
+    try:
+        session = upload_sessions.get(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"success": True, **session.to_dict()})
+
+@app.route("/predict/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Append a chunk; the Content-Range header ('bytes start-end/size') gives its offset"""
+    match = re.match(r'^bytes (\d+)-(\d+)/(\d+|\*)$', request.headers.get("Content-Range", ""))
+    if not match or int(match.group(2)) < int(match.group(1)):
+        return jsonify({"success": False, "error": "A Content-Range header of the form 'bytes start-end/size' is required"}), 400
+    offset = int(match.group(1))
+    length = int(match.group(2)) - offset + 1
+    if request.content_length is not None and request.content_length != length:
+        return jsonify({"success": False, "error": "Content-Length does not match Content-Range"}), 400
+    
+    try:
+        upload_sessions.write(upload_id, offset, length, request.stream)
+        session = upload_sessions.get(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"success": True, **session.to_dict()})
+
+def finalize_key(upload_id):
+    """Replay key of an upload's finalize; a tuple never collides with a client's Idempotency-Key string"""
+    return ('upload', upload_id)
+
+@app.route("/predict/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """
+    Run the prediction for a fully received upload. Optional JSON body:
+    sha256 of the image, checked against the hash of the received bytes.
+    Finalizing again replays the same response. After a failure that is
+    not replayed, the upload can be finalized again, at most
+    UPLOAD_MAX_FINALIZE_ATTEMPTS times in all.
+    """
+    expected_sha256 = (request.get_json(silent=True) or {}).get("sha256")
+    
+    def finalize():
+        session, image_bytes = upload_sessions.read(upload_id, expected_sha256)
+        print(f"Finalizing upload {upload_id} ({len(image_bytes)} bytes) for user: {session.user_id}")
+        response = run_prediction(session.user_id, image_bytes, session.language_code)
+        if replayable(response[1]):
+            upload_sessions.finish(upload_id)
+        elif upload_sessions.fail(upload_id):
+            print(f"Discarded upload {upload_id} after {upload_sessions.max_attempts} failed finalizes")
+        return response
+    
+    idempotency_key = finalize_key(upload_id)
+    try:
+        response, outcome = idempotent_requests.run(
+            idempotency_key, upload_id, finalize, timeout=request_deadlines.remaining()
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+    payload, status, headers = idempotent_response(idempotency_key, outcome, response)
+    return jsonify(payload), status, headers
 
 @app.route("/history", methods=["GET"])
 def history():
@@ -566,8 +1028,10 @@ def history():
                 
                 # First verify connection is still active by making a simple query
                 try:
-                    test_query = supabase.table("predictions").select("count", count="exact").limit(1).execute()
+                    test_query = upstream_call('supabase', 'history', supabase.table("predictions").select("count", count="exact").limit(1).execute)
                     print(f"Connection test successful. Database is accessible.")
+                except (DeadlineExceeded, BulkheadFull):
+                    raise
                 except Exception as conn_err:
                     print(f"Supabase connection test failed: {str(conn_err)}")
                     print(f"Attempting to reconnect...")
@@ -583,11 +1047,11 @@ def history():
                         raise Exception("Failed to connect to database") from reconnect_err
                 
                 # Now proceed with the actual query
-                result = supabase.table("predictions") \
+                result = upstream_call('supabase', 'history', supabase.table("predictions") \
                         .select("id, user_id, image_name, prediction, confidence, created_at") \
                         .eq("user_id", user_id) \
                         .order("created_at", desc=True) \
-                        .execute()
+                        .execute)
                 
                 print(f"Query executed. Response type: {type(result)}")
                 
@@ -617,7 +1081,10 @@ def history():
         if memory_predictions:
             print(f"Sample in-memory prediction: {json.dumps(memory_predictions[0])[:100]}...")
         
-        # Combine and sort predictions
+        # Combine and sort predictions; a prediction already stored in
+        # Supabase is still in memory, so keep one copy of each id
+        supabase_ids = {prediction.get('id') for prediction in supabase_predictions}
+        memory_predictions = [prediction for prediction in memory_predictions if prediction['id'] not in supabase_ids]
         combined_predictions = supabase_predictions + memory_predictions
         sorted_predictions = sorted(
             combined_predictions, 
@@ -656,33 +1123,40 @@ def get_disease_info():
     Query parameters:
     - disease: (optional) disease key to get specific information
     - format: (optional) 'keys' to get just keys, 'full' to get all information
+    - language: (optional) language code; served from the precomputed bundles
     """
     disease = request.args.get('disease')
     format_type = request.args.get('format', 'full')
+    language_code = request.args.get('language', 'en-US')
     
     try:
+        kb = knowledge_base.snapshot()
+        disease_data = kb_bundles.localize('plant_disease_data', kb.plant_disease_data, language_code)
+        
         if disease:
             # Convert disease name to match the keys in our data
             disease_key = disease.lower().replace(' ', '_')
             
             # First look directly in the plant_disease_data dictionary
-            if disease_key in plant_disease_data:
+            if disease_key in disease_data:
                 response = {
                     "success": True,
                     "disease": disease_key,
-                    "info": plant_disease_data[disease_key]
+                    "language": language_code,
+                    "info": disease_data[disease_key]
                 }
                 return jsonify(response)
             
             # If not found, try to normalize the name using the same logic as in process_message
             # This will handle cases like "applescab" -> "apple_scab"
-            for name, key in disease_names:
+            for name, key in kb.disease_names:
                 if name.lower() == disease_key or key == disease_key:
-                    if key in plant_disease_data:
+                    if key in disease_data:
                         response = {
                             "success": True,
                             "disease": key,
-                            "info": plant_disease_data[key]
+                            "language": language_code,
+                            "info": disease_data[key]
                         }
                         return jsonify(response)
             
@@ -690,19 +1164,20 @@ def get_disease_info():
             return jsonify({
                 "success": False,
                 "error": f"Disease information not found for '{disease}'",
-                "available_diseases": list(plant_disease_data.keys())
+                "available_diseases": list(disease_data.keys())
             }), 404
         else:
             # Return all diseases
             if format_type == 'keys':
                 return jsonify({
                     "success": True,
-                    "diseases": list(plant_disease_data.keys())
+                    "diseases": list(disease_data.keys())
                 })
             else:
                 return jsonify({
                     "success": True,
-                    "diseases": plant_disease_data
+                    "language": language_code,
+                    "diseases": disease_data
                 })
                 
     except Exception as e:
@@ -712,105 +1187,196 @@ def get_disease_info():
             "error": str(e)
         }), 500
 
-# Knowledge base for plant diseases
-plant_disease_data = {
-    "apple_scab": {
-        "name": "Apple Scab",
-        "description": "Apple scab is a common fungal disease that affects apple trees. It appears as dark, scaly lesions on leaves and fruit.",
-        "causes": "Caused by the fungus Venturia inaequalis, especially in cool, wet spring weather.",
-        "symptoms": "Dark olive-green spots that later become brown and corky on leaves and fruit. Severely infected leaves may turn yellow and drop.",
-        "treatment": "Remove infected leaves, apply fungicide, and ensure good air circulation. Use resistant apple varieties when possible.",
-        "prevention": "Apply fungicide sprays from budbreak until rainy season ends. Rake and destroy fallen leaves. Prune to improve air circulation."
-    },
-    "bacterial_spot": {
-        "name": "Bacterial Spot",
-        "description": "Bacterial spot causes small, dark lesions on leaves, stems, and fruits. It affects peppers and tomatoes.",
-        "causes": "Caused by Xanthomonas bacteria, spread by splashing water, insects, and handling plants.",
-        "symptoms": "Small, water-soaked spots on leaves that turn brown with a yellow halo. Spots on fruit start as small bumps.",
-        "treatment": "Copper-based sprays can help manage it, but prevention is key. Remove and destroy infected plant material.",
-        "prevention": "Use disease-free seeds and transplants. Avoid overhead irrigation. Rotate crops and ensure proper spacing."
-    },
-    "black_spot": {
-        "name": "Black Spot",
-        "description": "Black spot is a fungal disease that causes black spots on leaves, which then yellow and drop. It commonly affects roses.",
-        "causes": "Caused by Diplocarpon rosae fungus, especially in warm, humid conditions.",
-        "symptoms": "Circular black spots with feathery margins on leaves. Infected leaves turn yellow and drop prematurely.",
-        "treatment": "Remove infected leaves. Apply fungicides labeled for black spot control.",
-        "prevention": "Choose resistant varieties. Water at the base of plants. Ensure good air circulation."
-    },
-    "early_blight": {
-        "name": "Early Blight",
-        "description": "Early blight is a fungal disease causing target-shaped brown spots on lower leaves first. It affects tomatoes and potatoes.",
-        "causes": "Caused by Alternaria solani fungus, favored by warm, humid conditions.",
-        "symptoms": "Dark brown spots with concentric rings creating a target pattern, usually on older leaves first.",
-        "treatment": "Remove infected leaves and apply fungicide. Ensure adequate plant nutrition.",
-        "prevention": "Rotate crops. Use mulch to prevent soil splash. Provide adequate spacing for air circulation."
-    },
-    "late_blight": {
-        "name": "Late Blight",
-        "description": "Late blight is a devastating disease affecting tomatoes and potatoes. It causes dark lesions on leaves and can quickly kill plants.",
-        "causes": "Caused by Phytophthora infestans, favored by cool, wet conditions.",
-        "symptoms": "Large, dark brown blotches on leaves and stems with white fungal growth on leaf undersides in humid conditions.",
-        "treatment": "Remove infected plants to prevent spread. Apply fungicides preventatively.",
-        "prevention": "Use resistant varieties. Avoid overhead irrigation. Destroy volunteer potato plants."
-    },
-    "leaf_curl": {
-        "name": "Leaf Curl",
-        "description": "Leaf curl is a fungal disease causing leaves to pucker, thicken, and curl. It commonly affects peach trees.",
-        "causes": "Caused by Taphrina deformans fungus, infecting during cool, wet spring weather.",
-        "symptoms": "Red, puckered, distorted leaves that eventually turn yellow and drop.",
-        "treatment": "Once symptoms appear, treatment in the current season isn't effective. Remove infected leaves.",
-        "prevention": "Apply fungicide as a dormant spray before buds swell in late winter/early spring."
-    },
-    "powdery_mildew": {
-        "name": "Powdery Mildew",
-        "description": "Powdery mildew appears as white powdery spots on leaves and stems. It thrives in high humidity.",
-        "causes": "Caused by various fungi, thrives in high humidity with moderate temperatures.",
-        "symptoms": "White, powdery coating on leaves, stems, and sometimes fruit. Leaves may curl, turn yellow, and drop.",
-        "treatment": "Apply fungicides, neem oil, or a baking soda solution. Remove severely infected plants.",
-        "prevention": "Provide good air circulation. Water at the base of plants. Choose resistant varieties."
-    },
-    "rust": {
-        "name": "Rust",
-        "description": "Rust diseases cause orange-brown pustules on leaf undersides. They affect many plants including roses and beans.",
-        "causes": "Caused by various fungi in the order Pucciniales. Often requires alternate hosts to complete lifecycle.",
-        "symptoms": "Orange to rusty-brown pustules mainly on leaf undersides. Severe infections cause leaf yellowing and drop.",
-        "treatment": "Apply fungicides labeled for rust control. Remove severely infected plants.",
-        "prevention": "Avoid wetting leaves when watering. Provide adequate spacing. Remove alternate host plants if applicable."
-    },
-    "citrus_greening": {
-        "name": "Citrus Greening",
-        "description": "Citrus greening is a bacterial disease spread by insects. It causes mottled leaves and misshapen, bitter fruit.",
-        "causes": "Caused by Candidatus Liberibacter bacteria, spread by Asian citrus psyllid insects.",
-        "symptoms": "Blotchy mottled leaves, yellowing of leaf veins, lopsided and bitter fruit that remains green at the base.",
-        "treatment": "No cure available. Remove infected trees to prevent spread.",
-        "prevention": "Control psyllid populations with insecticides. Use certified disease-free nursery stock."
-    }
-}
+def resolve_disease_key(kb, label):
+    """
+    Map a disease label ('Late blight', 'Tomato___Late_blight', 'applescab')
+    to its plant_disease_data key, or None
+    """
+    disease_key = label.lower().strip().replace(' ', '_')
+    if disease_key in kb.plant_disease_data:
+        return disease_key
+    
+    compact = re.sub(r'[\s_-]+', '', label.lower())
+    for name, key in kb.disease_names:
+        if name.lower() == disease_key or key == disease_key or re.sub(r'[\s_-]+', '', name.lower()) == compact:
+            return key if key in kb.plant_disease_data else None
+    
+    # Fall back to any single disease alias mentioned in the label
+    diseases, _, _ = scan_message(kb, re.sub(r'_+', ' ', label.lower()))
+    if len(diseases) == 1:
+        return next(iter(diseases))
+    return None
+
+@app.route("/treatment_bundle", methods=["GET"])
+def get_treatment_bundle():
+    """
+    Everything the treatment view needs for one disease in a single response
+    Query parameters:
+    - disease: disease label or key, as returned by /predict or /disease_info
+    - language: (optional) language code
+    - explain: (optional) 'auto' (default) adds an LLM explanation only when the
+      knowledge base has no entry for the disease, 'true' always, 'false' never.
+      Precomputed treatment summaries are used instead of a live LLM call.
+    """
+    label = (request.args.get('disease') or '').strip()
+    language_code = request.args.get('language', 'en-US')
+    explain = request.args.get('explain', 'auto').lower()
+    if not label:
+        return jsonify({"success": False, "error": "The disease parameter is required"}), 400
+    if explain not in ('auto', 'true', 'false'):
+        return jsonify({"success": False, "error": "explain must be auto, true or false"}), 400
+    
+    try:
+        kb = knowledge_base.snapshot()
+        disease_key = resolve_disease_key(kb, label)
+        summary = get_treatment_summary(label, language_code, kb) if explain != 'false' else None
+        want_explanation = GROQ_AVAILABLE and summary is None and \
+            (explain == 'true' or (explain == 'auto' and disease_key is None))
+        
+        # explain and the summary used both decide the explanation in the body
+        summary_id = f"{summary['model']}:{summary.get('prompt_hash')}:{summary.get('source_hash')}" if summary else None
+        cache_key = (f"{kb.version}:{kb_bundles.version}:{treatment_summaries.version}:{language_code}:"
+                     f"{explain}:{want_explanation}:{summary_id}:{label}")
+        body = treatment_bundle_cache.get(cache_key)
+        if body is None:
+            # The treatment text, the knowledge-base entry and the LLM explanation are independent
+            treatment_future = treatment_bundle_executor.submit(get_treatment_for_disease, label, language_code)
+            info_future = treatment_bundle_executor.submit(
+                lambda: kb_bundles.localize('plant_disease_data', kb.plant_disease_data, language_code).get(disease_key)
+                if disease_key else None
+            )
+            explanation_future = None
+            if want_explanation:
+                disease_name = kb.plant_disease_data[disease_key]['name'] if disease_key else label.replace('___', ' ').replace('_', ' ')
+                # Run in a copy of this request's context so the LLM call keeps its deadline
+                explanation_future = treatment_bundle_executor.submit(
+                    contextvars.copy_context().run,
+                    process_message,
+                    f"How do I treat {disease_name}? Explain the causes, treatment steps and prevention.",
+                    language_code
+                )
+            
+            explanation, explanation_model = (None, None)
+            if summary is not None:
+                explanation, explanation_model = summary["summary"], summary["model"]
+            elif explanation_future is not None:
+                explanation, explanation_model = explanation_future.result()
+            
+            payload = {
+                "success": True,
+                "disease": disease_key,
+                "label": label,
+                "language": language_code,
+                "treatment": treatment_future.result(),
+                "info": info_future.result(),
+                "explanation": explanation,
+                "explanationModel": explanation_model,
+                "version": kb.version
+            }
+            body = json.dumps(payload, ensure_ascii=False)
+            # A failed LLM call is not cached so the next request retries it
+            if explanation_model not in ("Error", "Not Available"):
+                treatment_bundle_cache.set(cache_key, body)
+        
+        etag = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
+        
+    except Exception as e:
+        error_response = busy_response(e)
+        if error_response is not None:
+            payload, status = error_response
+            return jsonify(payload), status
+        print(f"Error building treatment bundle: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
 
 # Get all disease keys for treatment lookup
 def get_all_treatment_disease_keys():
-    """Get all disease keys from treatments and basic_treatments dictionaries"""
-    global treatments, basic_treatments
-    
-    all_keys = []
-    
-    # Add keys from detailed treatments
-    for k in treatments.keys():
-        all_keys.append(k)
+    """Get all disease keys from treatments and basic_treatments, in a stable order"""
+    return knowledge_base.snapshot().all_treatment_keys
+
+def build_chat_messages(translated_message, session=None):
+    """
+    Build the Groq chat messages for an English question: the system prompt
+    with retrieved knowledge-base passages, the session history and the question.
     
-    # Add keys from basic treatments
-    for k in basic_treatments.keys():
-        all_keys.append(k)
+    Returns:
+        tuple: (messages, grounded) where grounded means the retrieved passages
+        answer the question well enough for the smaller model
+    """
+    # Earlier turns of the conversation, within the history token budget
+    history = chat_sessions.history_messages(session, CHAT_HISTORY_TOKENS) if session is not None else []
     
-    # Make list unique
-    return list(set(all_keys))
+    # Retrieve the knowledge-base passages relevant to the question; follow-ups
+    # like "how do I treat it?" also search with the previous question
+    passages = []
+    grounded = False
+    try:
+        retrieval_query = translated_message
+        if history and session.last_user_message:
+            retrieval_query = f"{session.last_user_message} {translated_message}"
+        passages, grounded = context_retriever.retrieve(retrieval_query)
+        print(f"Retrieved {len(passages)} knowledge-base passages (grounded: {grounded})")
+    except Exception as e:
+        print(f"Error retrieving knowledge-base context: {str(e)}")
+
+    if passages:
+        knowledge_context = f"""Relevant knowledge-base entries:
+{context_retriever.format_context(passages)}
+
+Base your answer on these entries when they apply to the question."""
+    else:
+        knowledge_context = "No knowledge-base entry matched this question; answer from general agricultural knowledge."
+
+    # Create system prompt with agricultural knowledge
+    system_prompt = f"""You are an expert agricultural assistant specializing in crop diseases and treatments.
+Your purpose is to help farmers identify, prevent, and treat plant diseases.
+
+{knowledge_context}
+
+When providing treatment recommendations:
+1. Start with cultural practices (like pruning, spacing, watering techniques)
+2. Follow with organic options when available
+3. Include conventional chemical treatments as appropriate
+4. Always emphasize safety precautions
+
+Keep responses concise, practical and farmer-friendly.
+For disease-specific questions, include information about symptoms, causes, and prevention.
+"""
+
+    return [{"role": "system", "content": system_prompt}] + history + [
+        {"role": "user", "content": translated_message}
+    ], grounded
+
+def model_route_stats():
+    with model_route_lock:
+        return dict(model_route_counts)
+
+def chat_model_order(grounded):
+    """Groq models to try, in order, for a question"""
+    # Questions answered by the retrieved passages go to the smaller, faster
+    # model first; everything else starts with the primary model
+    route = 'fallback' if grounded else 'primary'
+    with model_route_lock:
+        model_route_counts[route] += 1
+    return [GROQ_MODELS[route], GROQ_MODELS['primary' if route == 'fallback' else 'fallback']]
 
 # Enhanced chatbot response function
-def process_message(message, language_code='en-US'):
+def process_message(message, language_code='en-US', session=None):
     """
     Process a message and get a response using Groq LLM.
-    Supports multiple languages through translation.
+    Supports multiple languages through translation. When a chat session is
+    given, its history is included in the prompt and the exchange is
+    recorded in it.
     
     Returns:
         tuple: (response_text, model_used)
@@ -837,92 +1403,73 @@ def process_message(message, language_code='en-US'):
             # Continue with original message if translation fails
             translated_message = message
     
-    # Get disease info for context
-    disease_keys = get_all_treatment_disease_keys()
-    diseases_context = ", ".join(disease_keys[:20])
+    # Answer clear questions about a single disease straight from the knowledge base
+    try:
+        local_response = chat_router.answer(translated_message, language_code)
+    except Exception as e:
+        print(f"Error answering from the knowledge base: {str(e)}")
+        local_response = None
+    if local_response:
+        response, english_response = local_response
+        chat_router.record('knowledge_base')
+        if session is not None:
+            chat_sessions.add_turn(session, translated_message, english_response)
+        print(f"------ Message answered from the knowledge base ------")
+        return response, KNOWLEDGE_BASE_MODEL
+    chat_router.record('llm')
     
-    # Create system prompt with agricultural knowledge
-    system_prompt = f"""You are an expert agricultural assistant specializing in crop diseases and treatments.
-Your purpose is to help farmers identify, prevent, and treat plant diseases.
-
-Available information about crop diseases: {diseases_context} and more.
-
-When providing treatment recommendations:
-1. Start with cultural practices (like pruning, spacing, watering techniques)
-2. Follow with organic options when available
-3. Include conventional chemical treatments as appropriate
-4. Always emphasize safety precautions
-
-Keep responses concise, practical and farmer-friendly.
-For disease-specific questions, include information about symptoms, causes, and prevention.
-"""
+    messages, grounded = build_chat_messages(translated_message, session)
 
     response = None
     
     # Use Groq LLM for response generation
     if GROQ_AVAILABLE:
-        try:
-            # Try primary model first
-            current_model = GROQ_MODELS['primary']
-            model_used = current_model
-            print(f"Calling Groq LLM API with model: {current_model}...")
-            
-            chat_completion = groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": translated_message}
-                ],
-                model=current_model,
-                temperature=0.5,
-                max_tokens=800,
-                top_p=1,
-                stream=False
-            )
-            
-            # Extract and process the response
-            response = chat_completion.choices[0].message.content
-            print(f"Received response from Groq {current_model} (length: {len(response)})")
-            
-        except Exception as primary_error:
-            print(f"Error calling Groq primary model: {str(primary_error)}")
-            print("Attempting to use fallback model...")
-            
+        model_order = chat_model_order(grounded)
+
+        for attempt, current_model in enumerate(model_order):
             try:
-                # Try fallback model
-                current_model = GROQ_MODELS['fallback']
                 model_used = current_model
-                print(f"Calling Groq LLM API with fallback model: {current_model}...")
+                print(f"Calling Groq LLM API with model: {current_model}...")
                 
-                chat_completion = groq_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": translated_message}
-                    ],
+                chat_completion = upstream_call('groq', 'llm', lambda: groq_client.chat.completions.create(
+                    messages=messages,
                     model=current_model,
                     temperature=0.5,
                     max_tokens=800,
                     top_p=1,
-                    stream=False
-                )
+                    stream=False,
+                    timeout=request_deadlines.timeout('llm')
+                ))
                 
                 # Extract and process the response
                 response = chat_completion.choices[0].message.content
-                print(f"Received response from Groq fallback model {current_model} (length: {len(response)})")
+                print(f"Received response from Groq {current_model} (length: {len(response)})")
+                break
                 
-            except Exception as fallback_error:
-                print(f"Error calling Groq fallback model: {str(fallback_error)}")
+            except BulkheadFull:
+                raise
+            except Exception as model_error:
+                print(f"Error calling Groq model {current_model}: {str(model_error)}")
+                if isinstance(model_error, groq.APITimeoutError):
+                    request_deadlines.record_timeout('llm')
+                if attempt + 1 < len(model_order) and not request_deadlines.expired():
+                    print("Attempting to use the other model...")
+                    continue
                 traceback_str = traceback.format_exc()
                 print(f"Traceback: {traceback_str}")
                 
                 # Create a simple fallback response if both models fail
-                response = "I'm sorry, I'm having trouble connecting to my knowledge base right now. Please try again in a few moments."
+                response = CHAT_ERROR_RESPONSE
                 model_used = "Error"
     else:
         # Groq not available
         print("Groq LLM is not available. Please check your API key.")
-        response = "I'm currently operating with limited capabilities. Please ensure Groq API is properly configured."
+        response = CHAT_UNAVAILABLE_RESPONSE
         model_used = "Not Available"
     
+    if session is not None and response and model_used not in ["Error", "Not Available"]:
+        chat_sessions.add_turn(session, translated_message, response)
+    
     # Translate response back to original language if needed
     if not is_english and response:
         try:
@@ -941,6 +1488,65 @@ For disease-specific questions, include information about symptoms, causes, and
     print(f"------ Message processing completed ------")
     return response, model_used
 
+# Chatbot responses to opening questions, keyed by message and language
+chatbot_response_cache = {}
+
+def chatbot_cache_key(user_message, language_code):
+    return f"{user_message.lower().strip()}_{language_code}"
+
+def cached_chatbot_response(cache_key, session, language_code):
+    """
+    Cached response for an opening question, or None. Only opening questions
+    are cached: answers to follow-ups depend on the conversation so far.
+    """
+    if session.turns or cache_key not in chatbot_response_cache:
+        return None
+    print(f"Using cached chatbot response for: {cache_key[:30]}...")
+    chat_router.record('cache')
+    cached_response = dict(chatbot_response_cache[cache_key])
+    turn = cached_response.pop('turn', None)
+    if turn:
+        chat_sessions.add_turn(session, *turn)
+    cached_response['sessionId'] = session.id
+    cached_response.update(queue_speech(cached_response['response'], language_code))
+    return cached_response
+
+def finish_chatbot_response(response_text, model_used, language_code, session, cache_key, is_first_turn):
+    """Build the /chatbot payload, cache it and queue its speech"""
+    # Create response with model info
+    if model_used == KNOWLEDGE_BASE_MODEL:
+        powered_by = "Knowledge Base"
+    elif GROQ_AVAILABLE and model_used not in ["Error", "Not Available"]:
+        powered_by = f"Groq LLM ({model_used})"
+    else:
+        powered_by = "Pattern Matching (Fallback)"
+    response = {
+        'success': True,
+        'response': response_text,
+        'language': language_code,
+        'poweredBy': powered_by
+    }
+    
+    # Cache the response (audio fields and the session are resolved per request),
+    # with the English exchange so a cache hit still extends the new session
+    if is_first_turn:
+        cached_entry = dict(response)
+        if len(session.turns) >= 2:
+            cached_entry['turn'] = (session.turns[-2][1], session.turns[-1][1])
+        chatbot_response_cache[cache_key] = cached_entry
+    response['sessionId'] = session.id
+    
+    # Speech is synthesized in the background; clients poll /tts/<audioJobId>
+    response.update(queue_speech(response_text, language_code))
+    
+    # Limit cache size to prevent memory issues
+    if len(chatbot_response_cache) > 100:
+        # Remove oldest entries (first 20)
+        oldest_keys = list(chatbot_response_cache.keys())[:20]
+        for key in oldest_keys:
+            chatbot_response_cache.pop(key, None)
+    return response
+
 # Chatbot API endpoint
 @app.route('/chatbot', methods=['POST'])
 def process_chatbot():
@@ -948,78 +1554,45 @@ def process_chatbot():
         data = request.json
         user_message = data.get('message', '')
         language_code = data.get('language', 'en-US')
+        session = chat_sessions.get_or_create(data.get('sessionId'))
         
         print(f"====== Processing chatbot request ======")
         print(f"User message: {user_message}")
         print(f"Language code: {language_code}")
         
-        # Create response cache if it doesn't exist
-        if not hasattr(process_chatbot, 'cache'):
-            process_chatbot.cache = {}
-            
-        # Generate cache key from message and language
-        cache_key = f"{user_message.lower().strip()}_{language_code}"
-        
         # Check cache for existing response
-        if cache_key in process_chatbot.cache:
-            print(f"Using cached chatbot response for: {cache_key[:30]}...")
-            cached_response = process_chatbot.cache[cache_key]
+        cache_key = chatbot_cache_key(user_message, language_code)
+        is_first_turn = not session.turns
+        cached_response = cached_chatbot_response(cache_key, session, language_code)
+        if cached_response is not None:
             return jsonify(cached_response)
         
         # Get response using our enhanced Groq integration
         start_time = time.time()
         print(f"Calling process_message with message and language: {language_code}")
-        response_text, model_used = process_message(user_message, language_code)
+        response_text, model_used = process_message(user_message, language_code, session)
         processing_time = time.time() - start_time
         print(f"Generated response in {processing_time:.2f} seconds using model: {model_used}")
         print(f"Response text: {response_text[:100]}...")
         
         # Verify language - ensure non-English responses are actually translated
         if not language_code.startswith('en'):
-            # Force translation if still in English
-            english_words = ['the', 'is', 'and', 'to', 'for', 'your', 'with', 'that', 'have', 'plant', 'disease']
-            english_word_count = sum(1 for word in english_words if f" {word} " in f" {response_text.lower()} ")
+            # Force translation if the response is not in the target script yet
+            needed, source_language = needs_translation(response_text, language_code)
             
-            if english_word_count > 5:  # If response seems to be in English
-                print(f"Response appears to be in English despite language {language_code}. Forcing translation...")
-                response_text = translate_text(response_text, language_code)
-        
-        # Generate speech from text if available
-        audio_url = None
-        if response_text and TEXT_TO_SPEECH_AVAILABLE:
-            tts_start = time.time()
-            audio_url = generate_text_to_speech(response_text, language_code)
-            tts_time = time.time() - tts_start
-            print(f"Generated speech in {tts_time:.2f} seconds")
-            if audio_url:
-                print(f"Audio URL: {audio_url}")
-            else:
-                print("Failed to generate audio")
-        
-        # Create response with model info
-        powered_by = f"Groq LLM ({model_used})" if GROQ_AVAILABLE and model_used not in ["Error", "Not Available"] else "Pattern Matching (Fallback)"
-        response = {
-            'success': True,
-            'response': response_text,
-            'audioUrl': audio_url,
-            'language': language_code,
-            'poweredBy': powered_by
-        }
-        
-        # Cache the response
-        process_chatbot.cache[cache_key] = response
-        
-        # Limit cache size to prevent memory issues
-        if len(process_chatbot.cache) > 100:
-            # Remove oldest entries (first 20)
-            oldest_keys = list(process_chatbot.cache.keys())[:20]
-            for key in oldest_keys:
-                del process_chatbot.cache[key]
+            if needed:
+                print(f"Response appears to be in {source_language} despite language {language_code}. Forcing translation...")
+                response_text = translate_text(response_text, language_code, source_language)
         
+        response = finish_chatbot_response(response_text, model_used, language_code, session, cache_key, is_first_turn)
         print(f"====== Chatbot request completed ======")
         return jsonify(response)
     
     except Exception as e:
+        error_response = busy_response(e)
+        if error_response is not None:
+            payload, status = error_response
+            return jsonify(payload), status
         print(f"Error in chatbot processing: {str(e)}")
         print(traceback.format_exc())
         return jsonify({
@@ -1027,148 +1600,75 @@ def process_chatbot():
             'error': str(e)
         }), 500
 
+def queue_speech(text, language_code):
+    """Submit background TTS for text and describe the job for the chat response"""
+    if not text or not TEXT_TO_SPEECH_AVAILABLE:
+        return {'audioUrl': None, 'audioJobId': None, 'audioStatus': 'unavailable'}
+    
+    # A request that used up its budget answers without audio
+    if request_deadlines.expired():
+        request_deadlines.record_timeout('tts')
+        return {'audioUrl': None, 'audioJobId': None, 'audioStatus': 'skipped'}
+    
+    job = tts_jobs.submit(text, language_code)
+    if job is None:
+        return {'audioUrl': None, 'audioJobId': None, 'audioStatus': 'dropped'}
+    
+    return {
+        'audioUrl': job['audioUrl'],
+        'audioJobId': job['id'],
+        'audioStatus': job['status'],
+        'audioStreamUrl': f"/tts/{job['id']}/stream"
+    }
+
+@app.route('/tts/<job_id>', methods=['GET'])
+def get_tts_job(job_id):
+    """Report the status of a background TTS job and its audio URL once ready"""
+    if not re.fullmatch(r'[0-9a-f]{64}', job_id):
+        return jsonify({'success': False, 'error': 'Invalid audio job id'}), 400
+    
+    job = tts_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Audio job not found or expired'}), 404
+    
+    return jsonify({
+        'success': True,
+        'audioJobId': job['id'],
+        'status': job['status'],
+        'audioUrl': job['audioUrl']
+    })
+
+@app.route('/tts/<job_id>/stream', methods=['GET'])
+def stream_tts_job(job_id):
+    """
+    Stream a job's audio as chunked MP3. Sentence chunks are synthesized in
+    parallel and sent in order, so playback starts after the first sentence.
+    """
+    if not re.fullmatch(r'[0-9a-f]{64}', job_id):
+        return jsonify({'success': False, 'error': 'Invalid audio job id'}), 400
+    
+    job = tts_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Audio job not found or expired'}), 404
+    
+    if job['status'] == 'ready':
+        return redirect(job['audioUrl'])
+    
+    if job['status'] == 'failed' or not job.get('text'):
+        return jsonify({'success': False, 'error': 'Audio could not be generated'}), 503
+    
+    return Response(
+        stream_with_context(tts_service.stream(job['text'], job['language'])),
+        mimetype='audio/mpeg'
+    )
+
 # Text-to-Speech function
 def generate_text_to_speech(text, language_code='en-US'):
+    """Return a URL for spoken audio of text, reusing identical clips"""
     if not TEXT_TO_SPEECH_AVAILABLE:
         print("Text-to-Speech is not available: the required library is not installed")
         return None
-    
-    # Extract the base language code
-    base_lang = language_code.split('-')[0]
-        
-    # Create a cache if it doesn't exist
-    if not hasattr(generate_text_to_speech, 'cache'):
-        generate_text_to_speech.cache = {}
-        
-    # Generate cache key from text and language
-    cache_key = f"{text[:50]}_{language_code}"
-    
-    # Return cached audio URL if available
-    if cache_key in generate_text_to_speech.cache:
-        print(f"Using cached TTS audio for: {cache_key[:30]}...")
-        return generate_text_to_speech.cache[cache_key]
-        
-    try:
-        # Set API key for Text-to-Speech
-        api_key = os.getenv('GOOGLE_API_KEY')
-        
-        # If no API key is available, return None
-        if not api_key:
-            print("No Text-to-Speech API key available, skipping audio generation")
-            print("Set the GOOGLE_API_KEY environment variable to enable Text-to-Speech")
-            return None
-            
-        os.environ["GOOGLE_API_KEY"] = api_key
-        
-        # Initialize Text-to-Speech client
-        try:
-            client = texttospeech.TextToSpeechClient()
-        except Exception as e:
-            print(f"Failed to initialize Text-to-Speech client: {str(e)}")
-            print("This may be due to authentication issues - ensure your API key is correct")
-            return None
-        
-        # Set input text
-        synthesis_input = texttospeech.SynthesisInput(text=text)
-        
-        # Enhanced language map with more voice options
-        language_map = {
-            'en-US': {'language_code': 'en-US', 'name': 'en-US-Neural2-F', 'ssml_gender': 'FEMALE'},
-            'hi-IN': {'language_code': 'hi-IN', 'name': 'hi-IN-Neural2-A', 'ssml_gender': 'FEMALE'},
-            'te-IN': {'language_code': 'te-IN', 'name': 'te-IN-Standard-A', 'ssml_gender': 'FEMALE'},
-            'ta-IN': {'language_code': 'ta-IN', 'name': 'ta-IN-Standard-A', 'ssml_gender': 'FEMALE'},
-            'kn-IN': {'language_code': 'kn-IN', 'name': 'kn-IN-Standard-A', 'ssml_gender': 'FEMALE'},
-            'ml-IN': {'language_code': 'ml-IN', 'name': 'ml-IN-Standard-A', 'ssml_gender': 'FEMALE'}
-        }
-        
-        # Fallback to base language codes if specific variant not found
-        if language_code not in language_map:
-            base_lang_key = None
-            for lang_key in language_map.keys():
-                if lang_key.startswith(f"{base_lang}-"):
-                    base_lang_key = lang_key
-                    break
-            
-            if base_lang_key:
-                print(f"Using fallback voice {base_lang_key} for {language_code}")
-                voice_params = language_map[base_lang_key]
-            else:
-                print(f"No voice found for {language_code}, using English")
-                voice_params = language_map['en-US']
-        else:
-            voice_params = language_map[language_code]
-        
-        # Configure voice
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=voice_params['language_code'],
-            name=voice_params['name'],
-            ssml_gender=getattr(texttospeech.SsmlVoiceGender, voice_params['ssml_gender'])
-        )
-        
-        # Configure audio output
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=1.0,  # Normal speed
-            pitch=0.0,  # Default pitch
-            volume_gain_db=0.0  # Default volume
-        )
-        
-        # Generate speech
-        print(f"Requesting TTS for text in {language_code}")
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
-        
-        # Save audio file temporarily
-        audio_file_name = f"tts_{uuid.uuid4()}.mp3"
-        audio_path = os.path.join(tempfile.gettempdir(), audio_file_name)
-        
-        with open(audio_path, "wb") as out:
-            out.write(response.audio_content)
-        
-        # Return URL to audio file
-        audio_url = f"/static/tts/{audio_file_name}"
-        
-        # Ensure the directory exists
-        tts_dir = os.path.join(app.static_folder, 'tts')
-        os.makedirs(tts_dir, exist_ok=True)
-        
-        # Move file to static directory
-        permanent_path = os.path.join(tts_dir, audio_file_name)
-        os.rename(audio_path, permanent_path)
-        
-        # Cache the audio URL
-        generate_text_to_speech.cache[cache_key] = audio_url
-        
-        # Limit cache size
-        if len(generate_text_to_speech.cache) > 50:
-            # Remove oldest entries
-            oldest_keys = list(generate_text_to_speech.cache.keys())[:10]
-            for key in oldest_keys:
-                del generate_text_to_speech.cache[key]
-                
-        # Clean up old audio files (files older than 1 hour)
-        try:
-            cleanup_time = time.time() - 3600  # 1 hour ago
-            for old_file in os.listdir(tts_dir):
-                file_path = os.path.join(tts_dir, old_file)
-                if os.path.isfile(file_path) and os.path.getmtime(file_path) < cleanup_time:
-                    try:
-                        os.remove(file_path)
-                        print(f"Removed old TTS file: {old_file}")
-                    except:
-                        pass
-        except Exception as cleanup_err:
-            print(f"Error during TTS file cleanup: {str(cleanup_err)}")
-        
-        return audio_url
-    
-    except Exception as e:
-        print(f"Error generating speech: {str(e)}")
-        print(traceback.format_exc())
-        return None
+    return tts_service.synthesize(text, language_code)
 
 # Configure static folder if it doesn't exist
 if not hasattr(app, 'static_folder'):
@@ -1180,29 +1680,80 @@ if not hasattr(app, 'static_folder'):
 if TEXT_TO_SPEECH_AVAILABLE:
     os.makedirs(os.path.join(app.static_folder, 'tts'), exist_ok=True)
 
-# Define disease name mapping at the module level for reuse
-disease_names = [
-    ("apple scab", "apple_scab"),
-    ("apple___apple_scab", "apple_scab"),
-    ("applescab", "apple_scab"),
-    ("bacterial spot", "bacterial_spot"),
-    ("bacteria___bacterial_spot", "bacterial_spot"),
-    ("black spot", "black_spot"),
-    ("black_rot", "black_rot"),
-    ("early blight", "early_blight"),
-    ("late blight", "late_blight"),
-    ("leaf curl", "leaf_curl"),
-    ("powdery mildew", "powdery_mildew"),
-    ("rust", "rust"),
-    ("citrus greening", "citrus_greening"),
-    ("bacterialspot", "bacterial_spot"),
-    ("blackspot", "black_spot"),
-    ("earlyblight", "early_blight"),
-    ("lateblight", "late_blight"),
-    ("leafcurl", "leaf_curl"),
-    ("powderymildew", "powdery_mildew"),
-    ("citrusgreening", "citrus_greening")
-]
+# Shared TTS service: one long-lived client, content-addressed audio files
+# Background janitor keeps generated audio within a TTL and a disk quota
+tts_janitor = AudioJanitor(
+    os.path.join(app.static_folder, 'tts'),
+    max_bytes=int(os.environ.get("TTS_CACHE_MAX_BYTES", 200 * 1024 * 1024)),
+    ttl_seconds=int(os.environ.get("TTS_CACHE_TTL", 3600)),
+    interval_seconds=int(os.environ.get("TTS_JANITOR_INTERVAL", 60))
+)
+
+# Pre-rendered knowledge-base audio, built offline with audio_pack.py
+audio_pack = AudioPack(os.environ.get("AUDIO_PACK_DIR", DEFAULT_PACK_DIR))
+
+tts_service = TTSService(
+    os.path.join(app.static_folder, 'tts'),
+    url_prefix='/static/tts',
+    janitor=tts_janitor,
+    audio_pack=audio_pack,
+    chunk_executor=bulkheads['tts']
+)
+tts_janitor.on_evict = tts_service.forget
+tts_janitor.start()
+
+# Background synthesis so chat answers never wait for audio
+tts_jobs = TTSJobQueue(
+    tts_service,
+    workers=int(os.environ.get("TTS_WORKERS", 2)),
+    max_pending=int(os.environ.get("TTS_MAX_PENDING", 50))
+)
+
+@app.route('/audio_pack/<key>.mp3', methods=['GET'])
+def get_audio_pack_clip(key):
+    """Serve a pre-rendered clip; send_file hands the file to the server's sendfile support"""
+    path = audio_pack.path_for(key) if re.fullmatch(r'[0-9a-f]{64}', key) else None
+    if not path:
+        return jsonify({'success': False, 'error': 'Audio clip not found'}), 404
+    return send_file(path, mimetype='audio/mpeg', conditional=True, max_age=31536000)
+
+@app.after_request
+def add_audio_cache_headers(response):
+    # TTS files are named by a hash of their content, so they never change
+    if request.path.startswith('/static/tts/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        tts_janitor.record_access(request.path.rsplit('/', 1)[-1])
+    elif request.path.startswith('/audio_pack/') and response.status_code in (200, 206, 304):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# Operational metrics for the backend's caches and upstream clients
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return jsonify({
+        "success": True,
+        "translation": translator.stats(),
+        "tts": tts_service.stats(),
+        "tts_jobs": tts_jobs.stats(),
+        "tts_storage": tts_janitor.stats(),
+        "audio_pack": audio_pack.stats(),
+        "kb_bundles": kb_bundles.stats(),
+        "knowledge_base": knowledge_base.stats(),
+        "retrieval": context_retriever.stats(),
+        "chat_tiers": chat_router.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "treatment_bundles": treatment_bundle_cache.stats(),
+        "treatment_summaries": treatment_summaries.stats(),
+        "model_routes": model_route_stats(),
+        "deadlines": request_deadlines.stats(),
+        "bulkheads": bulkheads.stats(),
+        "rate_limits": admission.stats(),
+        "clarifai_breaker": clarifai_breaker.stats(),
+        "prediction_cache": prediction_results.stats(),
+        "prediction_log": prediction_log.stats(),
+        "idempotency": idempotent_requests.stats(),
+        "uploads": upload_sessions.stats()
+    })
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
@@ -13,21 +13,11 @@ import traceback
 import json
 import tempfile
 import re
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import nltk
 import requests
+from knowledge_base import KnowledgeBase
+from text_matcher import AhoCorasick
+from text_preprocessing import TextPreprocessor
 
-# Download NLTK resources
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    nltk.download('wordnet', quiet=True)
-    NLP_AVAILABLE = True
-except Exception as e:
-    print(f"Error downloading NLTK resources: {str(e)}")
-    NLP_AVAILABLE = False
 
 try:
     from google.cloud import texttospeech
@@ -107,18 +97,7 @@ def preprocess_text(text):
         return text.lower()
     
     try:
-        # Tokenize
-        tokens = word_tokenize(text.lower())
-        
-        # Remove stopwords and punctuation
-        stop_words = set(stopwords.words('english'))
-        tokens = [word for word in tokens if word.isalnum() and word not in stop_words]
-        
-        # Lemmatize
-        lemmatizer = WordNetLemmatizer()
-        tokens = [lemmatizer.lemmatize(word) for word in tokens]
-        
-        return ' '.join(tokens)
+        return text_preprocessor.preprocess(text)
     except Exception as e:
         print(f"Error in NLP preprocessing: {str(e)}")
         return text.lower()
@@ -307,81 +286,55 @@ def history():
             "predictions": []
         }), 500
 
-# Knowledge base for plant diseases
-plant_disease_data = {
-    "apple_scab": {
-        "name": "Apple Scab",
-        "description": "Apple scab is a common fungal disease that affects apple trees. It appears as dark, scaly lesions on leaves and fruit.",
-        "causes": "Caused by the fungus Venturia inaequalis, especially in cool, wet spring weather.",
-        "symptoms": "Dark olive-green spots that later become brown and corky on leaves and fruit. Severely infected leaves may turn yellow and drop.",
-        "treatment": "Remove infected leaves, apply fungicide, and ensure good air circulation. Use resistant apple varieties when possible.",
-        "prevention": "Apply fungicide sprays from budbreak until rainy season ends. Rake and destroy fallen leaves. Prune to improve air circulation."
-    },
-    "bacterial_spot": {
-        "name": "Bacterial Spot",
-        "description": "Bacterial spot causes small, dark lesions on leaves, stems, and fruits. It affects peppers and tomatoes.",
-        "causes": "Caused by Xanthomonas bacteria, spread by splashing water, insects, and handling plants.",
-        "symptoms": "Small, water-soaked spots on leaves that turn brown with a yellow halo. Spots on fruit start as small bumps.",
-        "treatment": "Copper-based sprays can help manage it, but prevention is key. Remove and destroy infected plant material.",
-        "prevention": "Use disease-free seeds and transplants. Avoid overhead irrigation. Rotate crops and ensure proper spacing."
-    },
-    "black_spot": {
-        "name": "Black Spot",
-        "description": "Black spot is a fungal disease that causes black spots on leaves, which then yellow and drop. It commonly affects roses.",
-        "causes": "Caused by Diplocarpon rosae fungus, especially in warm, humid conditions.",
-        "symptoms": "Circular black spots with feathery margins on leaves. Infected leaves turn yellow and drop prematurely.",
-        "treatment": "Remove infected leaves. Apply fungicides labeled for black spot control.",
-        "prevention": "Choose resistant varieties. Water at the base of plants. Ensure good air circulation."
-    },
-    "early_blight": {
-        "name": "Early Blight",
-        "description": "Early blight is a fungal disease causing target-shaped brown spots on lower leaves first. It affects tomatoes and potatoes.",
-        "causes": "Caused by Alternaria solani fungus, favored by warm, humid conditions.",
-        "symptoms": "Dark brown spots with concentric rings creating a target pattern, usually on older leaves first.",
-        "treatment": "Remove infected leaves and apply fungicide. Ensure adequate plant nutrition.",
-        "prevention": "Rotate crops. Use mulch to prevent soil splash. Provide adequate spacing for air circulation."
-    },
-    "late_blight": {
-        "name": "Late Blight",
-        "description": "Late blight is a devastating disease affecting tomatoes and potatoes. It causes dark lesions on leaves and can quickly kill plants.",
-        "causes": "Caused by Phytophthora infestans, favored by cool, wet conditions.",
-        "symptoms": "Large, dark brown blotches on leaves and stems with white fungal growth on leaf undersides in humid conditions.",
-        "treatment": "Remove infected plants to prevent spread. Apply fungicides preventatively.",
-        "prevention": "Use resistant varieties. Avoid overhead irrigation. Destroy volunteer potato plants."
-    },
-    "leaf_curl": {
-        "name": "Leaf Curl",
-        "description": "Leaf curl is a fungal disease causing leaves to pucker, thicken, and curl. It commonly affects peach trees.",
-        "causes": "Caused by Taphrina deformans fungus, infecting during cool, wet spring weather.",
-        "symptoms": "Red, puckered, distorted leaves that eventually turn yellow and drop.",
-        "treatment": "Once symptoms appear, treatment in the current season isn't effective. Remove infected leaves.",
-        "prevention": "Apply fungicide as a dormant spray before buds swell in late winter/early spring."
-    },
-    "powdery_mildew": {
-        "name": "Powdery Mildew",
-        "description": "Powdery mildew appears as white powdery spots on leaves and stems. It thrives in high humidity.",
-        "causes": "Caused by various fungi, thrives in high humidity with moderate temperatures.",
-        "symptoms": "White, powdery coating on leaves, stems, and sometimes fruit. Leaves may curl, turn yellow, and drop.",
-        "treatment": "Apply fungicides, neem oil, or a baking soda solution. Remove severely infected plants.",
-        "prevention": "Provide good air circulation. Water at the base of plants. Choose resistant varieties."
-    },
-    "rust": {
-        "name": "Rust",
-        "description": "Rust diseases cause orange-brown pustules on leaf undersides. They affect many plants including roses and beans.",
-        "causes": "Caused by various fungi in the order Pucciniales. Often requires alternate hosts to complete lifecycle.",
-        "symptoms": "Orange to rusty-brown pustules mainly on leaf undersides. Severe infections cause leaf yellowing and drop.",
-        "treatment": "Apply fungicides labeled for rust control. Remove severely infected plants.",
-        "prevention": "Avoid wetting leaves when watering. Provide adequate spacing. Remove alternate host plants if applicable."
-    },
-    "citrus_greening": {
-        "name": "Citrus Greening",
-        "description": "Citrus greening is a bacterial disease spread by insects. It causes mottled leaves and misshapen, bitter fruit.",
-        "causes": "Caused by Candidatus Liberibacter bacteria, spread by Asian citrus psyllid insects.",
-        "symptoms": "Blotchy mottled leaves, yellowing of leaf veins, lopsided and bitter fruit that remains green at the base.",
-        "treatment": "No cure available. Remove infected trees to prevent spread.",
-        "prevention": "Control psyllid populations with insecticides. Use certified disease-free nursery stock."
-    }
-}
+# Knowledge base shared with app.py, compiled from data/knowledge_base.json
+knowledge_base = KnowledgeBase()
+
+# Keyword groups in priority order: the first group found in a message wins
+KEYWORD_GROUPS = [
+    ("description", ["what", "describe", "explain", "tell me about", "what is", "what are"]),
+    ("causes", ["cause", "why", "how does", "reason"]),
+    ("symptoms", ["symptom", "sign", "identify", "look like", "appears"]),
+    ("treatment", ["treat", "cure", "fix", "heal", "remedy", "solution"]),
+    ("prevention", ["prevent", "avoid", "stop", "protect"]),
+    ("general_treatment", ["treatment", "remedy"]),
+    ("general_prevention", ["prevention", "prevent"]),
+    ("fertilizer", ["fertilizer", "fertilize", "nutrients", "feed"]),
+    ("pests", ["pest", "insect", "bug", "aphid", "mite"]),
+    ("watering", ["water", "irrigation", "moisture", "dry"]),
+    ("soil", ["soil", "compost", "mulch", "dirt"]),
+    ("greeting", ["hello", "hi", "hey", "greetings"])
+]
+INTENTS = ["description", "causes", "symptoms", "treatment", "prevention"]
+
+# NLP resources are loaded once from the bundled nltk_data directory. Words the
+# keyword groups look for ("what", "why", "how does") are kept as non-stopwords.
+text_preprocessor = TextPreprocessor(
+    keep_words={word for _, keywords in KEYWORD_GROUPS for keyword in keywords for word in keyword.split()}
+)
+NLP_AVAILABLE = text_preprocessor.available
+
+# Warm the lemma cache with the knowledge-base vocabulary
+try:
+    text_preprocessor.preprocess_batch(
+        [name for name, _ in knowledge_base.snapshot().disease_names] +
+        [text for info in knowledge_base.snapshot().plant_disease_data.values() for text in info.values()]
+    )
+except Exception as e:
+    print(f"Error warming the text preprocessor: {str(e)}")
+
+
+def build_message_matcher(kb):
+    """
+    Compile every keyword and disease alias into one automaton. Matches are
+    plain substrings, as in the original keyword checks.
+    """
+    matcher = AhoCorasick()
+    for group, keywords in KEYWORD_GROUPS:
+        for keyword in keywords:
+            matcher.add(keyword, ("keyword", group), word_start=False, word_end=False)
+    for position, (name, key) in enumerate(kb.disease_names):
+        matcher.add(name, ("disease", position), word_start=False, word_end=False)
+    return matcher.build()
 
 # Enhanced chatbot response function
 def process_message(message, language_code='en-US'):
@@ -396,44 +349,19 @@ def process_message(message, language_code='en-US'):
     processed_message = preprocess_text(message.lower())
     
     # Extract potential disease name from the message
-    disease_names = [
-        ("apple scab", "apple_scab"),
-        ("bacterial spot", "bacterial_spot"),
-        ("black spot", "black_spot"),
-        ("early blight", "early_blight"),
-        ("late blight", "late_blight"),
-        ("leaf curl", "leaf_curl"),
-        ("powdery mildew", "powdery_mildew"),
-        ("rust", "rust"),
-        ("citrus greening", "citrus_greening"),
-        ("applescab", "apple_scab"),
-        ("bacterialspot", "bacterial_spot"),
-        ("blackspot", "black_spot"),
-        ("earlyblight", "early_blight"),
-        ("lateblight", "late_blight"),
-        ("leafcurl", "leaf_curl"),
-        ("powderymildew", "powdery_mildew"),
-        ("citrusgreening", "citrus_greening")
-    ]
+    kb = knowledge_base.snapshot()
+    plant_disease_data = kb.plant_disease_data
+    
+    # Find every keyword and disease alias in a single pass over the message
+    matches = kb.derived('message_matcher', build_message_matcher).payloads(processed_message)
+    groups = {value for kind, value in matches if kind == "keyword"}
+    disease_positions = [value for kind, value in matches if kind == "disease"]
     
-    identified_disease = None
-    for name, key in disease_names:
-        if name.lower() in processed_message:
-            identified_disease = key
-            break
+    # The first listed disease name found in the message wins
+    identified_disease = kb.disease_names[min(disease_positions)][1] if disease_positions else None
     
     # Check for intents in the message
-    intent = None
-    if any(word in processed_message for word in ["what", "describe", "explain", "tell me about", "what is", "what are"]):
-        intent = "description"
-    elif any(word in processed_message for word in ["cause", "why", "how does", "reason"]):
-        intent = "causes"
-    elif any(word in processed_message for word in ["symptom", "sign", "identify", "look like", "appears"]):
-        intent = "symptoms"
-    elif any(word in processed_message for word in ["treat", "cure", "fix", "heal", "remedy", "solution"]):
-        intent = "treatment"
-    elif any(word in processed_message for word in ["prevent", "avoid", "stop", "protect"]):
-        intent = "prevention"
+    intent = next((name for name in INTENTS if name in groups), None)
     
     # Generate response based on intent and identified disease
     response = None
@@ -455,41 +383,41 @@ def process_message(message, language_code='en-US'):
                   f"Treatment: {disease_info['treatment']}")
     
     # General queries about treatments or prevention
-    elif "treatment" in processed_message or "remedy" in processed_message:
+    elif "general_treatment" in groups:
         response = ("For treating plant diseases: 1) Remove infected parts, 2) Improve air circulation, "
                   "3) Apply appropriate fungicides, 4) Ensure proper watering, and 5) Add mulch to prevent soil splashing. "
                   "Always follow product label instructions.")
     
-    elif "prevention" in processed_message or "prevent" in processed_message:
+    elif "general_prevention" in groups:
         response = ("To prevent crop diseases: 1) Choose resistant varieties, 2) Ensure proper spacing, "
                   "3) Water at the base of plants, 4) Practice crop rotation, 5) Remove diseased plant material, "
                   "and 6) Apply organic or chemical preventatives as needed.")
     
     # Fertilizer questions
-    elif any(word in processed_message for word in ["fertilizer", "fertilize", "nutrients", "feed"]):
+    elif "fertilizer" in groups:
         response = ("For crop nutrition, consider using balanced NPK fertilizers based on soil tests. "
                   "Organic options include compost, manure, and specific plant-based fertilizers.")
     
     # Pest questions
-    elif any(word in processed_message for word in ["pest", "insect", "bug", "aphid", "mite"]):
+    elif "pests" in groups:
         response = ("To control garden pests: 1) Identify the pest correctly, 2) Start with the least toxic methods, "
                   "3) Consider beneficial insects, 4) Use insecticidal soaps or neem oil for soft-bodied pests, "
                   "5) Use targeted treatments for specific pests.")
     
     # Watering questions
-    elif any(word in processed_message for word in ["water", "irrigation", "moisture", "dry"]):
+    elif "watering" in groups:
         response = ("Proper watering is crucial: 1) Water deeply and infrequently to encourage deep roots, "
                   "2) Water at the base to keep foliage dry, 3) Water in the morning, "
                   "4) Use drip irrigation when possible, 5) Adjust based on weather conditions and plant needs.")
     
     # Soil questions
-    elif any(word in processed_message for word in ["soil", "compost", "mulch", "dirt"]):
+    elif "soil" in groups:
         response = ("Healthy soil is the foundation for healthy plants: 1) Add organic matter regularly, "
                   "2) Test soil pH and nutrients, 3) Use appropriate amendments, "
                   "4) Apply mulch to conserve moisture and suppress weeds, 5) Avoid compacting the soil.")
     
     # Greeting
-    elif any(word in processed_message for word in ["hello", "hi", "hey", "greetings"]):
+    elif "greeting" in groups:
         response = "Hello! I'm your Crop Care Assistant. How can I help you with your plants today?"
     
     # Default response if no specific pattern is matched
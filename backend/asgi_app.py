@@ -0,0 +1,389 @@
+"""
+ASGI serving mode for the CropCare backend.
+
+The Flask app in app.py holds a worker thread for every second it waits on
+Clarifai, Supabase, Groq or Google Translate, so its concurrency is capped
+by the number of threads. This module serves the two slow endpoints,
+/predict and /chatbot, natively on asyncio with async clients (grpc.aio,
+httpx and AsyncGroq), so one worker process can hold hundreds of upstream
+calls open at once. Predictions reach Supabase through the prediction log's
+background replayer, so /predict only waits for the local log append. Every other route is passed
+to the Flask app unchanged, so routes and JSON contracts are identical.
+
+All caches, knowledge-base snapshots, chat sessions and the TTS queue are
+shared with the Flask app in the same process.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import time
+import traceback
+import uuid
+
+import groq
+import grpc
+from clarifai_grpc.channel import clarifai_channel
+from clarifai_grpc.grpc.api import service_pb2_grpc
+from clarifai_grpc.grpc.api.status import status_code_pb2
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from werkzeug.http import parse_list_header
+
+import app as backend
+from chat_router import format_answer
+from deadlines import DeadlineExceeded
+from idempotency import CONFLICT, IN_PROGRESS, OWNER, REPLAYED
+from language_detection import needs_translation
+from translation import AsyncTranslator
+
+# Paths served natively; everything else goes to the Flask app
+NATIVE_PATHS = {'/predict', '/chatbot'}
+
+
+class AsyncClients:
+    """Async upstream clients, created on the server's event loop at startup"""
+
+    def __init__(self):
+        self.translator = None
+        self.groq = None
+        self.clarifai = None
+        self.clarifai_channel = None
+
+    async def start(self):
+        self.translator = AsyncTranslator(backend.translator)
+
+        if backend.GROQ_AVAILABLE:
+            self.groq = groq.AsyncGroq(api_key=backend.GROQ_API_KEY, max_retries=0)
+
+        # ClarifaiChannel selects the gRPC response deserializer for its own
+        # channels; do the same for the asyncio channel
+        clarifai_channel.wrap_response_deserializer = clarifai_channel._response_deserializer_for_grpc
+        self.clarifai_channel = grpc.aio.secure_channel(
+            backend.os.environ.get("CLARIFAI_GRPC_BASE", "api.clarifai.com"),
+            grpc.ssl_channel_credentials(),
+            options=[("grpc.service_config", clarifai_channel.grpc_json_config)]
+        )
+        self.clarifai = service_pb2_grpc.V2Stub(self.clarifai_channel)
+
+        print("ASGI async clients ready")
+
+    async def stop(self):
+        if self.translator is not None:
+            await self.translator.close()
+        if self.clarifai_channel is not None:
+            await self.clarifai_channel.close()
+
+
+clients = AsyncClients()
+
+
+def with_deadline(endpoint):
+    """Run a handler under a request deadline, like the Flask before_request hook"""
+    def decorator(handler):
+        async def wrapper(request):
+            token = backend.request_deadlines.start(endpoint)
+            try:
+                return await handler(request)
+            finally:
+                backend.request_deadlines.finish(token)
+        return wrapper
+    return decorator
+
+
+def client_address(request):
+    """Client address behind TRUSTED_PROXY_HOPS proxies, as ProxyFix finds it for the Flask routes"""
+    hops = backend.TRUSTED_PROXY_HOPS
+    if hops > 0:
+        forwarded = parse_list_header(request.headers.get('X-Forwarded-For', ''))
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.client.host if request.client else None
+
+
+async def translate_text(text, target_language, source_language='auto'):
+    """Async equivalent of app.translate_text"""
+    if source_language == 'auto':
+        needed, source_language = needs_translation(text, target_language)
+        if not needed:
+            return text
+    try:
+        timeout = backend.request_deadlines.timeout('translation')
+    except DeadlineExceeded:
+        return text
+    return await clients.translator.translate(text, target_language, source_language, timeout=timeout)
+
+
+async def process_message(message, language_code='en-US', session=None):
+    """
+    Async equivalent of app.process_message.
+
+    Returns:
+        tuple: (response_text, model_used)
+    """
+    is_english = language_code.startswith('en')
+
+    # Translate non-English input to English for processing
+    translated_message = message
+    if not is_english:
+        try:
+            translated_message = await translate_text(message, 'en-US')
+        except Exception as e:
+            print(f"Error translating message to English: {str(e)}")
+
+    # Answer clear questions about a single disease straight from the knowledge base
+    try:
+        parts = backend.chat_router.match(translated_message)
+    except Exception as e:
+        print(f"Error answering from the knowledge base: {str(e)}")
+        parts = None
+    if parts:
+        english_response = format_answer(parts[0], parts[1])
+        response = english_response
+        if not is_english:
+            response = backend.chat_router.localize_known(parts[0], parts[1], language_code)
+            if not response:
+                backend.chat_router.record_live_translation()
+                response = await translate_text(english_response, language_code, 'en')
+        backend.chat_router.record('knowledge_base')
+        if session is not None:
+            backend.chat_sessions.add_turn(session, translated_message, english_response)
+        return response, backend.KNOWLEDGE_BASE_MODEL
+    backend.chat_router.record('llm')
+
+    messages, grounded = backend.build_chat_messages(translated_message, session)
+
+    response = None
+    model_used = None
+    if clients.groq is not None:
+        model_order = backend.chat_model_order(grounded)
+        for attempt, current_model in enumerate(model_order):
+            try:
+                model_used = current_model
+                chat_completion = await clients.groq.chat.completions.create(
+                    messages=messages,
+                    model=current_model,
+                    temperature=0.5,
+                    max_tokens=800,
+                    top_p=1,
+                    stream=False,
+                    timeout=backend.request_deadlines.timeout('llm')
+                )
+                response = chat_completion.choices[0].message.content
+                break
+            except Exception as model_error:
+                print(f"Error calling Groq model {current_model}: {str(model_error)}")
+                if isinstance(model_error, groq.APITimeoutError):
+                    backend.request_deadlines.record_timeout('llm')
+                if attempt + 1 < len(model_order) and not backend.request_deadlines.expired():
+                    continue
+                response = backend.CHAT_ERROR_RESPONSE
+                model_used = "Error"
+    else:
+        response = backend.CHAT_UNAVAILABLE_RESPONSE
+        model_used = "Not Available"
+
+    if session is not None and response and model_used not in ["Error", "Not Available"]:
+        backend.chat_sessions.add_turn(session, translated_message, response)
+
+    # Translate response back to original language if needed
+    if not is_english and response:
+        try:
+            response = await translate_text(response, language_code)
+        except Exception as e:
+            print(f"Error translating response: {str(e)}")
+
+    return response, model_used
+
+
+@with_deadline('chatbot')
+async def chatbot(request):
+    try:
+        user_key = backend.rate_limit_key(request.headers.get('Authorization'), client_address(request))
+        error = backend.rate_limit_error('chatbot', user_key)
+        if error is not None:
+            payload, status, headers = error
+            return JSONResponse(payload, status_code=status, headers=headers)
+
+        data = await request.json()
+        user_message = data.get('message', '')
+        language_code = data.get('language', 'en-US')
+        session = backend.chat_sessions.get_or_create(data.get('sessionId'))
+
+        cache_key = backend.chatbot_cache_key(user_message, language_code)
+        is_first_turn = not session.turns
+        cached_response = backend.cached_chatbot_response(cache_key, session, language_code)
+        if cached_response is not None:
+            return JSONResponse(cached_response)
+
+        start_time = time.time()
+        response_text, model_used = await process_message(user_message, language_code, session)
+        print(f"Generated response in {time.time() - start_time:.2f} seconds using model: {model_used}")
+
+        # Verify language - ensure non-English responses are actually translated
+        if not language_code.startswith('en'):
+            needed, source_language = needs_translation(response_text, language_code)
+            if needed:
+                response_text = await translate_text(response_text, language_code, source_language)
+
+        return JSONResponse(backend.finish_chatbot_response(
+            response_text, model_used, language_code, session, cache_key, is_first_turn
+        ))
+
+    except Exception as e:
+        print(f"Error in chatbot processing: {str(e)}")
+        print(traceback.format_exc())
+        return JSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+
+async def run_prediction(user_id, image_bytes, language_code):
+    """Async equivalent of app.run_prediction; returns (payload, status, headers)"""
+    filename = f"{uuid.uuid4()}.jpg"
+
+    if not backend.clarifai_breaker.allow():
+        return await run_in_threadpool(
+            backend.clarifai_unavailable_response, image_bytes, language_code
+        )
+
+    try:
+        call_started = time.time()
+        try:
+            response = await clients.clarifai.PostModelOutputs(
+                backend.build_clarifai_request(image_bytes),
+                metadata=backend.clarifai_metadata(),
+                timeout=backend.request_deadlines.timeout('clarifai')
+            )
+        except Exception as call_error:
+            if backend.clarifai_failure_counts(call_error):
+                backend.clarifai_breaker.record_failure(str(call_error) or type(call_error).__name__)
+            raise
+
+        if response.status.code != status_code_pb2.SUCCESS:
+            if backend.clarifai_failure_counts(response.status):
+                backend.clarifai_breaker.record_failure(response.status.description)
+            payload, status = backend.clarifai_error(response.status)
+            return payload, status, {}
+        backend.clarifai_breaker.record_success(time.time() - call_started)
+
+        outputs = backend.clarifai_outputs(response)
+        backend.prediction_results.add(image_bytes, outputs)
+        highest_prediction = max(outputs, key=lambda x: x["value"])
+        prediction_id, timestamp, prediction_data = backend.record_prediction(
+            user_id, filename, highest_prediction, image_bytes
+        )
+
+        # Logging the row and assembling the treatment information are independent
+        _, prediction = await asyncio.gather(
+            run_in_threadpool(backend.store_prediction, prediction_data),
+            run_in_threadpool(
+                backend.build_prediction_response,
+                prediction_id, highest_prediction, outputs, timestamp, language_code
+            )
+        )
+        return {
+            "success": True,
+            "prediction": prediction
+        }, 200, {}
+
+    except Exception as e:
+        timeout_error = backend.clarifai_timeout_error(e)
+        if timeout_error is not None:
+            payload, status = timeout_error
+            return payload, status, {}
+
+        error_traceback = traceback.format_exc()
+        error_message = str(e) if str(e) else "Unknown error occurred"
+        print(f"Exception in Clarifai API call: {error_message}")
+        print(f"Traceback: {error_traceback}")
+
+        return {
+            "error": f"Error calling Clarifai API: {error_message}",
+            "details": error_traceback
+        }, 500, {}
+    finally:
+        backend.clarifai_breaker.release_probe()
+
+
+async def run_idempotent(idempotency_key, fingerprint, handler):
+    """Async equivalent of IdempotencyStore.run for an async handler"""
+    store = backend.idempotent_requests
+    while True:
+        entry, outcome = store.claim(idempotency_key, fingerprint)
+        if outcome == OWNER:
+            try:
+                response = await handler()
+            except BaseException:
+                store.abandon(idempotency_key, entry)
+                raise
+            store.complete(idempotency_key, entry, response)
+            return response, OWNER
+        if outcome == REPLAYED:
+            return entry.response, REPLAYED
+        if outcome == CONFLICT:
+            return None, CONFLICT
+        if not await run_in_threadpool(entry.event.wait, backend.request_deadlines.remaining()):
+            store.timed_out()
+            return None, IN_PROGRESS
+
+
+@with_deadline('predict')
+async def predict(request):
+    form = await request.form()
+    user_id = form.get("user_id", "anonymous")
+    idempotency_key = request.headers.get("Idempotency-Key")
+    replay = idempotency_key and backend.idempotent_requests.has_response(idempotency_key)
+    user_key = backend.rate_limit_key(request.headers.get('Authorization'), client_address(request))
+    error = None if replay else backend.rate_limit_error('predict', user_key)
+    if error is not None:
+        payload, status, headers = error
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+    if "image" not in form:
+        return JSONResponse({"error": "No image file provided"}, status_code=400)
+
+    language_code = form.get("language", "en-US")
+    image_bytes = await form["image"].read()
+
+    if idempotency_key:
+        response, outcome = await run_idempotent(
+            idempotency_key,
+            backend.prediction_fingerprint(user_id, image_bytes, language_code),
+            lambda: run_prediction(user_id, image_bytes, language_code)
+        )
+        payload, status, headers = backend.idempotent_response(idempotency_key, outcome, response)
+    else:
+        payload, status, headers = await run_prediction(user_id, image_bytes, language_code)
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+
+native_app = Starlette(
+    routes=[
+        Route('/predict', predict, methods=['POST']),
+        Route('/chatbot', chatbot, methods=['POST'])
+    ],
+    middleware=[
+        # Matches CORS(app) on the Flask side, which covers the other routes
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['Retry-After', 'Idempotent-Replayed'])
+    ],
+    on_startup=[clients.start],
+    on_shutdown=[clients.stop]
+)
+
+flask_app = WSGIMiddleware(backend.app)
+
+
+async def app(scope, receive, send):
+    """Dispatch the slow endpoints to the async app and the rest to Flask"""
+    if scope['type'] == 'lifespan' or scope.get('path') in NATIVE_PATHS:
+        await native_app(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
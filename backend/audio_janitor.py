@@ -0,0 +1,204 @@
+"""
+Background janitor for the generated TTS audio directory.
+
+Keeps an in-memory index of every clip's size and last access time so the
+request path never has to list or stat the directory. A daemon thread
+periodically removes clips that have not been used within the TTL and then
+evicts least-recently-used clips until the directory fits its byte quota.
+
+Several worker processes can share one directory, each with its own
+janitor. Every sweep therefore rescans the directory, so the quota counts
+clips written by any process, and accesses are written back to the files'
+modification times (at most once per interval) so every janitor sees them.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Younger .part files may be writes still in progress in another process
+PART_FILE_GRACE_SECONDS = 300
+
+
+class AudioJanitor:
+    """
+    Tracks files in audio_dir and enforces a TTL and a byte quota.
+
+    The directory is scanned when the janitor starts and before every
+    sweep; in between the index is kept up to date through record_write and
+    record_access. on_evict is called with the file name of every removed
+    clip, including clips another process removed.
+    """
+
+    def __init__(self, audio_dir, max_bytes=200 * 1024 * 1024, ttl_seconds=3600,
+                 interval_seconds=60, on_evict=None):
+        self.audio_dir = audio_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.interval_seconds = interval_seconds
+        self.on_evict = on_evict
+        # file name -> (size, last access), least recently used first
+        self._files = OrderedDict()
+        # file name -> modification time, the access time other processes see
+        self._shared = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.evicted_ttl = 0
+        self.evicted_quota = 0
+        self.sweeps = 0
+
+    def start(self):
+        """Index the existing files and start the background thread"""
+        self._scan()
+        self._thread = threading.Thread(target=self._run, name="tts-janitor", daemon=True)
+        self._thread.start()
+        print(f"TTS audio janitor started: {len(self._files)} files, {self._total_bytes} bytes indexed")
+
+    def stop(self):
+        self._stop.set()
+
+    def _scan(self):
+        """
+        Rebuild the index from the directory. Returns the names of indexed
+        files that are no longer on disk.
+        """
+        os.makedirs(self.audio_dir, exist_ok=True)
+        part_cutoff = time.time() - PART_FILE_GRACE_SECONDS
+        entries = []
+        for entry in os.scandir(self.audio_dir):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                # Removed by another process while scanning
+                continue
+            if entry.name.endswith('.part'):
+                if stat.st_mtime < part_cutoff:
+                    # Leftover from an interrupted write
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            entries.append((entry.name, stat.st_size, stat.st_mtime))
+
+        with self._lock:
+            on_disk = set()
+            files = []
+            for name, size, mtime in entries:
+                on_disk.add(name)
+                # Accesses since the last write-back are only known here
+                known = self._files.get(name)
+                files.append((max(mtime, known[1]) if known else mtime, name, size))
+            missing = [name for name in self._files if name not in on_disk]
+
+            self._files.clear()
+            self._shared = {name: mtime for name, _, mtime in entries}
+            self._total_bytes = 0
+            for last_access, name, size in sorted(files):
+                self._files[name] = (size, last_access)
+                self._total_bytes += size
+        return missing
+
+    def contains(self, name):
+        with self._lock:
+            return name in self._files
+
+    def record_write(self, name, size):
+        now = time.time()
+        with self._lock:
+            previous = self._files.pop(name, None)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._files[name] = (size, now)
+            self._shared[name] = now
+            self._total_bytes += size
+
+    def record_access(self, name):
+        """Mark a clip as used; clips another process wrote are added to the index"""
+        now = time.time()
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is not None:
+                self._files[name] = (entry[0], now)
+                self._files.move_to_end(name)
+                share = now - self._shared.get(name, 0) >= self.interval_seconds
+                if share:
+                    self._shared[name] = now
+        if entry is None:
+            path = os.path.join(self.audio_dir, name)
+            try:
+                size = os.path.getsize(path)
+                os.utime(path)
+            except OSError:
+                return
+            self.record_write(name, size)
+        elif share:
+            # Share the access with the janitors of other processes
+            try:
+                os.utime(os.path.join(self.audio_dir, name))
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error during TTS audio cleanup: {str(e)}")
+
+    def sweep(self):
+        """Evict expired clips, then least-recently-used clips over the quota"""
+        vanished = self._scan()
+        if self.on_evict:
+            for name in vanished:
+                self.on_evict(name)
+
+        cutoff = time.time() - self.ttl_seconds
+        expired = []
+        over_quota = []
+        with self._lock:
+            # Entries are ordered by last access, so expired ones come first
+            for name, (size, last_access) in self._files.items():
+                if last_access >= cutoff:
+                    break
+                expired.append(name)
+            for name in expired:
+                self._total_bytes -= self._files.pop(name)[0]
+                self._shared.pop(name, None)
+
+            while self._total_bytes > self.max_bytes and self._files:
+                name, (size, _) = self._files.popitem(last=False)
+                self._total_bytes -= size
+                self._shared.pop(name, None)
+                over_quota.append(name)
+
+            self.evicted_ttl += len(expired)
+            self.evicted_quota += len(over_quota)
+            self.sweeps += 1
+
+        for name in expired + over_quota:
+            try:
+                os.remove(os.path.join(self.audio_dir, name))
+            except OSError:
+                pass
+            if self.on_evict:
+                self.on_evict(name)
+
+        if expired or over_quota:
+            print(f"TTS janitor removed {len(expired)} expired and {len(over_quota)} over-quota files")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "sweeps": self.sweeps,
+                "evicted_ttl": self.evicted_ttl,
+                "evicted_quota": self.evicted_quota
+            }
@@ -0,0 +1,205 @@
+"""
+Pre-rendered knowledge-base audio packs.
+
+The spoken versions of the plant disease knowledge base are the same for
+every user, so they are rendered ahead of time instead of on demand. A pack
+is a directory audio_packs/<version>/ holding one MP3 per clip, named by the
+same content hash the TTS service uses, plus an index.json. The file
+audio_packs/CURRENT names the version the server should load.
+
+Build a pack with:
+    python audio_pack.py [--languages en-US hi-IN ...] [--output audio_packs]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from chat_router import ChatRouter, iter_answers
+from tts_service import VOICE_MAP, TTSService
+
+DEFAULT_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_packs')
+
+
+class AudioPack:
+    """Read-only view of the current audio pack, loaded once at startup"""
+
+    def __init__(self, pack_dir=DEFAULT_PACK_DIR, url_prefix='/audio_pack'):
+        self.pack_dir = pack_dir
+        self.url_prefix = url_prefix
+        self.version = None
+        self.entries = {}
+        self.hits = 0
+        self._load()
+
+    def _load(self):
+        pointer = os.path.join(self.pack_dir, 'CURRENT')
+        if not os.path.isfile(pointer):
+            print(f"No audio pack found in {self.pack_dir}; knowledge-base audio will be synthesized on demand")
+            return
+
+        try:
+            with open(pointer) as f:
+                version = f.read().strip()
+            with open(os.path.join(self.pack_dir, version, 'index.json'), encoding='utf-8') as f:
+                index = json.load(f)
+            self.version = version
+            self.entries = index.get('entries', {})
+            print(f"Loaded audio pack {version} with {len(self.entries)} clips")
+        except Exception as e:
+            print(f"Error loading audio pack: {str(e)}")
+            self.version = None
+            self.entries = {}
+
+    def path_for(self, key):
+        if key not in self.entries:
+            return None
+        return os.path.join(self.pack_dir, self.version, self.entries[key]['file'])
+
+    def url_for(self, key):
+        if key not in self.entries:
+            return None
+        self.hits += 1
+        return f"{self.url_prefix}/{key}.mp3"
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "clips": len(self.entries),
+            "hits": self.hits
+        }
+
+
+def build_audio_pack(chat_router, output_dir=DEFAULT_PACK_DIR, languages=None):
+    """
+    Render every knowledge-base answer in every language into a new pack.
+
+    Clips are keyed by the exact text chat_router answers with, so a
+    knowledge-base chat answer is served from the pack. Long answers also
+    get their sentence chunks, which streamed playback asks for. Clips
+    already present in the current pack are reused rather than synthesized
+    again. Returns the new pack version.
+    """
+    languages = languages or list(VOICE_MAP.keys())
+    plant_disease_data = chat_router.knowledge_base.snapshot().plant_disease_data
+    previous = AudioPack(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='pack_', dir=output_dir)
+    work_dir = tempfile.mkdtemp(prefix='tts_')
+    service = TTSService(work_dir, url_prefix='')
+
+    entries = {}
+    rendered = 0
+    reused = 0
+    try:
+        for disease_key, field, name, text in iter_answers(plant_disease_data):
+            for language_code in languages:
+                answer = chat_router.localize(name, text, language_code)
+                if not answer:
+                    print(f"No translation of {disease_key}.{field} in {language_code}, skipping")
+                    continue
+                spoken = answer[0]
+                key = service.key_for(spoken, language_code)
+                if key in entries:
+                    continue
+
+                clips = [key] + [chunk_key for chunk_key, _ in service.plan_chunks(spoken, language_code)
+                                 if chunk_key != key]
+                if not all(previous.path_for(clip) for clip in clips) and \
+                        not service.synthesize(spoken, language_code):
+                    print(f"Failed to render {disease_key}.{field} in {language_code}, skipping")
+                    continue
+
+                for clip in clips:
+                    file_name = f"{clip}.mp3"
+                    target = os.path.join(staging_dir, file_name)
+                    existing = previous.path_for(clip)
+                    if existing:
+                        _link_or_copy(existing, target)
+                        reused += 1
+                    else:
+                        shutil.copyfile(service.path_for(clip), target)
+                        rendered += 1
+                    entries[clip] = {
+                        "file": file_name,
+                        "disease": disease_key,
+                        "field": field,
+                        "language": language_code,
+                        "bytes": os.path.getsize(target)
+                    }
+
+        # The version is a hash of the pack contents, so identical builds agree
+        version = hashlib.sha256(
+            json.dumps(sorted(entries.keys())).encode('utf-8')
+        ).hexdigest()[:16]
+        index = {
+            "version": version,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "languages": languages,
+            "entries": entries
+        }
+        with open(os.path.join(staging_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+        final_dir = os.path.join(output_dir, version)
+        if os.path.isdir(final_dir):
+            shutil.rmtree(staging_dir)
+        else:
+            os.rename(staging_dir, final_dir)
+
+        # Switch the pointer atomically so a running server never sees a partial pack
+        pointer_tmp = os.path.join(output_dir, 'CURRENT.tmp')
+        with open(pointer_tmp, 'w') as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(output_dir, 'CURRENT'))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Audio pack {version}: {len(entries)} clips ({rendered} rendered, {reused} reused)")
+    return version
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render knowledge-base audio for all supported languages")
+    parser.add_argument('--languages', nargs='+', default=list(VOICE_MAP.keys()),
+                        help="Voice locales to render (default: all supported)")
+    parser.add_argument('--output', default=DEFAULT_PACK_DIR, help="Audio pack directory")
+    args = parser.parse_args(argv)
+
+    if not os.getenv('GOOGLE_API_KEY'):
+        print("ERROR: GOOGLE_API_KEY must be set to render audio")
+        return 1
+
+    from kb_bundles import DEFAULT_BUNDLE_DIR, GoogleTranslator, KnowledgeBaseBundles
+    from knowledge_base import DEFAULT_COMPILED_PATH, DEFAULT_SOURCE_PATH, KnowledgeBase
+
+    # Speak exactly what the server answers with: precomputed bundle
+    # translations first, live translation only for strings missing from them
+    knowledge_base = KnowledgeBase(
+        compiled_path=os.environ.get("KB_COMPILED_PATH", DEFAULT_COMPILED_PATH),
+        source_path=os.environ.get("KB_SOURCE_PATH", DEFAULT_SOURCE_PATH)
+    )
+    kb_bundles = KnowledgeBaseBundles(os.environ.get("KB_BUNDLE_DIR", DEFAULT_BUNDLE_DIR))
+    chat_router = ChatRouter(knowledge_base, translate_known=kb_bundles.translate_known,
+                             translate=GoogleTranslator().translate)
+
+    build_audio_pack(chat_router, output_dir=args.output, languages=args.languages)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Bulkheaded worker pools, one per upstream dependency.
+
+Each dependency (Clarifai, Supabase, Groq, translation, TTS) gets its own
+workers and its own bounded queue, so a surge of slow calls to one of them
+can only exhaust that dependency's pool. Queued calls are started in
+priority order: the priority comes from the endpoint of the request that
+submitted them, and work submitted outside a request (background TTS jobs)
+has the lowest priority. When a queue is full a new call is rejected at
+once with BulkheadFull, unless it outranks a queued call, which is then
+rejected in its place. Calls whose request deadline passed while they were
+queued are dropped rather than started.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+from deadlines import DeadlineExceeded, current_deadline
+
+# Lower numbers run first
+DEFAULT_PRIORITIES = {
+    'predict': 0,
+    'chatbot': 1,
+    'tts': 3
+}
+DEFAULT_PRIORITY = 2
+BACKGROUND_PRIORITY = 3
+
+
+class BulkheadFull(Exception):
+    """Raised when a dependency's queue has no room for a call"""
+
+    def __init__(self, dependency):
+        super().__init__(f"Too many pending {dependency} requests")
+        self.dependency = dependency
+
+
+class Bulkhead:
+    """
+    Worker pool for one dependency with a bounded priority queue.
+
+    submit() has the signature of Executor.submit, so a Bulkhead can be
+    handed to code that expects an executor. The call runs in a copy of the
+    submitter's context, so it sees the submitting request's deadline.
+    """
+
+    def __init__(self, name, workers=4, max_queue=20, priority=None):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.priority = priority or (lambda: DEFAULT_PRIORITY)
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.shed = 0
+        self.displaced = 0
+        self.expired = 0
+
+    def submit(self, fn, *args, **kwargs):
+        priority = self.priority()
+        future = Future()
+        displaced = None
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                if worst[0] <= priority:
+                    self.shed += 1
+                    raise BulkheadFull(self.name)
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                self.displaced += 1
+                displaced = worst[2]
+            heapq.heappush(self._queue, (priority, next(self._order), future, contextvars.copy_context(), fn, args, kwargs))
+            self.submitted += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+        if displaced is not None:
+            displaced.set_exception(BulkheadFull(self.name))
+        return future
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, future, context, fn, args, kwargs = heapq.heappop(self._queue)
+                self.active += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    context.run(self._run, future, fn, args, kwargs)
+            finally:
+                with self._cond:
+                    self.active -= 1
+                    self.completed += 1
+
+    def _run(self, future, fn, args, kwargs):
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            with self._cond:
+                self.expired += 1
+            future.set_exception(DeadlineExceeded(self.name))
+            return
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "shed": self.shed,
+                "displaced": self.displaced,
+                "expired": self.expired
+            }
+
+
+class Bulkheads:
+    """
+    The bulkheads of all dependencies. limits maps a dependency name to
+    (workers, max_queue); priorities maps endpoint names to priorities.
+    """
+
+    def __init__(self, limits, priorities=None, default_priority=DEFAULT_PRIORITY,
+                 background_priority=BACKGROUND_PRIORITY):
+        self.priorities = dict(DEFAULT_PRIORITIES if priorities is None else priorities)
+        self.default_priority = default_priority
+        self.background_priority = background_priority
+        self.pools = {
+            name: Bulkhead(name, workers, max_queue, self.priority)
+            for name, (workers, max_queue) in limits.items()
+        }
+
+    def priority(self):
+        """Priority of work submitted from the current context"""
+        deadline = current_deadline()
+        if deadline is None:
+            return self.background_priority
+        return self.priorities.get(deadline.endpoint, self.default_priority)
+
+    def __getitem__(self, name):
+        return self.pools[name]
+
+    def stats(self):
+        stats = {name: pool.stats() for name, pool in self.pools.items()}
+        stats["priorities"] = dict(self.priorities)
+        return stats
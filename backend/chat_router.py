@@ -0,0 +1,201 @@
+"""
+Tiered chatbot answering.
+
+Questions that clearly ask for one field (description, causes, symptoms,
+treatment or prevention) of one known disease are answered straight from the
+knowledge base, without calling the LLM. Everything else - no disease, more
+than one disease, several intents, or open-ended wording - is left to the
+LLM. The router also counts how many requests each tier served.
+"""
+import threading
+
+from text_matcher import AhoCorasick
+
+# Tiers reported in the metrics, cheapest first
+TIERS = ['cache', 'knowledge_base', 'llm']
+
+# Intent keywords; a keyword matches the start of a word ("treat" matches "treating")
+INTENT_KEYWORDS = {
+    'causes': ['cause', 'why', 'reason', 'origin'],
+    'symptoms': ['symptom', 'sign', 'identify', 'look like', 'looks like', 'appear', 'recogni'],
+    'treatment': ['treat', 'cure', 'fix', 'heal', 'remed', 'solution', 'control', 'get rid of', 'spray'],
+    'prevention': ['prevent', 'avoid', 'stop', 'protect'],
+    'description': ['what is', 'what are', "what's", 'describe', 'explain', 'tell me about']
+}
+
+# Wording that asks for more than a knowledge-base field can answer
+OPEN_ENDED_WORDS = [
+    'compare', 'comparison', 'difference', 'differ', 'versus', 'vs', 'between', 'instead',
+    'better', 'best', 'which', 'how much', 'how many', 'how long', 'how often', 'dose',
+    'dosage', 'quantity', 'cost', 'price', 'weather', 'forecast'
+]
+
+
+def format_answer(name, text):
+    """English answer for one knowledge-base field of a disease"""
+    return f"{name}: {text}"
+
+
+def iter_answers(plant_disease_data):
+    """Yield (disease_key, intent, name, text) for every field the knowledge base can answer"""
+    for disease_key, info in plant_disease_data.items():
+        for intent in INTENT_KEYWORDS:
+            if info.get(intent):
+                yield disease_key, intent, info.get('name') or disease_key, info[intent]
+
+
+def build_matcher(snapshot):
+    """
+    One automaton over every intent keyword, open-ended word and disease
+    alias. Payloads are ('intent', name), ('open', word) or ('disease', key).
+    """
+    matcher = AhoCorasick()
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            matcher.add(keyword, ('intent', intent), word_end=False)
+    for word in OPEN_ENDED_WORDS:
+        matcher.add(word, ('open', word))
+
+    aliases = {}
+    for name, key in snapshot.disease_names:
+        aliases[name.lower()] = key
+    for key, info in snapshot.plant_disease_data.items():
+        aliases.setdefault(key.replace('_', ' ').lower(), key)
+        if info.get('name'):
+            aliases.setdefault(info['name'].lower(), key)
+    for alias, key in aliases.items():
+        matcher.add(alias, ('disease', key))
+    return matcher.build()
+
+
+def scan_message(snapshot, message):
+    """
+    Return (diseases, intents, open_ended) found in a lowercase English
+    message with a single pass of the snapshot's matcher.
+    """
+    matcher = snapshot.derived('chat_matcher', build_matcher)
+    diseases, intents, open_ended = set(), set(), False
+    for kind, value in matcher.payloads(message):
+        if kind == 'disease':
+            diseases.add(value)
+        elif kind == 'intent':
+            intents.add(value)
+        else:
+            open_ended = True
+    # "what is the cause of ..." asks for the cause, not a description
+    if len(intents) > 1:
+        intents.discard('description')
+    return diseases, intents, open_ended
+
+
+class ChatRouter:
+    """
+    Answers high-confidence questions from the knowledge base and records
+    which tier served each chatbot request.
+
+    translate_known(text, language_code) returns a precomputed translation or
+    None; translate(text, language_code) translates live. Both are only used
+    for non-English answers.
+    """
+
+    def __init__(self, knowledge_base, translate_known=None, translate=None, max_words=30):
+        self.knowledge_base = knowledge_base
+        self.translate_known = translate_known
+        self.translate = translate
+        self.max_words = max_words
+        self._lock = threading.Lock()
+        self.counts = {tier: 0 for tier in TIERS}
+        self.precomputed_translations = 0
+        self.live_translations = 0
+
+    def record(self, tier):
+        with self._lock:
+            self.counts[tier] += 1
+
+    def classify(self, message):
+        """
+        Return (disease_key, intent) when message can be answered from the
+        knowledge base, otherwise None.
+        """
+        text = (message or '').lower().strip()
+        if not text or len(text.split()) > self.max_words:
+            return None
+
+        snapshot = self.knowledge_base.snapshot()
+        diseases, intents, open_ended = scan_message(snapshot, text)
+        if open_ended or len(diseases) != 1 or len(intents) != 1:
+            return None
+
+        disease_key = next(iter(diseases))
+        intent = next(iter(intents))
+        info = snapshot.plant_disease_data.get(disease_key)
+        if not info or not info.get(intent):
+            return None
+        return disease_key, intent
+
+    def match(self, message):
+        """(disease name, field text) answering an English message, or None"""
+        match = self.classify(message)
+        if match is None:
+            return None
+        disease_key, intent = match
+        info = self.knowledge_base.snapshot().plant_disease_data.get(disease_key)
+        if not info or not info.get(intent):
+            return None
+        return info.get('name') or disease_key, info[intent]
+
+    def localize_known(self, name, text, language_code):
+        """Answer built from precomputed translations, or None if any part is missing"""
+        if self.translate_known is None:
+            return None
+        known = [self.translate_known(part, language_code) for part in (name, text)]
+        if not all(known):
+            return None
+        with self._lock:
+            self.precomputed_translations += 1
+        return format_answer(known[0], known[1])
+
+    def record_live_translation(self):
+        with self._lock:
+            self.live_translations += 1
+
+    def answer(self, message, language_code='en-US'):
+        """
+        Knowledge-base answer for an English message as (answer, english_answer),
+        or None if the LLM is needed.
+        """
+        parts = self.match(message)
+        if parts is None:
+            return None
+        return self.localize(parts[0], parts[1], language_code)
+
+    def localize(self, name, text, language_code='en-US'):
+        """
+        Answer for one knowledge-base field as (answer, english_answer), or
+        None if it cannot be translated.
+        """
+        english = format_answer(name, text)
+        if language_code.startswith('en'):
+            return english, english
+
+        localized = self.localize_known(name, text, language_code)
+        if localized:
+            return localized, english
+        if self.translate is None:
+            return None
+        self.record_live_translation()
+        return self.translate(english, language_code), english
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                "requests": total,
+                "tiers": dict(self.counts),
+                "shares": {
+                    tier: round(count / total, 3) if total else 0.0
+                    for tier, count in self.counts.items()
+                },
+                "precomputed_translations": self.precomputed_translations,
+                "live_translations": self.live_translations
+            }
@@ -0,0 +1,234 @@
+"""
+Server-side chatbot sessions.
+
+A session keeps the recent conversation turns plus a short running summary
+of older turns. Prompts are built from the summary and the newest turns that
+fit a token budget, so follow-up questions keep their context while prompt
+size stays bounded however long the conversation gets.
+
+Sessions live in a bounded in-memory LRU with a TTL. When a SQLite path is
+configured, sessions evicted from memory are spilled there and loaded back
+on their next request.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from kb_retrieval import estimate_tokens
+
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Characters of each folded turn kept in the running summary
+SUMMARY_SNIPPET_CHARS = 160
+
+
+def first_sentence(text, limit=SUMMARY_SNIPPET_CHARS):
+    """First sentence of text, cut to at most limit characters"""
+    text = ' '.join((text or '').split())
+    match = re.search(r"(?<=[.!?])\s", text)
+    sentence = text[:match.start()] if match else text
+    return sentence if len(sentence) <= limit else sentence[:limit - 3].rstrip() + '...'
+
+
+class ChatSession:
+    """
+    One conversation: a running summary and the recent (role, content, tokens)
+    turns, oldest first. Turns are stored in English, the language the LLM
+    is prompted in.
+    """
+
+    __slots__ = ('id', 'summary', 'turns', 'updated_at')
+
+    def __init__(self, session_id, summary='', turns=None, updated_at=None):
+        self.id = session_id
+        self.summary = summary
+        self.turns = turns or []
+        self.updated_at = updated_at or time.time()
+
+    def to_json(self):
+        return json.dumps({"summary": self.summary, "turns": self.turns}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id, data, updated_at):
+        value = json.loads(data)
+        return cls(session_id, value["summary"], [tuple(turn) for turn in value["turns"]], updated_at)
+
+    @property
+    def last_user_message(self):
+        for role, content, _ in reversed(self.turns):
+            if role == 'user':
+                return content
+        return None
+
+
+class ChatSessionStore:
+    """
+    Thread-safe store of chat sessions.
+
+    At most max_turns turns are kept verbatim per session; older turns are
+    folded into the summary, which is trimmed to summary_tokens. Sessions
+    idle for longer than ttl_seconds expire.
+    """
+
+    def __init__(self, max_sessions=1000, ttl_seconds=1800, persistent_path=None,
+                 max_turns=12, summary_tokens=200):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.persistent_path = persistent_path
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.created = 0
+        self.expired = 0
+        self.spilled = 0
+        self.restored = 0
+
+        if persistent_path:
+            try:
+                directory = os.path.dirname(persistent_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(persistent_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                    "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - ttl_seconds,))
+                self._db.commit()
+                print(f"Chat sessions spilling to {persistent_path}")
+            except Exception as e:
+                print(f"Could not open chat session store: {str(e)}")
+                self._db = None
+
+    def get_or_create(self, session_id=None):
+        """
+        Return the session for session_id, or a new session when the id is
+        missing, malformed or expired.
+        """
+        if session_id and SESSION_ID_PATTERN.match(session_id):
+            session = self._get(session_id)
+            if session is not None:
+                return session
+
+        session = ChatSession(uuid.uuid4().hex)
+        with self._lock:
+            self._store_locked(session)
+            self.created += 1
+        return session
+
+    def _get(self, session_id):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if now - session.updated_at <= self.ttl_seconds:
+                    self._sessions.move_to_end(session_id)
+                    return session
+                del self._sessions[session_id]
+                self.expired += 1
+                return None
+
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT data, updated_at FROM chat_sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row:
+                    self._db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+                    self._db.commit()
+            except Exception as e:
+                print(f"Chat session store read failed: {str(e)}")
+                return None
+            if not row or now - row[1] > self.ttl_seconds:
+                return None
+
+            session = ChatSession.from_json(session_id, row[0], row[1])
+            self._store_locked(session)
+            self.restored += 1
+            return session
+
+    def _store_locked(self, session):
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._spill_locked(evicted)
+
+    def _spill_locked(self, session):
+        if self._db is None or time.time() - session.updated_at > self.ttl_seconds:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session.id, session.to_json(), session.updated_at)
+            )
+            self._db.commit()
+            self.spilled += 1
+        except Exception as e:
+            print(f"Chat session spill failed: {str(e)}")
+
+    def add_turn(self, session, user_message, assistant_message):
+        """Record one exchange, folding turns beyond max_turns into the summary"""
+        with self._lock:
+            session.turns.append(('user', user_message, estimate_tokens(user_message)))
+            session.turns.append(('assistant', assistant_message, estimate_tokens(assistant_message)))
+            while len(session.turns) > self.max_turns:
+                role, content, _ = session.turns.pop(0)
+                speaker = 'User' if role == 'user' else 'Assistant'
+                session.summary = self._trim_summary(f"{session.summary}\n{speaker}: {first_sentence(content)}")
+            session.updated_at = time.time()
+            if session.id in self._sessions:
+                self._sessions.move_to_end(session.id)
+
+    def _trim_summary(self, summary):
+        lines = [line for line in summary.split('\n') if line.strip()]
+        while len(lines) > 1 and estimate_tokens(' '.join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def history_messages(self, session, token_budget):
+        """
+        Chat messages carrying the session context: the summary as a system
+        message, then the newest turns that fit in token_budget, oldest first.
+        """
+        with self._lock:
+            summary = session.summary
+            turns = list(session.turns)
+
+        messages = []
+        used = 0
+        if summary:
+            used = estimate_tokens(summary)
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+
+        recent = []
+        # Whole exchanges only, so the history never starts with an orphaned answer
+        for index in range(len(turns) - 2, -1, -2):
+            exchange = turns[index:index + 2]
+            tokens = sum(turn[2] for turn in exchange)
+            if used + tokens > token_budget:
+                break
+            recent[:0] = [{"role": role, "content": content} for role, content, _ in exchange]
+            used += tokens
+        return messages + recent
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None,
+                "created": self.created,
+                "expired": self.expired,
+                "spilled": self.spilled,
+                "restored": self.restored
+            }
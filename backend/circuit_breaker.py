@@ -0,0 +1,122 @@
+"""
+Circuit breaker for an upstream dependency.
+
+The breaker opens after failure_threshold consecutive failures, where a
+call slower than slow_call_seconds counts as a failure even if it
+succeeded. While open, callers are told not to call at all. After
+reset_seconds the breaker is half-open: one probe call is let through, and
+its outcome closes the breaker or opens it again. A probe whose call ends
+without an outcome releases its slot for the next one.
+"""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=10.0, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started_at = None
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_failure = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state_locked()
+
+    def _current_state_locked(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+            self._probe_started_at = None
+        return self._state
+
+    def allow(self):
+        """Whether a call may be made now; a half-open breaker admits one probe at a time"""
+        with self._lock:
+            state = self._current_state_locked()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN:
+                # A probe that never reported back frees its slot after reset_seconds
+                now = time.monotonic()
+                if self._probe_started_at is None or now - self._probe_started_at >= self.reset_seconds:
+                    self._probe_started_at = now
+                    return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self):
+        """Seconds until the breaker will admit a probe"""
+        with self._lock:
+            if self._current_state_locked() == CLOSED:
+                return 0.0
+            if self._state == OPEN:
+                return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+            return float(self.reset_seconds)
+
+    def release_probe(self):
+        """
+        Free the half-open probe slot after a call that reported neither
+        success nor failure, e.g. one rejected by a bulkhead or for bad input
+        """
+        with self._lock:
+            if self._current_state_locked() == HALF_OPEN:
+                self._probe_started_at = None
+
+    def record_success(self, latency):
+        if latency > self.slow_call_seconds:
+            with self._lock:
+                self.slow_calls += 1
+            self.record_failure(f"slow call ({latency:.1f}s)")
+            return
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self._state != CLOSED:
+                print(f"Circuit breaker {self.name} closed")
+            self._state = CLOSED
+            self._probe_started_at = None
+
+    def record_failure(self, reason=None):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_failure = reason
+            state = self._current_state_locked()
+            if state == HALF_OPEN or (state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+                self.times_opened += 1
+                print(f"Circuit breaker {self.name} opened after {self.consecutive_failures} failures: {reason}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state_locked(),
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_seconds": self.slow_call_seconds,
+                "reset_seconds": self.reset_seconds,
+                "successes": self.successes,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "last_failure": self.last_failure
+            }
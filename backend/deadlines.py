@@ -0,0 +1,118 @@
+"""
+Per-request deadlines shared by every upstream call.
+
+A deadline is started when a request enters the backend, with a total time
+budget configured per endpoint. It is kept in a context variable, so any
+code running on behalf of the request (in its thread, in its asyncio task or
+in a pool thread started with contextvars.copy_context) can ask how much
+time is left and pass that on as the timeout of its upstream call. Stages
+that find the budget spent are skipped or degraded by their callers, and
+every skip or timeout is counted per stage.
+"""
+import contextvars
+import threading
+import time
+
+_current_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+def current_deadline():
+    """The current request's Deadline, or None outside a request"""
+    return _current_deadline.get()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no time left in the request budget"""
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """The time budget of one request"""
+
+    __slots__ = ('endpoint', 'budget', 'expires_at')
+
+    def __init__(self, endpoint, budget):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+class RequestDeadlines:
+    """
+    Starts request deadlines and hands out stage timeouts.
+
+    budgets maps an endpoint name to its total budget in seconds; other
+    endpoints get default_budget. A stage is only started when at least
+    min_stage_seconds are left, since a call with a smaller timeout would
+    almost certainly fail anyway.
+    """
+
+    def __init__(self, budgets=None, default_budget=15.0, min_stage_seconds=0.25):
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        self.min_stage_seconds = min_stage_seconds
+        self._lock = threading.Lock()
+        self.started = 0
+        self.exceeded = 0
+        self.stage_timeouts = {}
+
+    def start(self, endpoint):
+        """Start a deadline for the current request; returns a token for finish()"""
+        with self._lock:
+            self.started += 1
+        return _current_deadline.set(Deadline(endpoint, self.budgets.get(endpoint, self.default_budget)))
+
+    def finish(self, token):
+        deadline = _current_deadline.get()
+        if deadline is not None and deadline.expired:
+            with self._lock:
+                self.exceeded += 1
+        _current_deadline.reset(token)
+
+    def remaining(self):
+        """Seconds left in the current request, or None outside a request"""
+        deadline = _current_deadline.get()
+        return deadline.remaining() if deadline is not None else None
+
+    def expired(self):
+        deadline = _current_deadline.get()
+        return deadline is not None and deadline.remaining() < self.min_stage_seconds
+
+    def timeout(self, stage, cap=None):
+        """
+        Timeout for an upstream call of stage: the time left in the request,
+        limited to cap. Returns cap outside a request and raises
+        DeadlineExceeded (counting a timeout) when the budget is spent.
+        """
+        deadline = _current_deadline.get()
+        if deadline is None:
+            return cap
+        remaining = deadline.remaining()
+        if remaining < self.min_stage_seconds:
+            self.record_timeout(stage)
+            raise DeadlineExceeded(stage)
+        return remaining if cap is None else min(cap, remaining)
+
+    def record_timeout(self, stage):
+        with self._lock:
+            self.stage_timeouts[stage] = self.stage_timeouts.get(stage, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budgets": dict(self.budgets),
+                "default_budget": self.default_budget,
+                "started": self.started,
+                "exceeded": self.exceeded,
+                "stage_timeouts": dict(self.stage_timeouts)
+            }
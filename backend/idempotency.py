@@ -0,0 +1,174 @@
+"""
+Idempotency keys for POST endpoints that must not run twice for one request.
+
+A client that retries because it lost a response sends the same
+Idempotency-Key header again. The first request with a key runs; a later
+one with the same key and the same body fingerprint gets the stored
+response replayed, and one arriving while the first is still running waits
+for it instead of starting a second run. Reusing a key for a different body
+is a conflict. Only responses worth replaying are kept: when the first run
+failed transiently (a 5xx or a 429) the entry is dropped and the next retry
+runs again.
+
+Entries live in process memory for ttl_seconds after their response was
+stored. Beyond max_entries the oldest completed entries are evicted;
+entries of requests still running are never evicted.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+OWNER = 'owner'
+REPLAYED = 'replayed'
+CONFLICT = 'conflict'
+IN_PROGRESS = 'in_progress'
+
+
+def replayable(status):
+    return status < 500 and status != 429
+
+
+class IdempotencyEntry:
+    __slots__ = ('fingerprint', 'response', 'done', 'expires_at', 'event')
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.response = None
+        self.done = False
+        self.expires_at = None
+        self.event = threading.Event()
+
+
+class IdempotencyStore:
+    """
+    Keys are clients' Idempotency-Key strings; keys the server derives
+    itself are tuples, so they never collide with a client's. Responses
+    are (payload, status, headers) tuples. run() wraps a blocking handler;
+    async callers use claim(), complete() and abandon() directly and wait
+    on the entry's event themselves.
+    """
+
+    def __init__(self, max_entries=2000, ttl_seconds=86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.conflicts = 0
+        self.in_progress = 0
+
+    def _expire_locked(self, now):
+        # Completed entries are kept in completion order; stop at the first live one
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if not entry.done or entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def _evict_locked(self, count):
+        # Oldest completed entries first; evicting a running one would let its
+        # retry run the request a second time
+        evicted = []
+        for key, entry in self._entries.items():
+            if len(evicted) >= count:
+                break
+            if entry.done:
+                evicted.append(key)
+        for key in evicted:
+            del self._entries[key]
+
+    def claim(self, key, fingerprint):
+        """
+        (entry, outcome): OWNER when the caller must run the request and then
+        complete() or abandon() the entry, REPLAYED with the stored response in
+        entry.response, CONFLICT when the key belongs to a different body, or
+        IN_PROGRESS when another request with the key is still running.
+        """
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = IdempotencyEntry(fingerprint)
+                self._entries[key] = entry
+                if len(self._entries) > self.max_entries:
+                    self._evict_locked(len(self._entries) - self.max_entries)
+                self.executed += 1
+                return entry, OWNER
+            if entry.fingerprint != fingerprint:
+                self.conflicts += 1
+                return entry, CONFLICT
+            if entry.done:
+                self.replayed += 1
+                return entry, REPLAYED
+            self.waited += 1
+            return entry, IN_PROGRESS
+
+    def has_response(self, key):
+        """Whether a response for key is stored and would be replayed to a matching request"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.done and entry.expires_at > time.monotonic()
+
+    def complete(self, key, entry, response):
+        """Store the response of an owned entry for replay, or drop the entry if it is not replayable"""
+        with self._lock:
+            if replayable(response[1]):
+                entry.response = response
+                entry.done = True
+                entry.expires_at = time.monotonic() + self.ttl_seconds
+                if self._entries.get(key) is entry:
+                    self._entries.move_to_end(key)
+            elif self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.event.set()
+
+    def abandon(self, key, entry):
+        """Drop an owned entry whose request failed; a waiting retry takes over"""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.event.set()
+
+    def timed_out(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def run(self, key, fingerprint, handler, timeout=None):
+        """
+        (response, outcome) for a request with an idempotency key; handler()
+        runs only when this request owns the key. response is None for
+        CONFLICT and for IN_PROGRESS after waiting timeout seconds in vain.
+        """
+        while True:
+            entry, outcome = self.claim(key, fingerprint)
+            if outcome == OWNER:
+                try:
+                    response = handler()
+                except BaseException:
+                    self.abandon(key, entry)
+                    raise
+                self.complete(key, entry, response)
+                return response, OWNER
+            if outcome == REPLAYED:
+                return entry.response, REPLAYED
+            if outcome == CONFLICT:
+                return None, CONFLICT
+            if not entry.event.wait(timeout):
+                self.timed_out()
+                return None, IN_PROGRESS
+            # The first request finished: replay it, or run if it was dropped
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "executed": self.executed,
+                "replayed": self.replayed,
+                "waited": self.waited,
+                "conflicts": self.conflicts,
+                "in_progress": self.in_progress
+            }
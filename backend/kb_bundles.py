@@ -0,0 +1,273 @@
+"""
+Precomputed translations of the plant disease knowledge base.
+
+The knowledge base (plant_disease_data, treatments and basic_treatments) is
+static English text, so it is translated offline instead of on every
+request. A build writes kb_bundles/<version>/<language>.json files mapping
+each English string to its translation; kb_bundles/CURRENT names the version
+to load. At runtime the English tables are localized through these maps
+without any network calls; strings missing from a bundle stay in English.
+
+Build bundles with:
+    python kb_bundles.py [--languages hi te ta kn ml] [--stub]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+DEFAULT_BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kb_bundles')
+
+# Languages the knowledge base is translated into
+BUNDLE_LANGUAGES = ['hi', 'te', 'ta', 'kn', 'ml']
+
+
+def base_language(language_code):
+    return (language_code or 'en').split('-')[0].lower()
+
+
+def collect_strings(*tables):
+    """Every distinct string value in the given (nested) tables, sorted"""
+    strings = set()
+
+    def visit(value):
+        if isinstance(value, str):
+            if value.strip():
+                strings.add(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                visit(item)
+
+    for table in tables:
+        visit(table)
+    return sorted(strings)
+
+
+class GoogleTranslator:
+    """Translates through the backend's shared Google Translate client"""
+
+    def __init__(self, translator=None):
+        if translator is None:
+            from translation import Translator
+            translator = Translator()
+        self.translator = translator
+
+    def translate(self, text, language_code):
+        return self.translator.translate(text, language_code, source_language='en')
+
+
+class StubTranslator:
+    """Deterministic offline translator for tests and local development"""
+
+    def translate(self, text, language_code):
+        return f"[{base_language(language_code)}] {text}"
+
+
+class DirectoryBundleSource:
+    """Reads the bundle version that <bundle_dir>/CURRENT names"""
+
+    def __init__(self, bundle_dir=DEFAULT_BUNDLE_DIR):
+        self.bundle_dir = bundle_dir
+
+    def __str__(self):
+        return self.bundle_dir
+
+    def read(self):
+        """(version, {language: strings}), or None when no bundles were built"""
+        pointer = os.path.join(self.bundle_dir, 'CURRENT')
+        if not os.path.isfile(pointer):
+            return None
+        with open(pointer) as f:
+            version = f.read().strip()
+        version_dir = os.path.join(self.bundle_dir, version)
+        strings = {}
+        for file_name in os.listdir(version_dir):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(version_dir, file_name), encoding='utf-8') as f:
+                bundle = json.load(f)
+            strings[bundle['language']] = bundle['strings']
+        return version, strings
+
+
+class StubBundleSource:
+    """In-memory bundles for tests and local development; publish() stands in for a rebuild"""
+
+    def __init__(self, strings=None, version='stub-1'):
+        self.version = version
+        self.strings = strings or {}
+
+    def __str__(self):
+        return 'stub bundles'
+
+    def publish(self, strings, version):
+        self.strings = strings
+        self.version = version
+
+    def read(self):
+        if not self.strings:
+            return None
+        return self.version, {language: dict(table) for language, table in self.strings.items()}
+
+
+class KnowledgeBaseBundles:
+    """
+    Loads the current bundles and localizes knowledge-base tables with them.
+    source reads the bundles; by default the directory build_bundles writes.
+    """
+
+    def __init__(self, bundle_dir=DEFAULT_BUNDLE_DIR, source=None):
+        self.source = source or DirectoryBundleSource(bundle_dir)
+        self.version = None
+        self.strings = {}
+        self._localized = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the source's current bundles; on failure the loaded ones are kept"""
+        try:
+            loaded = self.source.read()
+        except Exception as e:
+            print(f"Error loading knowledge-base bundles: {str(e)}")
+            return
+        if loaded is None:
+            print(f"No knowledge-base bundles found in {self.source}; non-English content will be translated live")
+            return
+
+        version, strings = loaded
+        with self._lock:
+            self.version = version
+            self.strings = strings
+            self._localized = {}
+        print(f"Loaded knowledge-base bundles {version} for: {', '.join(sorted(strings))}")
+
+    def has_language(self, language_code):
+        return base_language(language_code) in self.strings
+
+    def translate_known(self, text, language_code):
+        """Precomputed translation of a knowledge-base string, or None"""
+        return self.strings.get(base_language(language_code), {}).get(text)
+
+    def localize(self, name, table, language_code):
+        """
+        Return table with every string translated to language_code.
+
+        Results are cached per table name and language. Returns the table
+        itself for English or when there is no bundle for the language.
+        """
+        language = base_language(language_code)
+        strings = self.strings.get(language)
+        if language == 'en' or strings is None:
+            return table
+
+        cache_key = (name, language)
+        with self._lock:
+            cached = self._localized.get(cache_key)
+        if cached is not None and cached[0] is table:
+            return cached[1]
+
+        def translate(value):
+            if isinstance(value, str):
+                return strings.get(value, value)
+            if isinstance(value, dict):
+                return {key: translate(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [translate(item) for item in value]
+            return value
+
+        localized = translate(table)
+        with self._lock:
+            self._localized[cache_key] = (table, localized)
+        return localized
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "languages": sorted(self.strings),
+            "strings": {language: len(strings) for language, strings in self.strings.items()}
+        }
+
+
+def build_bundles(tables, translator, output_dir=DEFAULT_BUNDLE_DIR, languages=None):
+    """
+    Translate every string in tables into each language and write a new
+    bundle version. Translations of strings that are unchanged since the
+    current version are reused. Returns the new version.
+    """
+    languages = [base_language(language) for language in (languages or BUNDLE_LANGUAGES)]
+    strings = collect_strings(*tables)
+    previous = KnowledgeBaseBundles(output_dir)
+
+    # The version identifies the English source text the bundles were built from
+    version = hashlib.sha256(json.dumps(strings, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    for language in languages:
+        known = previous.strings.get(language, {})
+        translated = {}
+        reused = 0
+        failed = 0
+        for text in strings:
+            if text in known:
+                translated[text] = known[text]
+                reused += 1
+                continue
+            result = translator.translate(text, language)
+            if result and result != text:
+                translated[text] = result
+            else:
+                # Left out so it falls back to English and is retried next build
+                failed += 1
+
+        bundle = {
+            "version": version,
+            "language": language,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "strings": translated
+        }
+        target = os.path.join(version_dir, f"{language}.json")
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(bundle, f, ensure_ascii=False, indent=2)
+        os.replace(target + '.tmp', target)
+        print(f"Wrote {language} bundle: {len(translated)} strings ({reused} reused, {failed} failed)")
+
+    pointer_tmp = os.path.join(output_dir, 'CURRENT.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(output_dir, 'CURRENT'))
+    print(f"Knowledge-base bundles {version} written to {output_dir}")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate the knowledge base into per-language bundles")
+    parser.add_argument('--languages', nargs='+', default=BUNDLE_LANGUAGES,
+                        help="Language codes to build (default: hi te ta kn ml)")
+    parser.add_argument('--output', default=DEFAULT_BUNDLE_DIR, help="Bundle directory")
+    parser.add_argument('--stub', action='store_true',
+                        help="Use the offline stub translator instead of Google Translate")
+    args = parser.parse_args(argv)
+
+    from knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase().snapshot()
+    translator = StubTranslator() if args.stub else GoogleTranslator()
+    build_bundles(
+        [kb.plant_disease_data, kb.treatments, kb.basic_treatments],
+        translator,
+        output_dir=args.output,
+        languages=args.languages
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
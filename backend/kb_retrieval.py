@@ -0,0 +1,219 @@
+"""
+Local BM25 retrieval over the plant disease knowledge base.
+
+Every disease description and treatment recommendation becomes one passage
+in an in-memory inverted index. For each chatbot question the best-matching
+passages are selected within a token budget and placed in the LLM prompt,
+so the model answers from the knowledge base instead of from a bare list of
+disease names.
+
+The index is built from a knowledge-base snapshot and cached on it, so it is
+built once per knowledge-base version.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Common English words that carry no retrieval signal
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers him his how i if in into is it its itself just me more
+most my no nor not of off on once only or other our out over own same she should so some such
+than that the their them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours please
+tell know give get want need help plant plants crop crops
+""".split())
+
+# Field labels used when a disease entry is rendered as a passage
+DISEASE_FIELDS = [
+    ('description', None),
+    ('causes', 'Causes'),
+    ('symptoms', 'Symptoms'),
+    ('treatment', 'Treatment'),
+    ('prevention', 'Prevention')
+]
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with plural endings removed"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower().replace('_', ' ')):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about three tokens for every four words)"""
+    return int(len(text.split()) * 4 / 3) + 1
+
+
+def display_name(key):
+    """'Tomato___Late_blight' -> 'Tomato - Late blight'"""
+    return ' - '.join(part.replace('_', ' ').strip() for part in key.split('___') if part.strip())
+
+
+def knowledge_base_passages(snapshot):
+    """Yield (passage_id, title, text) for every knowledge-base entry"""
+    for key, info in snapshot.plant_disease_data.items():
+        title = info.get('name') or display_name(key)
+        parts = []
+        for field, label in DISEASE_FIELDS:
+            value = info.get(field)
+            if value:
+                parts.append(f"{label}: {value}" if label else value)
+        yield f"disease:{key}", title, ' '.join(parts)
+
+    for key, entry in snapshot.treatments.items():
+        if isinstance(entry, dict):
+            text = ' '.join(value for value in (entry.get('treatment'), entry.get('details')) if value)
+        else:
+            text = str(entry)
+        yield f"treatment:{key}", display_name(key), text
+
+    for key, text in snapshot.basic_treatments.items():
+        if key in snapshot.treatments:
+            continue
+        yield f"treatment:{key}", display_name(key), str(text)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of passages.
+
+    Title terms are counted twice so a question naming a disease ranks that
+    disease's own passages above passages that merely mention it.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages = []
+        self.postings = defaultdict(list)
+        lengths = []
+
+        for passage_id, title, text in passages:
+            terms = Counter(tokenize(title) * 2 + tokenize(text))
+            doc = len(self.passages)
+            for term, frequency in terms.items():
+                self.postings[term].append((doc, frequency))
+            self.passages.append({
+                "id": passage_id,
+                "title": title,
+                "text": text,
+                "tokens": estimate_tokens(f"{title}: {text}")
+            })
+            lengths.append(sum(terms.values()))
+
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        count = len(self.passages)
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(knowledge_base_passages(snapshot))
+
+    def search(self, query, limit=5):
+        """
+        Best passages for query as a list of dicts with the passage fields
+        plus 'score' and 'coverage' (share of query terms the passage contains).
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.passages:
+            return []
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / self.average_length)
+                scores[doc] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                matched[doc] += 1
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            dict(self.passages[doc], score=round(score, 3), coverage=matched[doc] / len(terms))
+            for doc, score in ranked
+        ]
+
+
+class ContextRetriever:
+    """
+    Selects knowledge-base context for chatbot prompts.
+
+    retrieve() returns the top passages that fit in max_tokens. A question is
+    considered grounded when the best passage scores at least min_score and
+    contains at least min_coverage of the question's terms; grounded
+    questions can be answered by the smaller model.
+    """
+
+    def __init__(self, knowledge_base, max_passages=4, max_tokens=600,
+                 min_score=3.0, min_coverage=0.5):
+        self.knowledge_base = knowledge_base
+        self.max_passages = max_passages
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.grounded = 0
+        self.passages_returned = 0
+        self.context_tokens = 0
+
+    def index(self):
+        return self.knowledge_base.snapshot().derived('bm25', BM25Index.from_snapshot)
+
+    def retrieve(self, question):
+        """Return (passages, grounded) for question"""
+        candidates = self.index().search(question, limit=self.max_passages * 2)
+
+        selected = []
+        used_tokens = 0
+        for passage in candidates:
+            if len(selected) >= self.max_passages:
+                break
+            if used_tokens + passage['tokens'] > self.max_tokens:
+                continue
+            selected.append(passage)
+            used_tokens += passage['tokens']
+
+        grounded = bool(selected) and selected[0]['score'] >= self.min_score \
+            and selected[0]['coverage'] >= self.min_coverage
+
+        with self._lock:
+            self.queries += 1
+            self.grounded += int(grounded)
+            self.passages_returned += len(selected)
+            self.context_tokens += used_tokens
+        return selected, grounded
+
+    @staticmethod
+    def format_context(passages):
+        return "\n".join(f"- {passage['title']}: {passage['text']}" for passage in passages)
+
+    def stats(self):
+        with self._lock:
+            queries = self.queries
+            return {
+                "queries": queries,
+                "grounded": self.grounded,
+                "avg_passages": round(self.passages_returned / queries, 2) if queries else 0,
+                "avg_context_tokens": round(self.context_tokens / queries, 1) if queries else 0,
+                "max_tokens": self.max_tokens
+            }
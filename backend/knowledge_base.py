@@ -0,0 +1,216 @@
+"""
+Compiled, hot-reloadable plant disease knowledge base.
+
+The editable source is data/knowledge_base.json. It is compiled into a
+SQLite file (knowledge_base.sqlite3) with a content version, so worker
+processes can tell cheaply whether it changed.
+
+Each process reads the compiled file into an immutable in-memory snapshot
+and serves every lookup from it. The file's version is re-checked at most
+every few seconds; when it changes, a new snapshot is read and swapped in
+with a single assignment, so requests that already hold the old snapshot
+finish undisturbed. Derived indexes are built per snapshot and therefore
+only rebuilt when the version changes.
+
+Compile after editing the source with:
+    python knowledge_base.py [--source data/knowledge_base.json] [--output knowledge_base.sqlite3]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE_PATH = os.path.join(BACKEND_DIR, 'data', 'knowledge_base.json')
+DEFAULT_COMPILED_PATH = os.path.join(BACKEND_DIR, 'knowledge_base.sqlite3')
+
+TABLES = ['treatments', 'basic_treatments', 'plant_disease_data', 'disease_names']
+
+
+def compile_knowledge_base(source_path=DEFAULT_SOURCE_PATH, output_path=DEFAULT_COMPILED_PATH):
+    """
+    Compile the JSON source into a SQLite file and atomically replace the
+    previous one. Returns the new version (a hash of the source content).
+    """
+    with open(source_path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    missing = [table for table in TABLES if table not in data]
+    if missing:
+        raise ValueError(f"Knowledge base source is missing: {', '.join(missing)}")
+
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    version = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(prefix='kb_', suffix='.sqlite3', dir=directory)
+    os.close(fd)
+    try:
+        db = sqlite3.connect(temp_path)
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute(
+            "CREATE TABLE entries (table_name TEXT NOT NULL, position INTEGER NOT NULL, "
+            "key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (table_name, position))"
+        )
+        db.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+        db.execute("INSERT INTO meta VALUES ('compiled_at', ?)", (time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),))
+
+        for table in TABLES:
+            rows = data[table].items() if isinstance(data[table], dict) else enumerate(data[table])
+            db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                [
+                    (table, position, str(key), json.dumps(value, ensure_ascii=False))
+                    for position, (key, value) in enumerate(rows)
+                ]
+            )
+        db.commit()
+        db.close()
+        os.replace(temp_path, output_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    print(f"Compiled knowledge base {version} to {output_path}")
+    return version
+
+
+class KnowledgeBaseSnapshot:
+    """One immutable version of the knowledge base plus its derived indexes"""
+
+    def __init__(self, version, tables):
+        self.version = version
+        self.treatments = tables['treatments']
+        self.basic_treatments = tables['basic_treatments']
+        self.plant_disease_data = tables['plant_disease_data']
+        self.disease_names = [tuple(pair) for pair in tables['disease_names']]
+        self._derived = {}
+        # Reentrant: a builder may use other derived indexes of the snapshot
+        self._lock = threading.RLock()
+
+    def derived(self, name, builder):
+        """Return an index built from this snapshot, building it on first use"""
+        index = self._derived.get(name)
+        if index is None:
+            with self._lock:
+                index = self._derived.get(name)
+                if index is None:
+                    index = builder(self)
+                    self._derived[name] = index
+        return index
+
+    @property
+    def all_treatment_keys(self):
+        """Keys of treatments and basic_treatments in a stable order"""
+        return self.derived('all_treatment_keys', lambda kb: list(dict.fromkeys(
+            list(kb.treatments.keys()) + list(kb.basic_treatments.keys())
+        )))
+
+
+class KnowledgeBase:
+    """
+    Lazily loaded, hot-reloaded view of the compiled knowledge base.
+
+    If the compiled file is missing or older than the JSON source it is
+    compiled on first use.
+    """
+
+    def __init__(self, compiled_path=DEFAULT_COMPILED_PATH, source_path=DEFAULT_SOURCE_PATH,
+                 check_interval=5.0):
+        self.compiled_path = compiled_path
+        self.source_path = source_path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._file_signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def snapshot(self):
+        """Current snapshot; callers should keep using one snapshot per request"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or time.monotonic() >= self._next_check:
+                self._next_check = time.monotonic() + self.check_interval
+                try:
+                    self._refresh_locked()
+                except Exception as e:
+                    if self._snapshot is None:
+                        raise
+                    print(f"Knowledge base reload failed, keeping version {self._snapshot.version}: {str(e)}")
+            return self._snapshot
+
+    def _refresh_locked(self):
+        self._compile_if_stale()
+
+        stat = os.stat(self.compiled_path)
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._snapshot is not None and signature == self._file_signature:
+            return
+
+        db = sqlite3.connect(f"file:{self.compiled_path}?mode=ro", uri=True)
+        try:
+            version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if self._snapshot is not None and version == self._snapshot.version:
+                self._file_signature = signature
+                return
+
+            tables = {table: [] for table in TABLES}
+            for table, key, value in db.execute(
+                "SELECT table_name, key, value FROM entries ORDER BY table_name, position"
+            ):
+                tables[table].append((key, json.loads(value)))
+        finally:
+            db.close()
+
+        tables = {
+            table: [value for _, value in rows] if table == 'disease_names' else dict(rows)
+            for table, rows in tables.items()
+        }
+        previous = self._snapshot
+        self._snapshot = KnowledgeBaseSnapshot(version, tables)
+        self._file_signature = signature
+        if previous is not None:
+            self.reloads += 1
+            print(f"Knowledge base reloaded: {previous.version} -> {version}")
+        else:
+            print(f"Loaded knowledge base {version}")
+
+    def _compile_if_stale(self):
+        if not os.path.isfile(self.source_path):
+            return
+        if os.path.isfile(self.compiled_path) and \
+                os.path.getmtime(self.compiled_path) >= os.path.getmtime(self.source_path):
+            return
+        compile_knowledge_base(self.source_path, self.compiled_path)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "reloads": self.reloads,
+            "diseases": len(snapshot.plant_disease_data) if snapshot else 0,
+            "treatments": len(snapshot.all_treatment_keys) if snapshot else 0
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the knowledge base source into its on-disk format")
+    parser.add_argument('--source', default=DEFAULT_SOURCE_PATH, help="JSON source file")
+    parser.add_argument('--output', default=DEFAULT_COMPILED_PATH, help="Compiled SQLite file")
+    args = parser.parse_args(argv)
+    compile_knowledge_base(args.source, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Local language identification for chatbot text.
+
+Indian languages are recognised by their Unicode script block in a single
+pass over the text. Latin-script text is scored against small character
+trigram profiles to tell English apart from romanised Hindi (Hinglish).
+This lets the backend skip translation calls for text that is already in
+the target language and pass an explicit source language when it is not.
+"""
+import math
+import re
+from collections import Counter
+
+# Unicode blocks from U+0900 to U+0D7F are 128 code points each, in this order
+INDIC_BLOCKS = ['hi', 'bn', 'pa', 'gu', 'or', 'ta', 'te', 'kn', 'ml']
+INDIC_START = 0x0900
+INDIC_END = 0x0D7F
+
+# Language code for romanised Hindi
+HINGLISH = 'hi-Latn'
+UNDETERMINED = 'und'
+
+# Minimum share of letters a script needs before we trust it
+MIN_SCRIPT_SHARE = 0.3
+
+# Without a Hinglish marker word, Latin text needs this many letters and
+# this score before it is taken as Hinglish; trigram scores of short English
+# words like "Hello" or "ok" are barely above zero
+MIN_HINGLISH_LETTERS = 8
+HINGLISH_MARGIN = 0.5
+
+ENGLISH_SAMPLE = """
+the leaves of my tomato plant have brown spots what should i do
+how do i treat apple scab on my trees and prevent it next season
+remove infected leaves and apply a fungicide to protect the plant
+water at the base of plants and ensure good air circulation
+what are the symptoms of late blight in potatoes and how does it spread
+this disease is caused by a fungus that thrives in warm humid weather
+which fertilizer is best for my crop and when should i apply it
+rotate crops every year and use resistant varieties where possible
+"""
+
+HINGLISH_SAMPLE = """
+mere tamatar ke patte par bhure daag hai kya karu
+seb ke ped mein rog lag gaya hai iska ilaj kya hai
+patto ko hata do aur dawai ka chidkav karo
+paudhe ko jad mein pani do aur hawa aane do
+aloo mein jhulsa rog ke lakshan kya hote hain aur yeh kaise failta hai
+yeh bimari garam aur nam mausam mein fungus se hoti hai
+meri fasal ke liye kaunsa khaad sabse accha hai aur kab dalna chahiye
+har saal fasal badlo aur rog rodhi kism ka beej lagao
+"""
+
+# Common Hinglish function words that are rare or absent in English
+HINGLISH_MARKERS = frozenset([
+    'hai', 'hain', 'kya', 'kaise', 'kyun', 'mein', 'mera', 'meri', 'mere',
+    'ka', 'ki', 'ke', 'ko', 'se', 'aur', 'nahi', 'nahin', 'yeh', 'woh',
+    'karu', 'karo', 'kare', 'karna', 'hota', 'hoti', 'hote', 'gaya', 'raha',
+    'rahi', 'patte', 'paudhe', 'fasal', 'ilaj', 'dawai', 'bimari', 'rog',
+    'haan', 'ji', 'namaste', 'dhanyavaad', 'accha', 'batao'
+])
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def _trigram_profile(sample):
+    counts = Counter()
+    for word in WORD_PATTERN.findall(sample.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    total = sum(counts.values())
+    return counts, total
+
+
+ENGLISH_PROFILE = _trigram_profile(ENGLISH_SAMPLE)
+HINGLISH_PROFILE = _trigram_profile(HINGLISH_SAMPLE)
+
+
+def _log_probability(trigram, profile):
+    counts, total = profile
+    # Add-one smoothing over a nominal vocabulary of trigrams
+    return math.log((counts.get(trigram, 0) + 1) / (total + 5000))
+
+
+def score_hinglish(text):
+    """
+    Score Latin-script text; positive means more likely Hinglish than English.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return 0.0
+
+    score = 0.0
+    trigrams = 0
+    for word in words:
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            trigram = padded[i:i + 3]
+            score += _log_probability(trigram, HINGLISH_PROFILE) - _log_probability(trigram, ENGLISH_PROFILE)
+            trigrams += 1
+
+    marker_share = sum(1 for word in words if word in HINGLISH_MARKERS) / len(words)
+    return score / max(trigrams, 1) + 2.0 * marker_share
+
+
+def count_scripts(text):
+    """Count letters per script in a single pass; returns (counts, total_letters)"""
+    counts = {}
+    total = 0
+    for ch in text:
+        cp = ord(ch)
+        if cp < 0x80:
+            if ch.isalpha():
+                counts['latin'] = counts.get('latin', 0) + 1
+                total += 1
+        elif 0x00C0 <= cp <= 0x024F:
+            counts['latin'] = counts.get('latin', 0) + 1
+            total += 1
+        elif INDIC_START <= cp <= INDIC_END:
+            language = INDIC_BLOCKS[(cp - INDIC_START) >> 7]
+            counts[language] = counts.get(language, 0) + 1
+            total += 1
+    return counts, total
+
+
+def detect_language(text):
+    """
+    Identify the language of text.
+
+    Returns a base language code ('en', 'hi', 'te', 'ta', 'kn', 'ml', ...),
+    'hi-Latn' for romanised Hindi, or 'und' if there are no letters.
+    """
+    if not text:
+        return UNDETERMINED
+
+    counts, total = count_scripts(text)
+    if total == 0:
+        return UNDETERMINED
+
+    # Any Indic script with a meaningful share of letters wins over Latin,
+    # since answers often keep English disease names inside translated text
+    indic = [(count, language) for language, count in counts.items() if language != 'latin']
+    if indic:
+        count, language = max(indic)
+        if count / total >= MIN_SCRIPT_SHARE:
+            return language
+
+    latin = counts.get('latin', 0)
+    if latin == 0:
+        return UNDETERMINED
+
+    score = score_hinglish(text)
+    if any(word in HINGLISH_MARKERS for word in WORD_PATTERN.findall(text.lower())):
+        return HINGLISH if score > 0 else 'en'
+    if latin >= MIN_HINGLISH_LETTERS and score >= HINGLISH_MARGIN:
+        return HINGLISH
+    return 'en'
+
+
+def translation_source(detected_language):
+    """Source language to send to the translation API for a detected language"""
+    if detected_language in (HINGLISH, UNDETERMINED):
+        # Romanised input is handled best by the API's own detection
+        return 'auto'
+    return detected_language
+
+
+def needs_translation(text, target_language):
+    """
+    Decide whether text has to be translated to reach target_language.
+
+    Returns (needed, source_language) where source_language is the value to
+    pass to the translation API.
+    """
+    target = (target_language or 'en').split('-')[0].lower()
+    detected = detect_language(text)
+    if detected == UNDETERMINED or detected == target:
+        return False, detected
+    return True, translation_source(detected)
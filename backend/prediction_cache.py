@@ -0,0 +1,107 @@
+"""
+Recent Clarifai results, for serving predictions while Clarifai is down.
+
+Results are keyed by the SHA-256 of the image bytes. When Pillow is
+installed each image also gets a 64-bit difference hash, so a re-encoded,
+resized or slightly cropped copy of a cached image is found as a near
+duplicate; without Pillow only exact matches are served.
+"""
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+def difference_hash(image_bytes, size=8):
+    """64-bit dHash of an image, or None when it cannot be computed"""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            pixels = list(image.convert('L').resize((size + 1, size), Image.BILINEAR).getdata())
+    except Exception as e:
+        print(f"Could not hash image for near-duplicate matching: {str(e)}")
+        return None
+
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class PredictionResultCache:
+    """
+    LRU of Clarifai outputs. Near duplicates are images whose difference
+    hashes differ in at most max_distance of their 64 bits.
+    """
+
+    def __init__(self, max_entries=1000, max_distance=6):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def add(self, image_bytes, outputs):
+        key = self.key_for(image_bytes)
+        image_hash = difference_hash(image_bytes)
+        with self._lock:
+            self._entries[key] = (image_hash, outputs, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, image_bytes):
+        """(outputs, 'exact' or 'similar') for a cached image, or (None, None)"""
+        key = self.key_for(image_bytes)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1], 'exact'
+
+        image_hash = difference_hash(image_bytes)
+        if image_hash is not None:
+            with self._lock:
+                best = None
+                for cached_hash, outputs, _ in self._entries.values():
+                    if cached_hash is None:
+                        continue
+                    distance = bin(cached_hash ^ image_hash).count('1')
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, outputs)
+                if best is not None:
+                    self.similar_hits += 1
+                    return best[1], 'similar'
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "near_duplicates": PIL_AVAILABLE,
+                "max_distance": self.max_distance,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses
+            }
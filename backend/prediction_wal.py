@@ -0,0 +1,465 @@
+"""
+Write-ahead log of prediction records.
+
+/predict appends each prediction row to a local log before answering, and a
+background replayer drains the log to the database; the request never waits
+on the database. The log is a directory of append-only segment files of
+JSON lines: a "put" line per record and an "ack" line once the database has
+stored it. Appends are fsynced in batches: every appender waits for the
+next group fsync, so a record is on disk when append() returns while many
+concurrent appends share one fsync.
+
+Only the location (segment, byte offset, length) of each record is kept in
+memory; the replayer reads pending records back from those offsets.
+Replays are idempotent upserts by id, so a record that was stored but whose
+ack was lost (e.g. in a crash) is simply written again. If fsyncs keep
+failing, waiting appenders get an error instead of blocking forever; their
+records stay in the log for the replayer. On startup the log is read back,
+a torn last line is truncated away and the records still in the log are
+available through records() to rebuild recent history. Sealed
+segments are compacted as their records are acknowledged: fully
+acknowledged segments are deleted and mostly acknowledged ones rewritten
+with only their pending records. Acks of records whose put is still in an
+older segment are carried over into the rewritten segment, so a record
+acknowledged in a later segment is not replayed again after a restart.
+
+Every process keeps its own log in a slot directory under the configured
+one (slot-0, slot-1, ...), claimed with an exclusive lock where fcntl is
+available. A restarted process claims a free slot again and so takes over
+the records left behind by a process that is gone.
+"""
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.log$")
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _encode(entry):
+    return (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+class PredictionLog:
+    """
+    sink(records) stores a batch of records in the database and returns True
+    on success; failed batches are retried with exponential backoff up to
+    max_backoff seconds. Without a sink records are only logged. After
+    max_sync_failures consecutive failed fsyncs, append raises OSError
+    until an fsync succeeds again.
+
+    Read the recovered records with records() before calling start(), which
+    starts the replayer.
+
+    Locking: all state is guarded by one condition. Only the sync thread
+    fsyncs and closes segment descriptors, outside the condition; a rotation
+    just hands the old descriptor over to it.
+    """
+
+    def __init__(self, directory, sink=None, segment_bytes=16 * 1024 * 1024, sync_delay=0.005,
+                 replay_interval=5.0, batch_size=50, max_backoff=300.0, max_sync_failures=3):
+        self.sink = sink
+        self.segment_bytes = segment_bytes
+        self.sync_delay = sync_delay
+        self.replay_interval = replay_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.max_sync_failures = max_sync_failures
+        self._lock_file = None
+        self.directory = self._claim_slot(directory)
+
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._closed = False
+        self._written_seq = 0
+        self._synced_seq = 0
+        # id -> (segment, offset, length) of records not yet stored, oldest first
+        self._pending = OrderedDict()
+        # segment -> ids of the records it holds, stored or not
+        self._segment_ids = {}
+        # segment -> ids of the records it holds an ack line for
+        self._segment_acks = {}
+        # (segment, offset, length) of every record found at startup
+        self._recovered = []
+        # Descriptors of rotated-out segments, for the sync thread to fsync and close
+        self._retired = []
+        self._directory_dirty = False
+        self._sync_failures = 0
+        self._replay_failures = 0
+        self._replay_thread = None
+        self.appended = 0
+        self.acknowledged = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.replayed_batches = 0
+        self.replay_errors = 0
+        self.compactions = 0
+        self.last_error = None
+
+        self._segments = self._recover()
+        if not self._segments:
+            self._segments = [1]
+        self._segment_ids.setdefault(self._segments[-1], set())
+        self._segment_acks.setdefault(self._segments[-1], set())
+        self._fd = os.open(self._segment_path(self._segments[-1]), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        _fsync_directory(self.directory)
+
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="prediction-log-sync", daemon=True)
+        self._sync_thread.start()
+
+    def _claim_slot(self, directory):
+        """The first slot directory no other process holds"""
+        slot = 0
+        while True:
+            path = os.path.join(directory, f"slot-{slot}")
+            os.makedirs(path, exist_ok=True)
+            if fcntl is None:
+                return path
+            lock_file = open(os.path.join(path, "LOCK"), 'a')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                slot += 1
+                continue
+            self._lock_file = lock_file
+            return path
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:08d}.log")
+
+    def _scan_segment(self, number, repair=False):
+        """(offset, length, entry) of each line of a segment; with repair, a torn last line is truncated away"""
+        path = self._segment_path(number)
+        with open(path, 'rb') as f:
+            data = f.read()
+        entries = []
+        offset = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                entries.append((offset, len(line), json.loads(line)))
+            except ValueError:
+                if repair and offset + len(line) == len(data):
+                    print(f"Truncating torn record at the end of {path}")
+                    with open(path, 'r+b') as f:
+                        f.truncate(offset)
+                        os.fsync(f.fileno())
+                    break
+                print(f"Skipping unreadable record in {path} at byte {offset}")
+            offset += len(line)
+        return entries
+
+    def _recover(self):
+        segments = sorted(
+            int(match.group(1)) for match in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if match
+        )
+        acked = set()
+        for number in segments:
+            ids = self._segment_ids.setdefault(number, set())
+            acks = self._segment_acks.setdefault(number, set())
+            for offset, length, entry in self._scan_segment(number, repair=(number == segments[-1])):
+                if entry.get('op') == 'put':
+                    record_id = entry['record']['id']
+                    ids.add(record_id)
+                    self._pending[record_id] = (number, offset, length)
+                    self._recovered.append((number, offset, length))
+                elif entry.get('op') == 'ack':
+                    acks.add(entry['id'])
+                    acked.add(entry['id'])
+        for record_id in acked:
+            self._pending.pop(record_id, None)
+        if self._recovered:
+            print(f"Recovered {len(self._recovered)} logged predictions, {len(self._pending)} not yet stored in the database")
+        return segments
+
+    def _read_records(self, locations):
+        """Records at (segment, offset, length) locations, read one at a time"""
+        current, f = None, None
+        try:
+            for number, offset, length in locations:
+                if number != current:
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment_path(number), 'rb')
+                    current = number
+                f.seek(offset)
+                yield json.loads(f.read(length))['record']
+        finally:
+            if f is not None:
+                f.close()
+
+    def records(self):
+        """Records found in the log at startup, oldest first; only available before start()"""
+        return self._read_records(list(self._recovered))
+
+    def start(self):
+        """Start draining the log to the sink"""
+        self._recovered = []
+        if self.sink is None or self._replay_thread is not None:
+            return
+        self._replay_thread = threading.Thread(target=self._replay_loop, name="prediction-log-replay", daemon=True)
+        self._replay_thread.start()
+        if self._pending:
+            self._wake.set()
+
+    def append(self, record):
+        """Durably log a record; returns once it has been fsynced, raises OSError if fsyncs keep failing"""
+        data = _encode({"op": "put", "record": record})
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Prediction log is closed")
+            number, offset, seq = self._write_locked(data)
+            self._pending[record['id']] = (number, offset, len(data))
+            self._segment_ids[number].add(record['id'])
+            self.appended += 1
+            self._cond.notify_all()
+            while self._synced_seq < seq:
+                if self._sync_failures >= self.max_sync_failures:
+                    raise OSError(f"Prediction log fsync failed {self._sync_failures} times in a row")
+                self._cond.wait()
+            wake = self._replay_failures == 0
+        # While the database is failing the replayer keeps to its backoff
+        if wake:
+            self._wake.set()
+
+    def ack(self, ids):
+        """Mark records as stored in the database; acks are not waited on, a lost one only causes a rewrite"""
+        with self._cond:
+            if self._closed:
+                return
+            for record_id in ids:
+                if self._pending.pop(record_id, None) is not None:
+                    number, _, _ = self._write_locked(_encode({"op": "ack", "id": record_id}))
+                    self._segment_acks[number].add(record_id)
+                    self.acknowledged += 1
+            self._cond.notify_all()
+
+    def _write_locked(self, data):
+        """Append data to the active segment; returns (segment, offset, sequence number)"""
+        if self._size and self._size + len(data) > self.segment_bytes:
+            self._rotate_locked()
+        number, offset = self._segments[-1], self._size
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+        self._size += len(data)
+        self._written_seq += 1
+        return number, offset, self._written_seq
+
+    def _rotate_locked(self):
+        # The sync thread fsyncs and closes the old descriptor; nothing here waits on it
+        self._retired.append(self._fd)
+        number = self._segments[-1] + 1
+        self._segments.append(number)
+        self._segment_ids[number] = set()
+        self._segment_acks[number] = set()
+        self._fd = os.open(self._segment_path(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._size = 0
+        self._directory_dirty = True
+
+    def _sync_loop(self):
+        while True:
+            with self._cond:
+                while self._written_seq == self._synced_seq and not self._closed:
+                    self._cond.wait()
+                closing = self._closed
+            if not closing:
+                # Let concurrent appends join this fsync
+                time.sleep(self.sync_delay)
+            with self._cond:
+                target = self._written_seq
+                fd = self._fd
+                retired, self._retired = self._retired, []
+                directory_dirty, self._directory_dirty = self._directory_dirty, False
+                if closing:
+                    self._fd = -1
+
+            # Only this thread closes descriptors, so fd stays open while it is synced
+            synced = True
+            for old_fd in retired:
+                try:
+                    os.fsync(old_fd)
+                except OSError as e:
+                    synced = False
+                    print(f"Prediction log fsync failed: {str(e)}")
+                finally:
+                    os.close(old_fd)
+            if directory_dirty:
+                _fsync_directory(self.directory)
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                synced = False
+                print(f"Prediction log fsync failed: {str(e)}")
+            if closing:
+                os.close(fd)
+
+            with self._cond:
+                if synced or closing:
+                    self.syncs += 1
+                    self._synced_seq = max(self._synced_seq, target)
+                    self._sync_failures = 0
+                else:
+                    self.sync_errors += 1
+                    self._sync_failures += 1
+                failures = self._sync_failures
+                self._cond.notify_all()
+            if closing:
+                return
+            if failures:
+                # Back off while the disk is failing instead of spinning on fsync
+                time.sleep(min(1.0, 0.01 * 2 ** failures))
+
+    def _pending_batch(self):
+        """Up to batch_size pending records, oldest first"""
+        with self._cond:
+            locations = list(itertools.islice(self._pending.values(), self.batch_size))
+        return list(self._read_records(locations))
+
+    def _replay_loop(self):
+        while not self._closed:
+            if self._replay_failures:
+                delay = min(self.max_backoff, self.replay_interval * 2 ** (self._replay_failures - 1))
+            else:
+                delay = self.replay_interval
+            self._wake.wait(timeout=delay)
+            self._wake.clear()
+            if not self._pending or self._closed:
+                continue
+
+            batch = self._pending_batch()
+            if not batch:
+                continue
+            try:
+                stored = self.sink(batch)
+                error = None if stored else "database unavailable"
+            except Exception as e:
+                stored, error = False, str(e)
+
+            with self._cond:
+                if stored:
+                    self._replay_failures = 0
+                    self.replayed_batches += 1
+                else:
+                    self._replay_failures += 1
+                    self.replay_errors += 1
+                    self.last_error = error
+            if not stored:
+                if self._replay_failures == 1:
+                    print(f"Could not store logged predictions ({error}); retrying with backoff")
+                continue
+
+            self.ack([record['id'] for record in batch])
+            self.compact()
+            if self._pending:
+                self._wake.set()
+
+    def compact(self):
+        """Delete or rewrite sealed segments whose records have been acknowledged"""
+        # Runs on the replayer thread, the only one that acks or moves records
+        with self._cond:
+            sealed = self._segments[:-1]
+        for number in sealed:
+            with self._cond:
+                ids = self._segment_ids[number]
+                keep = sorted(
+                    ((record_id, self._pending[record_id]) for record_id in ids if record_id in self._pending),
+                    key=lambda item: item[1][1]
+                )
+                # Without these acks the puts still held by older segments would be replayed
+                older = [self._segment_ids[other] for other in self._segments if other < number]
+                carried = sorted(
+                    record_id for record_id in self._segment_acks[number]
+                    if any(record_id in other_ids for other_ids in older)
+                )
+                unchanged = len(keep) == len(ids) and len(carried) == len(self._segment_acks[number])
+            if unchanged or (keep and len(keep) * 2 > len(ids)):
+                continue
+
+            path = self._segment_path(number)
+            relocated = {}
+            if keep or carried:
+                temp_path = path + '.tmp'
+                with open(path, 'rb') as source, open(temp_path, 'wb') as f:
+                    position = 0
+                    for record_id, (_, offset, length) in keep:
+                        source.seek(offset)
+                        f.write(source.read(length))
+                        relocated[record_id] = (number, position, length)
+                        position += length
+                    for record_id in carried:
+                        f.write(_encode({"op": "ack", "id": record_id}))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, path)
+            else:
+                os.remove(path)
+            _fsync_directory(self.directory)
+
+            with self._cond:
+                for record_id, location in relocated.items():
+                    if record_id in self._pending:
+                        self._pending[record_id] = location
+                if keep or carried:
+                    self._segment_ids[number] = set(relocated)
+                    self._segment_acks[number] = set(carried)
+                else:
+                    self._segments.remove(number)
+                    del self._segment_ids[number]
+                    del self._segment_acks[number]
+                self.compactions += 1
+
+    def close(self):
+        """Flush and close the log; appends after this raise"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._wake.set()
+        self._sync_thread.join()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "directory": self.directory,
+                "segments": len(self._segments),
+                "active_segment_bytes": self._size,
+                "pending": len(self._pending),
+                "appended": self.appended,
+                "acknowledged": self.acknowledged,
+                "syncs": self.syncs,
+                "sync_errors": self.sync_errors,
+                "appends_per_sync": round(self.appended / self.syncs, 2) if self.syncs else 0.0,
+                "replayed_batches": self.replayed_batches,
+                "replay_errors": self.replay_errors,
+                "backing_off": self._replay_failures > 0,
+                "compactions": self.compactions,
+                "last_error": self.last_error
+            }
@@ -0,0 +1,191 @@
+"""
+Token-bucket admission control for the endpoints that spend upstream quota.
+
+Every limited endpoint has a bucket per user and one global bucket. A
+request is admitted only when both have a token, and then takes one from
+each, so a rejected user never drains the global bucket. Rejections report
+how long until a token is available, for the Retry-After header.
+
+Buckets live in process memory by default. With a SQLite path they are kept
+in a shared database file instead, so every worker process on the host
+enforces the same limits.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class Limit:
+    """rate tokens per second, up to burst tokens saved up"""
+
+    __slots__ = ('rate', 'burst')
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = float(max(burst, 1))
+
+    def refill(self, tokens, updated_at, now):
+        return min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+
+    def wait(self, tokens):
+        """Seconds until tokens reaches one"""
+        return (1.0 - tokens) / self.rate if self.rate > 0 else 60.0
+
+    def to_dict(self):
+        return {"per_minute": round(self.rate * 60, 3), "burst": self.burst}
+
+
+def _take(buckets, states, now):
+    """
+    Refill states ({key: (tokens, updated_at)}) and take a token from every
+    bucket if all have one. Returns (blocking_key, retry_after, new_states),
+    where blocking_key is None when the request is admitted and otherwise
+    the empty bucket with the longest wait.
+    """
+    refilled = {}
+    blocking_key, retry_after = None, 0.0
+    for key, limit in buckets:
+        tokens, updated_at = states.get(key, (limit.burst, now))
+        tokens = limit.refill(tokens, updated_at, now)
+        refilled[key] = tokens
+        if tokens < 1.0 and limit.wait(tokens) >= retry_after:
+            blocking_key, retry_after = key, limit.wait(tokens)
+    if blocking_key is not None:
+        return blocking_key, retry_after, {key: (tokens, now) for key, tokens in refilled.items()}
+    return None, 0.0, {key: (tokens - 1.0, now) for key, tokens in refilled.items()}
+
+
+class MemoryBucketStore:
+    """Buckets of this process, at most max_keys of them (least recently used are dropped)"""
+
+    shared = False
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets, now):
+        with self._lock:
+            blocking_key, retry_after, states = _take(
+                buckets, {key: self._states[key] for key, _ in buckets if key in self._states}, now
+            )
+            for key, state in states.items():
+                self._states[key] = state
+                self._states.move_to_end(key)
+            # A dropped bucket comes back full, which only ever errs on the lenient side
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        return blocking_key, retry_after
+
+
+class SQLiteBucketStore:
+    """
+    Buckets in a SQLite file shared by the worker processes of one host.
+    Each acquisition is one IMMEDIATE transaction, so concurrent workers
+    never take the same token twice.
+    """
+
+    shared = True
+
+    def __init__(self, path, idle_seconds=3600, prune_every=1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self.prune_every = prune_every
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._acquisitions = 0
+
+    def acquire(self, buckets, now):
+        keys = [key for key, _ in buckets]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    f"SELECT key, tokens, updated_at FROM rate_buckets WHERE key IN ({','.join('?' * len(keys))})",
+                    keys
+                ).fetchall()
+                blocking_key, retry_after, states = _take(buckets, {key: (tokens, updated_at) for key, tokens, updated_at in rows}, now)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, tokens, updated_at) for key, (tokens, updated_at) in states.items()]
+                )
+                self._acquisitions += 1
+                if self._acquisitions % self.prune_every == 0:
+                    # Buckets idle this long have refilled; a missing bucket is a full one
+                    self._db.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - self.idle_seconds,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return blocking_key, retry_after
+
+
+class AdmissionController:
+    """
+    Per-endpoint token buckets. limits maps an endpoint name to a dict with
+    a 'user' and/or a 'global' Limit; endpoints without limits are always
+    admitted. If the store fails, requests are admitted rather than lost.
+    """
+
+    def __init__(self, limits, store=None, enabled=True):
+        self.limits = limits
+        self.store = store or MemoryBucketStore()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counts = {endpoint: {"admitted": 0, "rejected_user": 0, "rejected_global": 0} for endpoint in limits}
+        self.store_errors = 0
+
+    def admit(self, endpoint, user_key):
+        """(admitted, retry_after_seconds) for a request of user_key to endpoint"""
+        endpoint_limits = self.limits.get(endpoint)
+        if not self.enabled or not endpoint_limits:
+            return True, 0.0
+
+        buckets = []
+        if 'user' in endpoint_limits:
+            buckets.append((f"{endpoint}:user:{user_key}", endpoint_limits['user']))
+        global_key = f"{endpoint}:global"
+        if 'global' in endpoint_limits:
+            buckets.append((global_key, endpoint_limits['global']))
+
+        try:
+            blocking_key, retry_after = self.store.acquire(buckets, time.time())
+        except Exception as e:
+            print(f"Rate limit store error, admitting request: {str(e)}")
+            with self._lock:
+                self.store_errors += 1
+            return True, 0.0
+
+        with self._lock:
+            counts = self.counts[endpoint]
+            if blocking_key is None:
+                counts["admitted"] += 1
+            elif blocking_key == global_key:
+                counts["rejected_global"] += 1
+            else:
+                counts["rejected_user"] += 1
+        return blocking_key is None, retry_after
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "shared": self.store.shared,
+                "limits": {
+                    endpoint: {scope: limit.to_dict() for scope, limit in endpoint_limits.items()}
+                    for endpoint, endpoint_limits in self.limits.items()
+                },
+                "requests": {endpoint: dict(counts) for endpoint, counts in self.counts.items()},
+                "store_errors": self.store_errors
+            }
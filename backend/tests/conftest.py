@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """The Flask app module, with its on-disk state in a temporary directory"""
+    state = tmp_path_factory.mktemp('backend')
+    for name, directory in [('PREDICTION_LOG_DIR', 'prediction_log'), ('UPLOAD_DIR', 'uploads'),
+                            ('KB_BUNDLE_DIR', 'kb_bundles'), ('TREATMENT_SUMMARY_DIR', 'treatment_summaries'),
+                            ('AUDIO_PACK_DIR', 'audio_packs')]:
+        os.environ.setdefault(name, str(state / directory))
+    os.environ.setdefault('KB_COMPILED_PATH', str(state / 'knowledge_base.sqlite3'))
+    import app
+    return app
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
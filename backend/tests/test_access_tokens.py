@@ -0,0 +1,48 @@
+import base64
+import hashlib
+import hmac
+import json
+
+from access_tokens import bearer_subject, verified_subject
+
+SECRET = 'super-secret-jwt-token'
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def make_token(claims, secret=SECRET, alg='HS256'):
+    signing_input = f"{encode({'alg': alg, 'typ': 'JWT'})}.{encode(claims)}"
+    signature = hmac.new(secret.encode('utf-8'), signing_input.encode('ascii'), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode('ascii')}"
+
+
+def test_valid_token_gives_its_subject():
+    token = make_token({'sub': 'user-1', 'exp': 2000})
+    assert verified_subject(token, SECRET, now=1000) == 'user-1'
+
+
+def test_rejected_tokens():
+    claims = {'sub': 'user-1', 'exp': 2000}
+    token = make_token(claims)
+    header, _, signature = token.split('.')
+    forged = f"{header}.{encode(dict(claims, sub='user-2'))}.{signature}"
+
+    assert verified_subject(token, SECRET, now=2000) is None
+    assert verified_subject(make_token(claims, secret='other'), SECRET, now=1000) is None
+    assert verified_subject(forged, SECRET, now=1000) is None
+    assert verified_subject(make_token(claims, alg='none'), SECRET, now=1000) is None
+    assert verified_subject(make_token({'role': 'anon', 'exp': 2000}), SECRET, now=1000) is None
+    assert verified_subject(make_token({'sub': 'user-1'}), SECRET, now=1000) is None
+    assert verified_subject('not.a-token', SECRET, now=1000) is None
+    assert verified_subject('a.b.c', SECRET, now=1000) is None
+    assert verified_subject(token, None, now=1000) is None
+
+
+def test_bearer_header_parsing():
+    token = make_token({'sub': 'user-1', 'exp': 4e9})
+    assert bearer_subject(f"bearer {token}", SECRET) == 'user-1'
+    assert bearer_subject(f"Basic {token}", SECRET) is None
+    assert bearer_subject(None, SECRET) is None
+    assert bearer_subject('', SECRET) is None
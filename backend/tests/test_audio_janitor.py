@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+from audio_janitor import PART_FILE_GRACE_SECONDS, AudioJanitor
+from tts_service import TTSService
+
+
+def write_clip(audio_dir, name, size=100, age=0):
+    path = os.path.join(audio_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    audio_dir = tmp_path / 'tts'
+    audio_dir.mkdir()
+    return str(audio_dir)
+
+
+def make_janitor(audio_dir, **kwargs):
+    """A janitor whose thread is not running, swept by the test"""
+    evicted = []
+    janitor = AudioJanitor(audio_dir, on_evict=evicted.append, **kwargs)
+    janitor._scan()
+    janitor.evicted = evicted
+    return janitor
+
+
+def test_quota_counts_clips_written_by_other_processes(audio_dir):
+    janitor = make_janitor(audio_dir, max_bytes=250)
+    write_clip(audio_dir, 'tts_own.mp3', age=10)
+    janitor.record_write('tts_own.mp3', 100)
+
+    # Written by another worker after this janitor started
+    write_clip(audio_dir, 'tts_old.mp3', age=30)
+    write_clip(audio_dir, 'tts_new.mp3', age=5)
+
+    janitor.sweep()
+
+    assert sorted(os.listdir(audio_dir)) == ['tts_new.mp3', 'tts_own.mp3']
+    assert janitor.evicted == ['tts_old.mp3']
+    assert janitor.stats()['bytes'] == 200
+
+
+def test_access_in_another_process_keeps_a_clip(audio_dir):
+    write_clip(audio_dir, 'tts_a.mp3', age=120)
+    write_clip(audio_dir, 'tts_b.mp3', age=120)
+    this_process = make_janitor(audio_dir, ttl_seconds=60)
+    other_process = make_janitor(audio_dir, ttl_seconds=60, interval_seconds=0)
+
+    other_process.record_access('tts_a.mp3')
+    this_process.sweep()
+
+    assert os.listdir(audio_dir) == ['tts_a.mp3']
+    assert this_process.evicted == ['tts_b.mp3']
+
+
+def test_access_write_back_is_throttled(audio_dir):
+    path = write_clip(audio_dir, 'tts_a.mp3', age=120)
+    janitor = make_janitor(audio_dir, interval_seconds=60)
+    # Seen at its modification time; the first access is shared
+    janitor.record_access('tts_a.mp3')
+    shared = os.path.getmtime(path)
+    assert shared > time.time() - 5
+
+    os.utime(path, (shared - 30, shared - 30))
+    janitor.record_access('tts_a.mp3')
+    assert os.path.getmtime(path) == shared - 30
+
+
+def test_unknown_clips_are_indexed_on_access(audio_dir):
+    janitor = make_janitor(audio_dir)
+    write_clip(audio_dir, 'tts_a.mp3', size=42)
+    janitor.record_access('tts_a.mp3')
+    janitor.record_access('tts_missing.mp3')
+
+    assert janitor.contains('tts_a.mp3')
+    assert not janitor.contains('tts_missing.mp3')
+    assert janitor.stats()['bytes'] == 42
+
+
+def test_clips_removed_elsewhere_are_forgotten(audio_dir):
+    path = write_clip(audio_dir, 'tts_a.mp3')
+    janitor = make_janitor(audio_dir)
+    os.remove(path)
+
+    janitor.sweep()
+
+    assert janitor.evicted == ['tts_a.mp3']
+    assert janitor.stats()['files'] == 0
+
+
+def test_only_stale_part_files_are_removed(audio_dir):
+    janitor = make_janitor(audio_dir)
+    write_clip(audio_dir, 'fresh.part')
+    write_clip(audio_dir, 'stale.part', age=PART_FILE_GRACE_SECONDS + 60)
+
+    janitor.sweep()
+
+    assert os.listdir(audio_dir) == ['fresh.part']
+    assert janitor.stats()['files'] == 0
+
+
+def test_lookup_finds_clips_written_by_other_processes(audio_dir):
+    janitor = make_janitor(audio_dir)
+    service = TTSService(audio_dir, janitor=janitor)
+    key = service.key_for("Water at the base of the plant.")
+    assert service.lookup(key) is None
+
+    write_clip(audio_dir, service.file_name(key))
+
+    assert service.lookup(key) == service.url_for(key)
+    assert janitor.contains(service.file_name(key))
+    assert service.stats()['disk_hits'] == 1
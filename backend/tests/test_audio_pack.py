@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import audio_pack
+from audio_pack import AudioPack, build_audio_pack
+from chat_router import ChatRouter
+from kb_bundles import StubTranslator
+from knowledge_base import DEFAULT_SOURCE_PATH, KnowledgeBase
+from tts_service import TTSService
+
+
+class RecordingTTSService(TTSService):
+    """Writes placeholder clips instead of calling the Text-to-Speech API"""
+
+    spoken = []
+
+    def synthesize(self, text, language_code='en-US'):
+        self.spoken.append((text, language_code))
+        keys = {self.key_for(text, language_code)}
+        keys.update(key for key, _ in self.plan_chunks(text, language_code))
+        for key in keys:
+            with open(self.path_for(key), 'wb') as f:
+                f.write(b'mp3')
+        return self.url_for(self.key_for(text, language_code))
+
+
+@pytest.fixture
+def chat_router(tmp_path):
+    knowledge_base = KnowledgeBase(compiled_path=str(tmp_path / 'kb.sqlite3'),
+                                   source_path=DEFAULT_SOURCE_PATH)
+    return ChatRouter(knowledge_base, translate=StubTranslator().translate)
+
+
+@pytest.fixture
+def pack_dir(tmp_path, monkeypatch, chat_router):
+    RecordingTTSService.spoken = []
+    monkeypatch.setattr(audio_pack, 'TTSService', RecordingTTSService)
+    output_dir = str(tmp_path / 'packs')
+    build_audio_pack(chat_router, output_dir=output_dir, languages=['en-US', 'hi-IN'])
+    return output_dir
+
+
+@pytest.mark.parametrize('language_code', ['en-US', 'hi-IN'])
+def test_fast_path_answer_is_served_from_the_pack(tmp_path, chat_router, pack_dir, language_code):
+    service = TTSService(str(tmp_path / 'tts'), audio_pack=AudioPack(pack_dir))
+
+    answer, _ = chat_router.answer("How do I treat apple scab?", language_code)
+
+    url = service.lookup(service.key_for(answer, language_code))
+    assert url is not None and url.startswith('/audio_pack/')
+    for key, _ in service.plan_chunks(answer, language_code):
+        assert os.path.isfile(service.local_path(key))
+
+
+def test_rebuild_reuses_clips(chat_router, pack_dir):
+    clips = len(AudioPack(pack_dir).entries)
+    RecordingTTSService.spoken = []
+
+    build_audio_pack(chat_router, output_dir=pack_dir, languages=['en-US', 'hi-IN'])
+
+    assert RecordingTTSService.spoken == []
+    assert len(AudioPack(pack_dir).entries) == clips
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from bulkheads import BACKGROUND_PRIORITY, DEFAULT_PRIORITY, Bulkhead, BulkheadFull, Bulkheads
+from deadlines import RequestDeadlines
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class Priorities:
+    """Priority function returning whatever the test sets next"""
+
+    def __init__(self):
+        self.next = DEFAULT_PRIORITY
+
+    def __call__(self):
+        return self.next
+
+
+@pytest.fixture
+def busy():
+    """A one-worker bulkhead whose worker is held until release is set"""
+    priorities = Priorities()
+    bulkhead = Bulkhead('test', workers=1, max_queue=3, priority=priorities)
+    release = threading.Event()
+    bulkhead.submit(release.wait)
+    assert wait_for(lambda: bulkhead.stats()["active"] == 1)
+    yield bulkhead, priorities, release
+    release.set()
+
+
+def submit(bulkhead, priorities, priority, log, name):
+    priorities.next = priority
+    return bulkhead.submit(log.append, name)
+
+
+def test_queued_calls_run_in_priority_then_arrival_order(busy):
+    bulkhead, priorities, release = busy
+    ran = []
+    futures = [
+        submit(bulkhead, priorities, 3, ran, 'background'),
+        submit(bulkhead, priorities, 1, ran, 'chat-1'),
+        submit(bulkhead, priorities, 0, ran, 'predict'),
+    ]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert ran == ['predict', 'chat-1', 'background']
+
+
+def test_full_queue_rejects_calls_that_do_not_outrank_it(busy):
+    bulkhead, priorities, _ = busy
+    ran = []
+    for name in ('a', 'b', 'c'):
+        submit(bulkhead, priorities, 1, ran, name)
+
+    with pytest.raises(BulkheadFull) as raised:
+        submit(bulkhead, priorities, 1, ran, 'same')
+    with pytest.raises(BulkheadFull):
+        submit(bulkhead, priorities, 2, ran, 'lower')
+
+    assert raised.value.dependency == 'test'
+    stats = bulkhead.stats()
+    assert (stats["queued"], stats["shed"], stats["displaced"]) == (3, 2, 0)
+
+
+def test_higher_priority_displaces_the_latest_lowest_priority_call(busy):
+    bulkhead, priorities, release = busy
+    ran = []
+    kept = submit(bulkhead, priorities, 3, ran, 'background-1')
+    displaced = submit(bulkhead, priorities, 3, ran, 'background-2')
+    chat = submit(bulkhead, priorities, 1, ran, 'chat')
+
+    predict = submit(bulkhead, priorities, 0, ran, 'predict')
+
+    with pytest.raises(BulkheadFull):
+        displaced.result(timeout=0)
+    release.set()
+    for future in (kept, chat, predict):
+        future.result(timeout=5)
+    assert ran == ['predict', 'chat', 'background-1']
+    assert bulkhead.stats()["displaced"] == 1
+
+
+def test_worker_count_is_a_hard_limit():
+    bulkhead = Bulkhead('test', workers=2, max_queue=20)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    futures = [bulkhead.submit(call) for _ in range(10)]
+    for future in futures:
+        future.result(timeout=5)
+    assert max(peak) == 2
+    assert bulkhead.stats()["completed"] == 10
+
+
+def test_errors_reach_the_caller():
+    bulkhead = Bulkhead('test', workers=1)
+
+    def fail():
+        raise ConnectionError('upstream down')
+
+    with pytest.raises(ConnectionError):
+        bulkhead.submit(fail).result(timeout=5)
+
+
+def test_priority_comes_from_the_request_endpoint():
+    pools = Bulkheads({'groq': (1, 1)}, priorities={'predict': 0, 'chatbot': 1})
+    request_deadlines = RequestDeadlines()
+    assert pools.priority() == BACKGROUND_PRIORITY
+
+    for endpoint, priority in (('predict', 0), ('chatbot', 1), ('history', DEFAULT_PRIORITY)):
+        token = request_deadlines.start(endpoint)
+        try:
+            assert pools.priority() == priority
+        finally:
+            request_deadlines.finish(token)
+
+
+def test_model_routes_are_counted_exactly_across_threads(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'model_route_counts', {'primary': 0, 'fallback': 0})
+    start = threading.Barrier(8)
+
+    def route(grounded):
+        start.wait()
+        for _ in range(2000):
+            backend.chat_model_order(grounded)
+
+    threads = [threading.Thread(target=route, args=(n % 2 == 0,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.model_route_stats() == {'primary': 8000, 'fallback': 8000}
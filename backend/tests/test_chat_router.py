@@ -0,0 +1,68 @@
+import pytest
+
+from chat_router import ChatRouter
+from kb_bundles import StubTranslator
+from knowledge_base import DEFAULT_SOURCE_PATH, KnowledgeBase
+
+
+@pytest.fixture
+def knowledge_base(tmp_path):
+    return KnowledgeBase(compiled_path=str(tmp_path / 'kb.sqlite3'), source_path=DEFAULT_SOURCE_PATH)
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("How do I treat apple scab?", ('apple_scab', 'treatment')),
+    ("What are the symptoms of late blight", ('late_blight', 'symptoms')),
+    ("what causes powdery mildew?", ('powdery_mildew', 'causes')),
+    ("How can I prevent rust", ('rust', 'prevention')),
+    ("Tell me about early blight", ('early_blight', 'description')),
+])
+def test_clear_questions_use_the_knowledge_base(knowledge_base, message, expected):
+    assert ChatRouter(knowledge_base).classify(message) == expected
+
+
+@pytest.mark.parametrize('message', [
+    "Hello",
+    "How do I treat my plants?",                                   # no disease
+    "How do I treat apple scab and late blight?",                  # two diseases
+    "What causes apple scab and how do I treat it?",               # two intents
+    "Which fungicide is best for apple scab?",                     # open-ended
+    "What is the dosage of fungicide to treat apple scab?",        # open-ended
+    "treat apple scab " + "please " * 40,                          # too long
+])
+def test_other_questions_go_to_the_llm(knowledge_base, message):
+    assert ChatRouter(knowledge_base).classify(message) is None
+
+
+def test_answers_use_precomputed_translations_first(knowledge_base):
+    stub = StubTranslator()
+    live = []
+
+    def translate(text, language_code):
+        live.append(text)
+        return stub.translate(text, language_code)
+
+    known = {}
+    router = ChatRouter(knowledge_base, translate_known=lambda text, lang: known.get(text), translate=translate)
+    english = router.answer("How do I treat apple scab?")[0]
+    assert english.startswith("Apple Scab: Remove infected leaves")
+
+    # Missing bundle strings fall back to one live translation of the whole answer
+    assert router.answer("How do I treat apple scab?", 'hi-IN') == (f"[hi] {english}", english)
+    assert live == [english]
+
+    name, text = english.split(": ", 1)
+    known.update({name: "सेब की पपड़ी", text: "संक्रमित पत्तियाँ हटाएँ"})
+    assert router.answer("How do I treat apple scab?", 'hi-IN')[0] == "सेब की पपड़ी: संक्रमित पत्तियाँ हटाएँ"
+    assert len(live) == 1
+    stats = router.stats()
+    assert (stats["precomputed_translations"], stats["live_translations"]) == (1, 1)
+
+
+def test_tier_counts(knowledge_base):
+    router = ChatRouter(knowledge_base)
+    for tier in ['knowledge_base', 'llm', 'llm', 'cache']:
+        router.record(tier)
+    stats = router.stats()
+    assert stats["requests"] == 4
+    assert stats["shares"]["llm"] == 0.5
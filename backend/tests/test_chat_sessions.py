@@ -0,0 +1,119 @@
+import pytest
+
+import chat_sessions
+from chat_sessions import ChatSessionStore, first_sentence
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_sessions, 'time', clock)
+    return clock
+
+
+def test_unknown_or_malformed_ids_get_a_new_session(clock):
+    store = ChatSessionStore()
+    session = store.get_or_create()
+    assert store.get_or_create(session.id) is session
+    assert store.get_or_create('not-a-session-id').id != session.id
+    assert store.get_or_create('0' * 32).id != session.id
+    assert store.stats()["created"] == 3
+
+
+def test_idle_sessions_expire(clock):
+    store = ChatSessionStore(ttl_seconds=60)
+    session = store.get_or_create()
+
+    clock.now += 60
+    assert store.get_or_create(session.id) is session
+
+    clock.now += 61
+    assert store.get_or_create(session.id) is not session
+    assert store.stats()["expired"] == 1
+
+
+def test_activity_keeps_a_session_alive(clock):
+    store = ChatSessionStore(ttl_seconds=60)
+    session = store.get_or_create()
+    clock.now += 50
+    store.add_turn(session, "How do I treat apple scab?", "Apply fungicide.")
+    clock.now += 50
+    assert store.get_or_create(session.id) is session
+
+
+def test_least_recently_used_sessions_are_evicted(clock):
+    store = ChatSessionStore(max_sessions=2)
+    first = store.get_or_create()
+    second = store.get_or_create()
+    store.get_or_create(first.id)
+    store.get_or_create()
+
+    assert store.get_or_create(first.id) is first
+    assert store.get_or_create(second.id) is not second
+    assert store.stats()["sessions"] == 2
+
+
+def test_evicted_sessions_are_spilled_and_restored(tmp_path, clock):
+    store = ChatSessionStore(max_sessions=1, persistent_path=str(tmp_path / 'sessions.sqlite3'))
+    first = store.get_or_create()
+    store.add_turn(first, "What causes rust?", "A fungus.")
+    store.get_or_create()
+
+    restored = store.get_or_create(first.id)
+    assert restored is not first
+    assert restored.id == first.id
+    assert restored.turns == first.turns
+    stats = store.stats()
+    assert (stats["spilled"], stats["restored"]) == (2, 1)
+
+
+def test_expired_spilled_sessions_are_not_restored(tmp_path, clock):
+    path = str(tmp_path / 'sessions.sqlite3')
+    store = ChatSessionStore(max_sessions=1, ttl_seconds=60, persistent_path=path)
+    first = store.get_or_create()
+    store.get_or_create()
+
+    clock.now += 61
+    assert store.get_or_create(first.id).id != first.id
+    # Reopening the store purges them
+    reopened = ChatSessionStore(ttl_seconds=60, persistent_path=path)
+    assert reopened._db.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0] == 0
+
+
+def test_old_turns_fold_into_a_bounded_summary(clock):
+    store = ChatSessionStore(max_turns=4, summary_tokens=30)
+    session = store.get_or_create()
+    for i in range(10):
+        store.add_turn(session, f"Question {i}? More detail here.", f"Answer {i}. Longer explanation.")
+
+    assert [content for _, content, _ in session.turns] == [
+        "Question 8? More detail here.", "Answer 8. Longer explanation.",
+        "Question 9? More detail here.", "Answer 9. Longer explanation."
+    ]
+    assert session.summary.endswith("User: Question 7?\nAssistant: Answer 7.")
+    assert "Question 0" not in session.summary
+    assert session.last_user_message == "Question 9? More detail here."
+
+
+def test_history_keeps_whole_exchanges_within_the_budget(clock):
+    store = ChatSessionStore()
+    session = store.get_or_create()
+    for i in range(3):
+        store.add_turn(session, f"question {i} " + "word " * 8, f"answer {i} " + "word " * 8)
+
+    messages = store.history_messages(session, token_budget=30)
+    assert [message["content"].split()[:2] for message in messages] == [["question", "2"], ["answer", "2"]]
+    assert messages[0]["role"] == "user"
+
+
+def test_first_sentence():
+    assert first_sentence("One. Two.") == "One."
+    assert first_sentence("x" * 200, limit=10) == "xxxxxxx..."
@@ -0,0 +1,108 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker('test', failure_threshold=3, slow_call_seconds=2.0, reset_seconds=30.0)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure('boom')
+    assert breaker.state == OPEN
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure('boom')
+    breaker.record_failure('boom')
+    breaker.record_success(0.1)
+    breaker.record_failure('boom')
+    breaker.record_failure('boom')
+    assert breaker.state == CLOSED
+
+    breaker.record_failure('boom')
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_slow_success_counts_as_failure(breaker):
+    for _ in range(3):
+        breaker.record_success(5.0)
+    assert breaker.state == OPEN
+    assert breaker.stats()['slow_calls'] == 3
+
+
+def test_half_open_admits_one_probe(breaker, clock):
+    open_breaker(breaker)
+    assert breaker.retry_after() == 30.0
+
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_outcome_closes_or_reopens(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure('still down')
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_probe_frees_the_slot(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.release_probe()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_expires(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_release_without_probe_is_a_no_op(breaker, clock):
+    breaker.release_probe()
+    assert breaker.state == CLOSED
+
+    open_breaker(breaker)
+    breaker.release_probe()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
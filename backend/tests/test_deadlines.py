@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import deadlines
+from bulkheads import Bulkhead
+from deadlines import DeadlineExceeded, RequestDeadlines, current_deadline
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(deadlines, 'time', clock)
+    return clock
+
+
+def test_budgets_per_endpoint(clock):
+    request_deadlines = RequestDeadlines(budgets={'predict': 20}, default_budget=5)
+    token = request_deadlines.start('predict')
+    assert request_deadlines.remaining() == 20
+    request_deadlines.finish(token)
+
+    token = request_deadlines.start('history')
+    assert request_deadlines.remaining() == 5
+    request_deadlines.finish(token)
+    assert current_deadline() is None
+
+
+def test_stage_timeouts_shrink_and_then_raise(clock):
+    request_deadlines = RequestDeadlines(default_budget=10, min_stage_seconds=0.25)
+    assert request_deadlines.timeout('translation', cap=3) == 3
+
+    token = request_deadlines.start('chatbot')
+    assert request_deadlines.timeout('translation', cap=3) == 3
+    clock.now += 8
+    assert request_deadlines.timeout('translation', cap=3) == 2
+    assert request_deadlines.timeout('llm') == 2
+
+    clock.now += 1.8
+    assert request_deadlines.expired()
+    with pytest.raises(DeadlineExceeded) as raised:
+        request_deadlines.timeout('llm', cap=3)
+    assert raised.value.stage == 'llm'
+
+    request_deadlines.finish(token)
+    stats = request_deadlines.stats()
+    assert stats["stage_timeouts"] == {'llm': 1}
+    # 0.2 seconds were left, so the request itself did not run over
+    assert stats["exceeded"] == 0
+
+
+def test_requests_that_run_over_are_counted(clock):
+    request_deadlines = RequestDeadlines(default_budget=1)
+    token = request_deadlines.start('chatbot')
+    clock.now += 1
+    request_deadlines.finish(token)
+    assert request_deadlines.stats()["exceeded"] == 1
+
+
+def test_deadline_follows_the_request_into_pool_threads_and_tasks():
+    request_deadlines = RequestDeadlines(budgets={'predict': 5})
+    token = request_deadlines.start('predict')
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            copied = pool.submit(contextvars.copy_context().run, request_deadlines.remaining).result()
+            # A plain submit does not carry the context
+            plain = pool.submit(request_deadlines.remaining).result()
+
+        async def in_task():
+            return await asyncio.create_task(asyncio.sleep(0, result=request_deadlines.remaining()))
+
+        in_async_task = asyncio.run(in_task())
+    finally:
+        request_deadlines.finish(token)
+
+    assert 0 < copied <= 5
+    assert plain is None
+    assert 0 < in_async_task <= 5
+
+
+def test_concurrent_requests_keep_their_own_deadlines():
+    request_deadlines = RequestDeadlines(budgets={'predict': 20, 'history': 3})
+    seen = {}
+
+    def handle(endpoint):
+        token = request_deadlines.start(endpoint)
+        time.sleep(0.05)
+        seen[endpoint] = request_deadlines.remaining()
+        request_deadlines.finish(token)
+
+    threads = [threading.Thread(target=handle, args=(endpoint,)) for endpoint in ('predict', 'history')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 19 < seen['predict'] <= 20 and 2 < seen['history'] <= 3
+
+
+def test_calls_queued_past_their_deadline_are_dropped():
+    request_deadlines = RequestDeadlines(budgets={'predict': 0.2})
+    bulkhead = Bulkhead('clarifai', workers=1, max_queue=5)
+    release = threading.Event()
+    bulkhead.submit(release.wait)
+
+    token = request_deadlines.start('predict')
+    calls = []
+    try:
+        queued = bulkhead.submit(calls.append, 'called')
+    finally:
+        request_deadlines.finish(token)
+
+    time.sleep(0.3)
+    release.set()
+    with pytest.raises(DeadlineExceeded):
+        queued.result(timeout=5)
+    assert calls == []
+    assert bulkhead.stats()["expired"] == 1
+
+
+def test_upstream_call_gives_up_at_the_request_deadline(backend, monkeypatch):
+    request_deadlines = RequestDeadlines(budgets={'predict': 0.3}, min_stage_seconds=0.05)
+    monkeypatch.setattr(backend, 'request_deadlines', request_deadlines)
+    release = threading.Event()
+
+    token = request_deadlines.start('predict')
+    started = time.monotonic()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            backend.upstream_call('supabase', 'supabase', lambda: release.wait(5))
+    finally:
+        release.set()
+        request_deadlines.finish(token)
+
+    assert time.monotonic() - started < 2
+    assert request_deadlines.stats()["stage_timeouts"] == {'supabase': 1}
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+import idempotency
+from idempotency import CONFLICT, IN_PROGRESS, OWNER, REPLAYED, IdempotencyStore
+
+OK = ({"success": True}, 200, {})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(idempotency, 'time', clock)
+    return clock
+
+
+def test_replays_the_stored_response():
+    store = IdempotencyStore()
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return OK
+
+    assert store.run('key', 'body', handler) == (OK, OWNER)
+    assert store.has_response('key')
+    assert store.run('key', 'body', handler) == (OK, REPLAYED)
+    assert len(calls) == 1
+    assert store.stats()['replayed'] == 1
+
+
+def test_different_body_conflicts():
+    store = IdempotencyStore()
+    store.run('key', 'body', lambda: OK)
+    assert store.run('key', 'other body', lambda: OK) == (None, CONFLICT)
+
+
+@pytest.mark.parametrize('status', [500, 503, 429])
+def test_transient_failures_are_not_replayed(status):
+    store = IdempotencyStore()
+    store.run('key', 'body', lambda: ({"success": False}, status, {}))
+    assert not store.has_response('key')
+    assert store.run('key', 'body', lambda: OK) == (OK, OWNER)
+
+
+def test_handler_exception_abandons_the_key():
+    store = IdempotencyStore()
+
+    def handler():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        store.run('key', 'body', handler)
+    assert store.run('key', 'body', lambda: OK) == (OK, OWNER)
+
+
+def test_retry_waits_for_the_running_request():
+    store = IdempotencyStore()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def handler():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return OK
+
+    first = threading.Thread(target=store.run, args=('key', 'body', handler))
+    first.start()
+    assert started.wait(5)
+    assert store.run('key', 'body', handler, timeout=0.01) == (None, IN_PROGRESS)
+
+    results = []
+    retry = threading.Thread(target=lambda: results.append(store.run('key', 'body', handler, timeout=5)))
+    retry.start()
+    release.set()
+    first.join(5)
+    retry.join(5)
+    assert results == [(OK, REPLAYED)]
+    assert len(calls) == 1
+
+
+def test_entries_expire(clock):
+    store = IdempotencyStore(ttl_seconds=60)
+    store.run('key', 'body', lambda: OK)
+    clock.now += 61
+    assert not store.has_response('key')
+    assert store.run('key', 'body', lambda: OK) == (OK, OWNER)
+    assert store.stats()['entries'] == 1
+
+
+def test_eviction_skips_running_requests():
+    store = IdempotencyStore(max_entries=2)
+    running, outcome = store.claim('running', 'body')
+    assert outcome == OWNER
+    store.run('done-1', 'body', lambda: OK)
+    store.run('done-2', 'body', lambda: OK)
+
+    assert store.stats()['entries'] == 2
+    assert store.claim('running', 'body')[1] == IN_PROGRESS
+    assert not store.has_response('done-1')
+    assert store.has_response('done-2')
+
+    store.complete('running', running, OK)
+    assert store.run('running', 'body', lambda: OK) == (OK, REPLAYED)
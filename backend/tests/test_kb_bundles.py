@@ -0,0 +1,131 @@
+import pytest
+
+from kb_bundles import (KnowledgeBaseBundles, StubBundleSource, StubTranslator, base_language,
+                        build_bundles, collect_strings)
+
+TABLES = [
+    {'apple_scab': {'name': 'Apple Scab', 'treatment': 'Apply fungicide.', 'severity': 3, 'tags': ['fungus']}},
+    {'Apple___Apple_scab': {'treatment': 'Apply fungicide.', 'details': 'Remove fallen leaves.'}},
+    {'Blueberry___healthy': 'Keep watering.'}
+]
+
+
+class CountingTranslator(StubTranslator):
+    def __init__(self, untranslated=()):
+        self.calls = 0
+        self.untranslated = set(untranslated)
+
+    def translate(self, text, language_code):
+        self.calls += 1
+        return text if text in self.untranslated else super().translate(text, language_code)
+
+
+def test_collect_strings_skips_blank_and_duplicate_values():
+    assert collect_strings({'a': 'x', 'b': ['y', ' ', 'x'], 'c': {'d': 'z', 'e': 5}}) == ['x', 'y', 'z']
+
+
+def test_base_language():
+    assert [base_language(code) for code in ('hi-IN', 'TE', None)] == ['hi', 'te', 'en']
+
+
+def test_built_bundles_localize_per_language(tmp_path):
+    build_bundles(TABLES, StubTranslator(), output_dir=str(tmp_path), languages=['hi', 'te-IN'])
+    bundles = KnowledgeBaseBundles(str(tmp_path))
+
+    assert bundles.has_language('hi-IN') and bundles.has_language('te')
+    hindi = bundles.localize('plant_disease_data', TABLES[0], 'hi-IN')['apple_scab']
+    assert hindi == {'name': '[hi] Apple Scab', 'treatment': '[hi] Apply fungicide.',
+                     'severity': 3, 'tags': ['[hi] fungus']}
+    assert bundles.localize('plant_disease_data', TABLES[0], 'te')['apple_scab']['name'] == '[te] Apple Scab'
+    assert bundles.translate_known('Keep watering.', 'te-IN') == '[te] Keep watering.'
+
+
+def test_english_and_missing_languages_fall_back_to_the_base_tables(tmp_path):
+    build_bundles(TABLES, CountingTranslator(untranslated={'Keep watering.'}),
+                  output_dir=str(tmp_path), languages=['hi'])
+    bundles = KnowledgeBaseBundles(str(tmp_path))
+
+    assert bundles.localize('plant_disease_data', TABLES[0], 'en-US') is TABLES[0]
+    assert bundles.localize('plant_disease_data', TABLES[0], 'ml') is TABLES[0]
+    assert not bundles.has_language('ml')
+    assert bundles.translate_known('Apple Scab', 'ml') is None
+    # A string the translator left unchanged is served in English
+    assert bundles.localize('basic_treatments', TABLES[2], 'hi')['Blueberry___healthy'] == 'Keep watering.'
+    assert bundles.translate_known('Keep watering.', 'hi') is None
+
+
+def test_no_bundles(tmp_path):
+    bundles = KnowledgeBaseBundles(str(tmp_path / 'missing'))
+    assert bundles.version is None
+    assert bundles.localize('plant_disease_data', TABLES[0], 'hi') is TABLES[0]
+
+
+def test_rebuild_reuses_translations_and_bumps_the_version(tmp_path):
+    first = build_bundles(TABLES, StubTranslator(), output_dir=str(tmp_path), languages=['hi'])
+    assert build_bundles(TABLES, StubTranslator(), output_dir=str(tmp_path), languages=['hi']) == first
+
+    translator = CountingTranslator()
+    changed = [{'apple_scab': {'name': 'Apple Scab', 'treatment': 'Use copper spray.'}}]
+    second = build_bundles(changed, translator, output_dir=str(tmp_path), languages=['hi'])
+
+    assert second != first
+    assert translator.calls == 1
+    assert KnowledgeBaseBundles(str(tmp_path)).version == second
+
+
+def test_reload_switches_version_and_drops_localized_tables():
+    source = StubBundleSource({'hi': {'Apple Scab': 'v1 name'}}, version='v1')
+    bundles = KnowledgeBaseBundles(source=source)
+    assert bundles.version == 'v1'
+    assert bundles.localize('plant_disease_data', TABLES[0], 'hi')['apple_scab']['name'] == 'v1 name'
+
+    source.publish({'hi': {'Apple Scab': 'v2 name'}}, version='v2')
+    bundles.load()
+
+    assert bundles.version == 'v2'
+    assert bundles.localize('plant_disease_data', TABLES[0], 'hi')['apple_scab']['name'] == 'v2 name'
+
+
+def test_failed_reload_keeps_the_loaded_bundles():
+    class BrokenSource(StubBundleSource):
+        def read(self):
+            if self.version == 'broken':
+                raise OSError('disk gone')
+            return super().read()
+
+    source = BrokenSource({'hi': {'Apple Scab': 'name'}}, version='v1')
+    bundles = KnowledgeBaseBundles(source=source)
+    source.version = 'broken'
+    bundles.load()
+    assert bundles.version == 'v1'
+    assert bundles.translate_known('Apple Scab', 'hi') == 'name'
+
+
+@pytest.fixture
+def stub_bundles(backend, monkeypatch):
+    """Bundles for the live knowledge base, with live translation disabled"""
+    kb = backend.knowledge_base.snapshot()
+    strings = collect_strings(kb.plant_disease_data, kb.treatments, kb.basic_treatments)
+    bundles = KnowledgeBaseBundles(source=StubBundleSource(
+        {'hi': {text: f"[hi] {text}" for text in strings}}, version='stub'
+    ))
+    monkeypatch.setattr(backend, 'kb_bundles', bundles)
+
+    def no_network(*args, **kwargs):
+        raise AssertionError('live translation was called')
+
+    monkeypatch.setattr(backend.translator, 'translate', no_network)
+    return bundles
+
+
+def test_disease_info_serves_bundle_text(client, stub_bundles):
+    hindi = client.get('/disease_info', query_string={'disease': 'apple_scab', 'language': 'hi-IN'}).get_json()
+    english = client.get('/disease_info', query_string={'disease': 'apple_scab'}).get_json()
+
+    assert hindi['info']['name'] == f"[hi] {english['info']['name']}"
+    assert hindi['info']['treatment'] == f"[hi] {english['info']['treatment']}"
+
+
+def test_treatment_lookup_serves_bundle_text(backend, stub_bundles):
+    english = backend.get_treatment_for_disease('Apple___Apple_scab')
+    assert backend.get_treatment_for_disease('Apple___Apple_scab', 'hi-IN') == f"[hi] {english}"
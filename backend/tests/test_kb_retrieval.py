@@ -0,0 +1,105 @@
+import pytest
+
+from kb_retrieval import BM25Index, ContextRetriever, knowledge_base_passages, tokenize
+from knowledge_base import DEFAULT_SOURCE_PATH, KnowledgeBase, KnowledgeBaseSnapshot
+
+TABLES = {
+    "treatments": {
+        "Apple___Apple_scab": {"treatment": "Apply captan fungicide.", "details": "Rake fallen leaves."},
+        "Tomato___Late_blight": "Remove infected plants and spray copper."
+    },
+    "basic_treatments": {
+        "Apple___Apple_scab": "Ignored: the detailed treatment wins.",
+        "Grape___Black_rot": "Prune mummified berries and spray fungicide."
+    },
+    "plant_disease_data": {
+        "apple_scab": {"name": "Apple Scab", "description": "Fungal disease of apple leaves.",
+                       "symptoms": "Olive green spots on leaves.", "treatment": "Fungicide in spring."},
+        "late_blight": {"name": "Late Blight", "description": "Water mould that also attacks potato leaves.",
+                        "symptoms": "Dark lesions on leaves and stems, white growth beneath."}
+    },
+    "disease_names": []
+}
+
+
+class StaticKnowledgeBase:
+    def __init__(self):
+        self._snapshot = KnowledgeBaseSnapshot("v1", TABLES)
+
+    def snapshot(self):
+        return self._snapshot
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("How do I treat the Leaves of my Berries?") == ["treat", "leave", "berry"]
+    assert tokenize("Tomato___Late_blight") == ["tomato", "late", "blight"]
+    assert tokenize("grass moss") == ["grass", "moss"]
+
+
+def test_passages_cover_every_entry_once():
+    ids = [passage_id for passage_id, _, _ in knowledge_base_passages(StaticKnowledgeBase().snapshot())]
+    assert ids == ["disease:apple_scab", "disease:late_blight",
+                   "treatment:Apple___Apple_scab", "treatment:Tomato___Late_blight",
+                   "treatment:Grape___Black_rot"]
+
+
+def test_title_match_outranks_a_passing_mention():
+    index = BM25Index([
+        ("a", "Potato notes", "Late blight can also reach potato tubers in wet years."),
+        ("b", "Late Blight", "A water mould disease."),
+    ])
+    assert [hit["id"] for hit in index.search("late blight")] == ["b", "a"]
+
+
+def test_rare_terms_weigh_more_than_common_ones():
+    index = BM25Index([
+        ("common", "One", "leaf spot leaf spot"),
+        ("rare", "Two", "leaf mildew"),
+        ("other", "Three", "leaf curl"),
+    ])
+    # "leaf" is everywhere, "mildew" only in one passage
+    assert index.search("leaf mildew")[0]["id"] == "rare"
+    assert index.idf["mildew"] > index.idf["leaf"]
+
+
+def test_shorter_passages_win_ties_in_term_frequency():
+    index = BM25Index([
+        ("long", "Notes", "rust " + "filler words about many other unrelated things " * 5),
+        ("short", "Notes", "rust on leaves"),
+    ])
+    assert [hit["id"] for hit in index.search("rust")] == ["short", "long"]
+
+
+def test_search_reports_coverage_and_honours_limit():
+    index = BM25Index.from_snapshot(StaticKnowledgeBase().snapshot())
+    hits = index.search("apple scab fungicide", limit=2)
+    assert {hit["id"] for hit in hits} == {"disease:apple_scab", "treatment:Apple___Apple_scab"}
+    assert [hit["coverage"] for hit in hits] == [1.0, 1.0]
+    assert hits[0]["score"] >= hits[1]["score"]
+    assert index.search("please help") == []
+    assert index.search("zebra") == []
+
+
+def test_retriever_keeps_within_the_token_budget():
+    retriever = ContextRetriever(StaticKnowledgeBase(), max_passages=3, max_tokens=20)
+    passages, _ = retriever.retrieve("leaves fungicide spray")
+    assert passages
+    assert sum(passage["tokens"] for passage in passages) <= 20
+
+
+@pytest.mark.parametrize("question, grounded", [
+    ("How do I treat apple scab?", True),
+    ("What are the symptoms of tomato late blight?", True),
+    ("What is the weather tomorrow?", False),
+])
+def test_grounded_questions(tmp_path, question, grounded):
+    # The thresholds are tuned for the real knowledge base
+    retriever = ContextRetriever(KnowledgeBase(compiled_path=str(tmp_path / 'kb.sqlite3'),
+                                               source_path=DEFAULT_SOURCE_PATH))
+    assert retriever.retrieve(question)[1] is grounded
+    assert retriever.stats()["grounded"] == int(grounded)
+
+
+def test_index_is_cached_on_the_snapshot():
+    retriever = ContextRetriever(StaticKnowledgeBase())
+    assert retriever.index() is retriever.index()
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+import knowledge_base
+from knowledge_base import KnowledgeBase, compile_knowledge_base
+
+SOURCE = {
+    "treatments": {"Apple___Apple_scab": "Apply fungicide.", "Tomato___Late_blight": "Remove plants."},
+    "basic_treatments": {"Apple___Apple_scab": "Rake leaves.", "Corn___healthy": "Keep watering."},
+    "plant_disease_data": {"apple_scab": {"name": "Apple Scab", "symptoms": ["Olive spots"]}},
+    "disease_names": [["apple scab", "apple_scab"]]
+}
+
+
+class Clock:
+    """Stands in for the time module with a monotonic clock the test advances"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def write_source(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    # Ensure the compiled file looks stale even on coarse mtime clocks
+    stamp = time.time() + 10
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = str(tmp_path / 'knowledge_base.json')
+    write_source(source, SOURCE)
+    return source, str(tmp_path / 'kb.sqlite3')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(knowledge_base, 'time', clock)
+    return clock
+
+
+def test_compiled_tables_round_trip_in_order(paths):
+    source, compiled = paths
+    version = compile_knowledge_base(source, compiled)
+
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source).snapshot()
+    assert kb.version == version
+    assert kb.treatments == SOURCE["treatments"]
+    assert list(kb.basic_treatments) == ["Apple___Apple_scab", "Corn___healthy"]
+    assert kb.plant_disease_data["apple_scab"]["symptoms"] == ["Olive spots"]
+    assert kb.disease_names == [("apple scab", "apple_scab")]
+    assert kb.all_treatment_keys == ["Apple___Apple_scab", "Tomato___Late_blight", "Corn___healthy"]
+
+
+def test_version_depends_on_content_only(paths, tmp_path):
+    source, compiled = paths
+    reordered = str(tmp_path / 'reordered.json')
+    write_source(reordered, dict(reversed(list(SOURCE.items()))))
+
+    assert compile_knowledge_base(source, compiled) == compile_knowledge_base(reordered, compiled)
+    changed = dict(SOURCE, treatments={"Apple___Apple_scab": "Spray copper."})
+    write_source(reordered, changed)
+    assert compile_knowledge_base(reordered, compiled) != compile_knowledge_base(source, compiled)
+
+
+def test_invalid_source_leaves_the_compiled_file(paths, tmp_path):
+    source, compiled = paths
+    version = compile_knowledge_base(source, compiled)
+    broken = str(tmp_path / 'broken.json')
+    write_source(broken, {"treatments": {}})
+
+    with pytest.raises(ValueError):
+        compile_knowledge_base(broken, compiled)
+
+    db = sqlite3.connect(compiled)
+    assert db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0] == version
+    db.close()
+    assert [name for name in os.listdir(tmp_path) if name.startswith('kb_')] == []
+
+
+def test_missing_compiled_file_is_compiled_on_first_use(paths):
+    source, compiled = paths
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source)
+    assert kb.snapshot().treatments == SOURCE["treatments"]
+    assert os.path.isfile(compiled)
+
+
+def test_edited_source_is_hot_reloaded(paths, clock):
+    source, compiled = paths
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source, check_interval=5.0)
+    old = kb.snapshot()
+    old_keys = old.all_treatment_keys
+
+    write_source(source, dict(SOURCE, treatments={"Apple___Apple_scab": "Spray copper."}))
+    # Not re-checked before the interval is up
+    assert kb.snapshot() is old
+
+    clock.now += 5
+    new = kb.snapshot()
+    assert new.version != old.version
+    assert new.treatments == {"Apple___Apple_scab": "Spray copper."}
+    assert kb.stats()["reloads"] == 1
+    # Requests holding the old snapshot keep a consistent view and its indexes
+    assert old.treatments == SOURCE["treatments"]
+    assert old.all_treatment_keys is old_keys
+    assert new.all_treatment_keys == ["Apple___Apple_scab", "Corn___healthy"]
+
+
+def test_unchanged_file_keeps_the_snapshot(paths, clock):
+    source, compiled = paths
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source, check_interval=5.0)
+    first = kb.snapshot()
+    clock.now += 5
+    assert kb.snapshot() is first
+    assert kb.stats()["reloads"] == 0
+
+
+def test_failed_reload_keeps_the_current_version(paths, clock):
+    source, compiled = paths
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source, check_interval=5.0)
+    first = kb.snapshot()
+
+    write_source(source, {"treatments": {}})
+    clock.now += 5
+    assert kb.snapshot() is first
+
+
+def test_derived_indexes_are_built_once_per_snapshot(paths):
+    source, compiled = paths
+    kb = KnowledgeBase(compiled_path=compiled, source_path=source).snapshot()
+    builds = []
+
+    def build(snapshot):
+        builds.append(snapshot.version)
+        # Builders may use other derived indexes
+        return len(snapshot.all_treatment_keys)
+
+    assert kb.derived('count', build) == 3
+    assert kb.derived('count', build) == 3
+    assert builds == [kb.version]
@@ -0,0 +1,38 @@
+import pytest
+
+from language_detection import HINGLISH, UNDETERMINED, detect_language, needs_translation
+
+
+@pytest.mark.parametrize('text', [
+    "Hello", "Hi", "ok", "OK", "no", "help", "Help me", "Bye", "cool",
+    "Hello there", "Yes please", "Leaf curl", "fungicide",
+    "How do I treat apple scab?"
+])
+def test_short_english_is_english(text):
+    assert detect_language(text) == 'en'
+
+
+@pytest.mark.parametrize('text', [
+    "kya hai", "haan", "nahi", "namaste", "kaise ho",
+    "patte peele ho gaye", "paani kitna dena chahiye",
+    "mere tamatar ke patte par bhure daag hai"
+])
+def test_romanised_hindi(text):
+    assert detect_language(text) == HINGLISH
+
+
+@pytest.mark.parametrize('text, language', [
+    ("मेरे पौधे में रोग है", 'hi'),
+    ("నా మొక్కకు వ్యాధి వచ్చింది", 'te'),
+    ("Apple scab का इलाज क्या है?", 'hi'),
+    ("", UNDETERMINED),
+    ("123 !?", UNDETERMINED)
+])
+def test_script_detection(text, language):
+    assert detect_language(text) == language
+
+
+def test_english_greeting_needs_no_translation_to_english():
+    assert needs_translation("Hello", 'en-US') == (False, 'en')
+    assert needs_translation("Hello", 'hi-IN') == (True, 'en')
+    assert needs_translation("kya hai", 'en-US') == (True, 'auto')
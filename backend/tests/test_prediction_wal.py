@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+
+import pytest
+
+from prediction_wal import PredictionLog
+
+
+def record(i, size=100):
+    return {"id": f"id-{i}", "user_id": "u", "image_data": "x" * size}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def segment_files(log):
+    return sorted(name for name in os.listdir(log.directory) if name.endswith('.log'))
+
+
+@pytest.fixture
+def logs(tmp_path):
+    opened = []
+
+    def open_log(**kwargs):
+        log = PredictionLog(str(tmp_path), **kwargs)
+        opened.append(log)
+        return log
+
+    yield open_log
+    for log in opened:
+        log.close()
+
+
+def test_concurrent_appends_across_rotations_do_not_deadlock(logs):
+    # Nearly every append rotates, racing rotations against the sync thread
+    log = logs(segment_bytes=300, sync_delay=0)
+    errors = []
+
+    def writer(start):
+        try:
+            for i in range(start, start + 200):
+                log.append(record(i))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n * 1000,), daemon=True) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert not any(thread.is_alive() for thread in threads), "appenders are stuck"
+    assert not errors
+    stats = log.stats()
+    assert stats["appended"] == 1600
+    assert stats["pending"] == 1600
+    assert stats["segments"] > 100
+
+
+def test_records_survive_restart_and_drain_to_sink(tmp_path, logs):
+    first = logs(segment_bytes=2000)
+    for i in range(30):
+        first.append(record(i))
+    first.close()
+
+    stored = {}
+
+    def sink(rows):
+        stored.update((row["id"], row) for row in rows)
+        return True
+
+    second = logs(sink=sink, segment_bytes=2000, replay_interval=0.05, batch_size=7)
+    recovered = list(second.records())
+    assert [row["id"] for row in recovered] == [f"id-{i}" for i in range(30)]
+
+    second.start()
+    assert wait_for(lambda: second.stats()["pending"] == 0)
+    assert set(stored) == {f"id-{i}" for i in range(30)}
+    assert stored["id-3"]["image_data"] == "x" * 100
+    # Fully acknowledged sealed segments are removed
+    assert wait_for(lambda: len(segment_files(second)) == 1)
+
+
+def test_failed_sink_backs_off_and_retries(logs):
+    healthy = threading.Event()
+    stored = []
+
+    def sink(rows):
+        if not healthy.is_set():
+            raise ConnectionError("database down")
+        stored.extend(row["id"] for row in rows)
+        return True
+
+    log = logs(sink=sink, replay_interval=0.05, max_backoff=0.1)
+    log.start()
+    log.append(record(1))
+    assert wait_for(lambda: log.stats()["backing_off"])
+    assert log.stats()["last_error"] == "database down"
+
+    healthy.set()
+    assert wait_for(lambda: log.stats()["pending"] == 0)
+    assert stored == ["id-1"]
+
+
+def test_acknowledged_records_are_not_replayed_after_restart(logs):
+    log = logs()
+    for i in range(3):
+        log.append(record(i))
+    log.ack(["id-0", "id-1"])
+    log.close()
+
+    stored = []
+    restarted = logs(sink=lambda rows: stored.extend(row["id"] for row in rows) or True, replay_interval=0.05)
+    assert restarted.stats()["pending"] == 1
+    restarted.start()
+    assert wait_for(lambda: restarted.stats()["pending"] == 0)
+    assert stored == ["id-2"]
+
+
+def test_torn_last_line_is_truncated(logs):
+    log = logs()
+    log.append(record(1))
+    log.close()
+    path = os.path.join(log.directory, segment_files(log)[-1])
+    with open(path, 'ab') as f:
+        f.write(b'{"op":"put","rec')
+
+    reopened = logs()
+    assert [row["id"] for row in reopened.records()] == ["id-1"]
+    with open(path, 'rb') as f:
+        assert f.read().endswith(b"\n")
+
+
+def test_compaction_rewrites_mostly_acknowledged_segments(logs):
+    log = logs(segment_bytes=1000)
+    for i in range(20):
+        log.append(record(i))
+    # Keep one record of the first segment pending
+    first_segment_ids = sorted(log._segment_ids[log._segments[0]])
+    log.ack([record_id for record_id in log._pending if record_id != first_segment_ids[0]])
+    log.compact()
+
+    assert log.stats()["pending"] == 1
+    assert [row["id"] for row in log._pending_batch()] == [first_segment_ids[0]]
+
+
+def test_second_log_on_same_directory_gets_its_own_slot(tmp_path, logs):
+    first = logs()
+    second = logs()
+    assert first.directory != second.directory
+
+
+def test_appends_fail_instead_of_blocking_while_fsync_keeps_failing(logs, monkeypatch):
+    log = logs(sync_delay=0, max_sync_failures=3)
+    disk_failing = threading.Event()
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        if disk_failing.is_set():
+            raise OSError("I/O error")
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', fsync)
+    disk_failing.set()
+    outcome = []
+
+    def append():
+        try:
+            log.append(record(1))
+            outcome.append("appended")
+        except OSError as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=append, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive(), "append is stuck"
+    assert isinstance(outcome[0], OSError)
+    assert log.stats()["sync_errors"] >= 3
+    # The record stays logged for the replayer
+    assert log.stats()["pending"] == 1
+
+    disk_failing.clear()
+    assert wait_for(lambda: log.stats()["sync_errors"] and log._sync_failures == 0)
+    log.append(record(2))
+    assert log.stats()["pending"] == 2
+
+
+def test_compaction_keeps_acks_of_records_in_older_segments(logs):
+    log = logs(segment_bytes=1000)
+    i = 0
+    while len(log._segments) < 2:
+        log.append(record(i))
+        i += 1
+    first_ids = sorted(log._segment_ids[log._segments[0]])
+    second = log._segments[1]
+    # The ack line lands in the second segment, the put stays in the first
+    log.ack([first_ids[0]])
+    while len(log._segments) < 3:
+        log.append(record(i))
+        i += 1
+    log.ack(sorted(log._segment_ids[second]))
+
+    # The first segment is mostly pending and kept; the second only holds the ack
+    log.compact()
+    assert len(segment_files(log)) == 3
+    log.close()
+
+    reopened = logs(segment_bytes=1000)
+    assert first_ids[0] not in reopened._pending
+    assert set(first_ids[1:]) <= set(reopened._pending)
+
+    # Once the first segment goes, the carried ack is dropped with it
+    reopened.ack(first_ids[1:])
+    reopened.compact()
+    assert len(segment_files(reopened)) == 1
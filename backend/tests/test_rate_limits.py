@@ -0,0 +1,91 @@
+import pytest
+
+import rate_limits
+from rate_limits import AdmissionController, Limit, MemoryBucketStore, SQLiteBucketStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limits, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / 'buckets.sqlite3'))
+
+
+def controller(store, user=Limit(60, 2), global_limit=Limit(600, 3)):
+    return AdmissionController({'predict': {'user': user, 'global': global_limit}}, store)
+
+
+def test_burst_then_refill(clock, store):
+    admission = controller(store)
+    assert admission.admit('predict', 'user:a') == (True, 0.0)
+    assert admission.admit('predict', 'user:a') == (True, 0.0)
+
+    admitted, retry_after = admission.admit('predict', 'user:a')
+    assert not admitted
+    assert retry_after == pytest.approx(1.0)
+
+    clock.now += 1
+    assert admission.admit('predict', 'user:a')[0]
+    assert admission.stats()['requests']['predict'] == {
+        "admitted": 3, "rejected_user": 1, "rejected_global": 0
+    }
+
+
+def test_users_have_separate_buckets_but_share_the_global_one(clock, store):
+    admission = controller(store)
+    assert admission.admit('predict', 'user:a')[0]
+    assert admission.admit('predict', 'user:a')[0]
+    assert admission.admit('predict', 'user:b')[0]
+
+    admitted, retry_after = admission.admit('predict', 'user:c')
+    assert not admitted
+    assert retry_after == pytest.approx(0.1)
+    assert admission.stats()['requests']['predict']['rejected_global'] == 1
+
+
+def test_rejected_user_does_not_drain_the_global_bucket(clock, store):
+    admission = controller(store)
+    for _ in range(10):
+        admission.admit('predict', 'user:a')
+    assert admission.admit('predict', 'user:b')[0]
+
+
+def test_unlimited_endpoints_and_disabled_controller_admit(clock, store):
+    assert controller(store).admit('history', 'user:a') == (True, 0.0)
+    admission = AdmissionController({'predict': {'user': Limit(60, 1)}}, store, enabled=False)
+    for _ in range(5):
+        assert admission.admit('predict', 'user:a')[0]
+
+
+def test_store_failure_admits(clock):
+    class BrokenStore(MemoryBucketStore):
+        def acquire(self, buckets, now):
+            raise RuntimeError('disk full')
+
+    admission = controller(BrokenStore())
+    assert admission.admit('predict', 'user:a') == (True, 0.0)
+    assert admission.stats()['store_errors'] == 1
+
+
+def test_sqlite_buckets_are_shared_between_stores(clock, tmp_path):
+    path = str(tmp_path / 'buckets.sqlite3')
+    first = controller(SQLiteBucketStore(path))
+    second = controller(SQLiteBucketStore(path))
+    assert first.admit('predict', 'user:a')[0]
+    assert second.admit('predict', 'user:a')[0]
+    assert not first.admit('predict', 'user:a')[0]
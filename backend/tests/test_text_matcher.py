@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from text_matcher import AhoCorasick
+
+
+def brute_force(patterns, text):
+    """Every (start, end, pattern) occurrence, ignoring word boundaries"""
+    text = text.lower()
+    found = []
+    for pattern in patterns:
+        start = text.find(pattern)
+        while start != -1:
+            found.append((start, start + len(pattern), pattern))
+            start = text.find(pattern, start + 1)
+    return found
+
+
+def matcher_for(patterns):
+    matcher = AhoCorasick()
+    for pattern in patterns:
+        matcher.add(pattern, pattern, word_start=False, word_end=False)
+    return matcher.build()
+
+
+def test_overlapping_and_nested_matches():
+    matcher = matcher_for(['he', 'she', 'his', 'hers'])
+    assert [(start, end, pattern) for start, end, pattern, _ in matcher.find_all("ushers")] == [
+        (1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')
+    ]
+
+
+def test_repeated_and_self_overlapping_patterns():
+    matcher = matcher_for(['aa', 'aaa'])
+    assert [(start, end) for start, end, _, _ in matcher.find_all("aaaa")] == [
+        (0, 2), (0, 3), (1, 3), (1, 4), (2, 4)
+    ]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    patterns = sorted({''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(12)})
+    text = ''.join(rng.choice('abc') for _ in range(200))
+
+    found = [(start, end, pattern) for start, end, pattern, _ in matcher_for(patterns).find_all(text)]
+
+    assert sorted(found) == sorted(brute_force(patterns, text))
+    assert [end for _, end, _ in found] == sorted(end for _, end, _ in found)
+
+
+def test_word_boundaries():
+    matcher = AhoCorasick()
+    matcher.add('hi', 'greeting')
+    matcher.add('treat', 'treatment', word_end=False)
+    matcher.add('scab', 'disease')
+    matcher.build()
+
+    assert matcher.payloads("which treatments work on apple scab?") == {'treatment', 'disease'}
+    assert matcher.payloads("Hi, is it scabby?") == {'greeting'}
+    assert matcher.payloads("retreat") == set()
+
+
+def test_overlapping_aliases_all_report_their_payloads():
+    matcher = AhoCorasick()
+    matcher.add('blight', 'generic')
+    matcher.add('late blight', 'late_blight')
+    matcher.add('early blight', 'early_blight')
+    matcher.build()
+
+    assert matcher.payloads("Late Blight or early blight?") == {'generic', 'late_blight', 'early_blight'}
+
+
+def test_case_sensitive_matching():
+    matcher = AhoCorasick(case_sensitive=True)
+    matcher.add('Rust', 'rust')
+    assert matcher.payloads("rust") == set()
+    assert matcher.payloads("Rust") == {'rust'}
+
+
+def test_patterns_cannot_be_added_after_build():
+    matcher = matcher_for(['a'])
+    with pytest.raises(RuntimeError):
+        matcher.add('b')
+    # Empty patterns are ignored
+    assert AhoCorasick().build().find_all("anything") == []
@@ -0,0 +1,63 @@
+import pytest
+
+from text_preprocessing import TextPreprocessor
+
+preprocessor = TextPreprocessor()
+pytestmark = pytest.mark.skipif(not preprocessor.available, reason="NLTK stopwords are not installed")
+
+
+class SuffixLemmatizer:
+    """Stands in for WordNet: strips a plural 's'"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def lemmatize(self, word):
+        self.calls += 1
+        return word[:-1] if word.endswith('s') else word
+
+
+def test_stopwords_are_removed():
+    assert preprocessor.tokens("What is the cause of the spots?")[-2:] == ["cause", "spots"]
+    assert "what" not in preprocessor.tokens("What is the cause of the spots?")
+
+
+def test_keep_words_survive_stopword_removal():
+    keeping = TextPreprocessor(keep_words=['what', 'why', 'how'])
+
+    assert keeping.preprocess("What causes this? Why now, and how?") == "what causes why how"
+    # Only the listed words are kept
+    assert keeping.stop_words == preprocessor.stop_words - {'what', 'why', 'how'}
+
+
+def test_keep_words_that_are_not_stopwords_change_nothing():
+    assert TextPreprocessor(keep_words=['blight']).stop_words == preprocessor.stop_words
+
+
+def test_tokens_are_lowercased_and_split_on_punctuation():
+    assert preprocessor.tokens("Tomato_leaf-curl, VIRUS!! 2024") == ["tomato", "leaf", "curl", "virus", "2024"]
+
+
+def test_lemmas_are_memoized():
+    lemmatizing = TextPreprocessor(keep_words=['what'])
+    lemmatizer = SuffixLemmatizer()
+    lemmatizing.lemmatizer = lemmatizer
+
+    assert lemmatizing.preprocess("What spots on leaves") == "what spot leave"
+    lemmatizing.preprocess("spots and leaves")
+    assert lemmatizer.calls == 3
+    assert lemmatizing.stats()["lemma_cache"]["hits"] == 2
+
+
+def test_batch_processes_repeated_texts_once():
+    batching = TextPreprocessor()
+    assert batching.preprocess_batch(["Brown spots", "Yellow leaves", "Brown spots"]) == [
+        "brown spots", "yellow leaves", "brown spots"
+    ]
+    assert batching.stats()["messages"] == 2
+
+
+def test_unavailable_stopwords_fall_back_to_lowercasing():
+    fallback = TextPreprocessor(language='no-such-language')
+    assert not fallback.available
+    assert fallback.preprocess("What Is THIS?") == "what is this?"
@@ -0,0 +1,131 @@
+import pytest
+
+import translation
+from translation import TranslationCache, Translator, split_text_for_translation
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+    def json(self):
+        return [[[self.text, None]]]
+
+
+class FakeSession:
+    """Answers like the translate endpoint, recording each requested text"""
+
+    def __init__(self):
+        self.texts = []
+
+    def get(self, url, params, timeout):
+        self.texts.append(params['q'])
+        return FakeResponse(f"<{params['tl']}>{params['q']}")
+
+
+@pytest.fixture
+def translator():
+    translator = Translator()
+    translator.session = FakeSession()
+    yield translator
+    translator.executor.shutdown()
+
+
+@pytest.mark.parametrize('text', [
+    "Water daily. Remove leaves!\n\n1. Spray copper.\n2. Repeat weekly?",
+    "  Leading and trailing  \n",
+    "पत्तियाँ हटाएँ। रोज़ पानी दें।",
+    "single"
+])
+def test_segments_reassemble_to_the_original(text):
+    assert "".join(segment + separator for segment, separator in split_text_for_translation(text)) == text
+
+
+def test_split_at_sentences_and_paragraphs_but_not_list_numbers():
+    segments = split_text_for_translation("Water daily. Remove leaves!\n\n1. Spray copper.")
+    assert [segment for segment, _ in segments] == ["Water daily.", "Remove leaves!", "1. Spray copper."]
+
+
+def test_oversized_sentences_split_at_words():
+    segments = split_text_for_translation("one two three four five six", max_bytes=10)
+    assert all(len(segment.encode('utf-8')) <= 10 for segment, _ in segments)
+    assert "".join(segment + separator for segment, separator in segments) == "one two three four five six"
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TranslationCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('1', None, '3')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_entries_expire(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+        def time(self):
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(translation, 'time', clock)
+    cache = TranslationCache(ttl_seconds=60)
+    cache.set('a', '1')
+    clock.now += 61
+    assert cache.get('a') is None
+
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / 'translations.sqlite3')
+    TranslationCache(persistent_path=path).set('a', '1')
+    cache = TranslationCache(persistent_path=path)
+    assert cache.get('a') == '1'
+    assert cache.stats()['persistent_hits'] == 1
+
+
+def test_repeated_sentences_are_sent_upstream_once(translator):
+    assert translator.translate("Water daily. Water daily.", 'hi-IN', 'en') == "<hi>Water daily. <hi>Water daily."
+    assert translator.session.texts == ["Water daily."]
+
+    assert translator.translate("Remove leaves. Water daily.", 'hi', 'en') == "<hi>Remove leaves. <hi>Water daily."
+    assert translator.session.texts == ["Water daily.", "Remove leaves."]
+
+
+def test_calls_avoided_counts_only_cache_hits(translator):
+    translator.translate("Water daily.\n\nWater daily.", 'hi', 'en')
+    assert translator.stats()['upstream_calls_avoided'] == 0
+
+    translator.translate("Water daily. Remove leaves.", 'hi', 'en')
+    stats = translator.stats()
+    assert stats['upstream_calls_avoided'] == 1
+    assert stats['upstream_calls'] == len(translator.session.texts) == 2
+
+
+def test_failed_segments_stay_untranslated_and_uncached(translator):
+    class DownSession:
+        def get(self, url, params, timeout):
+            raise ConnectionError('down')
+
+    translator.session = DownSession()
+    assert translator.translate("Water daily.", 'hi', 'en') == "Water daily."
+    assert translator.stats()['upstream_errors'] == 1
+
+    translator.session = FakeSession()
+    assert translator.translate("Water daily.", 'hi', 'en') == "<hi>Water daily."
+
+
+def test_same_language_is_not_translated(translator):
+    assert translator.translate("Water daily.", 'en-US', 'en') == "Water daily."
+    assert translator.session.texts == []
+
+
+def test_upstream_calls_are_not_retried():
+    translator = Translator()
+    try:
+        assert translator.session.get_adapter(translation.TRANSLATE_URL).max_retries.total == 0
+    finally:
+        translator.executor.shutdown()
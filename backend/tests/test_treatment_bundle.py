@@ -0,0 +1,107 @@
+import pytest
+
+from translation import TranslationCache
+from treatment_summaries import StubLLM, TreatmentSummaries, build_summaries
+
+KNOWN = 'Apple___Apple_scab'
+UNKNOWN = 'Blueberry___healthy'
+
+
+@pytest.fixture
+def bundle(backend, monkeypatch, tmp_path):
+    """Fresh bundle cache, a stub LLM, and summaries chosen per test"""
+    monkeypatch.setattr(backend, 'treatment_bundle_cache', TranslationCache())
+    monkeypatch.setattr(backend, 'GROQ_AVAILABLE', True)
+    monkeypatch.setattr(backend, 'process_message', lambda message, language_code='en-US': ('live answer', 'stub-llm'))
+
+    def use_summaries(present):
+        summary_dir = str(tmp_path / f"summaries-{len(list(tmp_path.iterdir()))}")
+        if present:
+            build_summaries(backend.knowledge_base.snapshot(), StubLLM(), output_dir=summary_dir, languages=['en'])
+        summaries = TreatmentSummaries(summary_dir)
+        monkeypatch.setattr(backend, 'treatment_summaries', summaries)
+        return summaries
+
+    return use_summaries
+
+
+def explanation(client, disease, explain):
+    response = client.get('/treatment_bundle', query_string={'disease': disease, 'explain': explain})
+    assert response.status_code == 200
+    return response.get_json()['explanation']
+
+
+@pytest.mark.parametrize('disease, explain, expected', [
+    (KNOWN, 'false', None),
+    (KNOWN, 'auto', 'summary'),
+    (KNOWN, 'true', 'summary'),
+    (UNKNOWN, 'auto', 'summary'),
+])
+def test_explanation_with_a_summary(backend, client, bundle, disease, explain, expected):
+    bundle(present=True)
+    result = explanation(client, disease, explain)
+    if expected is None:
+        assert result is None
+    else:
+        assert result.startswith('[English]')
+
+
+@pytest.mark.parametrize('disease, explain, expected', [
+    (KNOWN, 'false', None),
+    (KNOWN, 'auto', None),
+    (KNOWN, 'true', 'live answer'),
+    (UNKNOWN, 'auto', 'live answer'),
+    (UNKNOWN, 'false', None),
+])
+def test_explanation_without_a_summary(client, bundle, disease, explain, expected):
+    bundle(present=False)
+    assert explanation(client, disease, explain) == expected
+
+
+@pytest.mark.parametrize('first, second, expected', [
+    ('false', 'auto', 'summary'),
+    ('auto', 'false', None),
+    ('false', 'true', 'summary'),
+])
+def test_explain_variants_do_not_share_a_cache_entry(client, bundle, first, second, expected):
+    bundle(present=True)
+    explanation(client, KNOWN, first)
+    result = explanation(client, KNOWN, second)
+    if expected is None:
+        assert result is None
+    else:
+        assert result.startswith('[English]')
+
+
+def test_etag_revalidation(client, bundle):
+    bundle(present=True)
+    query = {'disease': KNOWN, 'explain': 'auto'}
+    first = client.get('/treatment_bundle', query_string=query)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'public, max-age=300'
+
+    revalidated = client.get('/treatment_bundle', query_string=query, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    assert revalidated.get_data() == b''
+
+    other = client.get('/treatment_bundle', query_string=dict(query, explain='false'),
+                       headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != etag
+
+
+def test_etag_changes_when_the_summaries_do(client, bundle):
+    bundle(present=True)
+    query = {'disease': KNOWN, 'explain': 'auto'}
+    etag = client.get('/treatment_bundle', query_string=query).headers['ETag']
+
+    bundle(present=False)
+    response = client.get('/treatment_bundle', query_string=query, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['explanation'] is None
+
+
+def test_bad_parameters(client):
+    assert client.get('/treatment_bundle').status_code == 400
+    assert client.get('/treatment_bundle', query_string={'disease': KNOWN, 'explain': 'maybe'}).status_code == 400
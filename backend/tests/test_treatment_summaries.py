@@ -0,0 +1,65 @@
+import pytest
+
+from knowledge_base import KnowledgeBaseSnapshot
+from treatment_summaries import StubLLM, TreatmentSummaries, build_summaries
+
+TREATMENTS = {
+    'Apple___Apple_scab': {'treatment': 'Apply fungicide.', 'details': 'Remove infected leaves.'}
+}
+BASIC_TREATMENTS = {'Blueberry___healthy': 'Keep doing what you do.'}
+
+
+def snapshot(version, treatments=TREATMENTS):
+    return KnowledgeBaseSnapshot(version, {
+        'treatments': treatments,
+        'basic_treatments': BASIC_TREATMENTS,
+        'plant_disease_data': {},
+        'disease_names': []
+    })
+
+
+@pytest.fixture
+def summary_dir(tmp_path):
+    path = str(tmp_path / 'summaries')
+    build_summaries(snapshot('v1'), StubLLM(), output_dir=path, languages=['en', 'hi'])
+    return path
+
+
+def test_summaries_match_their_snapshot(summary_dir):
+    summaries = TreatmentSummaries(summary_dir)
+    kb = snapshot('v1')
+    entry = summaries.get('Apple___Apple_scab', 'hi-IN', kb)
+    assert entry['summary'].startswith('[Hindi] Apple - Apple scab')
+    assert summaries.get('Blueberry___healthy', 'en-US', kb) is not None
+    assert summaries.get('Tomato___healthy', 'en-US', kb) is None
+    assert summaries.stats()['hits'] == 2
+    assert summaries.stats()['misses'] == 1
+
+
+def test_summary_of_changed_notes_is_stale(summary_dir):
+    summaries = TreatmentSummaries(summary_dir)
+    changed = snapshot('v2', {'Apple___Apple_scab': {'treatment': 'Use copper spray.'}})
+
+    assert summaries.get('Apple___Apple_scab', 'en-US', changed) is None
+    assert summaries.get('Blueberry___healthy', 'en-US', changed) is not None
+    assert summaries.stats()['stale'] == 1
+    # Without a snapshot the entry is served as stored
+    assert summaries.get('Apple___Apple_scab', 'en-US') is not None
+
+
+def test_rebuild_is_picked_up_with_a_new_version(summary_dir):
+    summaries = TreatmentSummaries(summary_dir, check_interval=0)
+    version = summaries.version
+    changed = snapshot('v2', {'Apple___Apple_scab': {'treatment': 'Use copper spray.'}})
+
+    build_summaries(changed, StubLLM(), output_dir=summary_dir, languages=['en'])
+
+    entry = summaries.get('Apple___Apple_scab', 'en-US', changed)
+    assert entry['summary'].endswith('Use copper spray.')
+    assert summaries.version != version
+
+
+def test_no_summaries(tmp_path):
+    summaries = TreatmentSummaries(str(tmp_path / 'missing'), check_interval=0)
+    assert summaries.version is None
+    assert summaries.get('Apple___Apple_scab', 'en-US', snapshot('v1')) is None
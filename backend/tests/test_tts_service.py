@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from bulkheads import Bulkhead, BulkheadFull
+from tts_service import TTSService
+
+
+class ManualExecutor:
+    """Executor whose futures are finished by the test"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.submitted.append((future, fn, args))
+        return future
+
+
+class InlineExecutor:
+    """Executor that runs every call before submit returns"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class FullExecutor:
+    def submit(self, fn, *args, **kwargs):
+        raise BulkheadFull('tts')
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def run_with_timeout(fn, timeout=5):
+    """Run fn on a thread and fail the test if it does not return"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "deadlocked"
+    return result.get('value')
+
+
+@pytest.fixture
+def service(tmp_path):
+    def make(executor):
+        service = TTSService(str(tmp_path), chunk_executor=executor)
+        service._synthesize_chunk = lambda key, chunk, voice_params: f"{key}.mp3"
+        return service
+    return make
+
+
+def test_identical_chunks_in_flight_are_synthesized_once(service):
+    executor = ManualExecutor()
+    tts = service(executor)
+
+    first = tts.synthesize_chunks("Remove infected leaves.")
+    second = tts.synthesize_chunks("Remove infected leaves.")
+
+    assert len(executor.submitted) == 1
+    assert first[0] is second[0]
+    assert tts.stats()["chunks_in_flight"] == 1
+
+    future, fn, args = executor.submitted[0]
+    future.set_result(fn(*args))
+    assert TTSService.chunk_path(first[0]).endswith(".mp3")
+    assert tts.stats()["chunks_in_flight"] == 0
+
+
+def test_chunk_finished_during_submit_does_not_deadlock(service):
+    tts = service(InlineExecutor())
+
+    futures = run_with_timeout(lambda: tts.synthesize_chunks("Apply a copper fungicide."))
+
+    assert TTSService.chunk_path(futures[0]).endswith(".mp3")
+    assert tts.stats()["chunks_in_flight"] == 0
+    # The lock is free again
+    assert run_with_timeout(lambda: tts.lookup("missing")) is None
+
+
+def test_rejected_chunk_resolves_to_none(service):
+    tts = service(FullExecutor())
+
+    futures = run_with_timeout(lambda: tts.synthesize_chunks("Water at the base of the plant."))
+
+    assert TTSService.chunk_path(futures[0]) is None
+    assert tts.stats()["chunks_in_flight"] == 0
+
+
+def test_displaced_chunk_is_forgotten_without_deadlock(service):
+    priorities = iter([3, 3, 0])
+    bulkhead = Bulkhead('tts', workers=1, max_queue=1, priority=lambda: next(priorities))
+    tts = service(bulkhead)
+
+    # Occupy the only worker, then queue a low-priority chunk
+    release = threading.Event()
+    bulkhead.submit(release.wait)
+    assert wait_for(lambda: bulkhead.stats()["active"] == 1)
+    low = tts.synthesize_chunks("Low priority answer.")
+
+    assert tts.stats()["chunks_in_flight"] == 1
+
+    # A higher-priority chunk displaces it while the service holds its lock
+    high = run_with_timeout(lambda: tts.synthesize_chunks("Urgent answer."))
+    assert TTSService.chunk_path(low[0]) is None
+    assert bulkhead.stats()["displaced"] == 1
+
+    release.set()
+    assert TTSService.chunk_path(high[0]).endswith(".mp3")
+    # Done callbacks run just after the result is set
+    assert wait_for(lambda: run_with_timeout(tts.stats)["chunks_in_flight"] == 0)
@@ -0,0 +1,64 @@
+import pytest
+
+from rate_limits import AdmissionController, Limit, MemoryBucketStore
+
+IMAGE = b'\xff\xd8' + b'x' * 998
+
+
+@pytest.fixture
+def predictions(backend, monkeypatch):
+    """Stand-in for the Clarifai call; set status to choose the response"""
+    calls = []
+
+    def run_prediction(user_id, image_bytes, language_code):
+        calls.append(image_bytes)
+        return {"success": predictions.status == 200}, predictions.status, {}
+
+    predictions.status = 500
+    predictions.calls = calls
+    monkeypatch.setattr(backend, 'run_prediction', run_prediction)
+    monkeypatch.setattr(backend, 'admission', AdmissionController(
+        {'predict': {'user': Limit(0.001, 2)}}, MemoryBucketStore()
+    ))
+    return predictions
+
+
+def upload(client):
+    session = client.post('/predict/uploads', json={'user_id': 'u1', 'size': len(IMAGE)}).get_json()
+    response = client.put(f"/predict/uploads/{session['uploadId']}", data=IMAGE,
+                          headers={'Content-Range': f"bytes 0-{len(IMAGE) - 1}/{len(IMAGE)}"})
+    assert response.status_code == 200
+    return session['uploadId']
+
+
+def test_failed_finalize_is_rate_limited(client, predictions):
+    upload_id = upload(client)
+
+    statuses = [client.post(f"/predict/uploads/{upload_id}/finalize").status_code for _ in range(4)]
+
+    # Creating the session took one token and the first finalize the other
+    assert statuses[0] == 500
+    assert set(statuses[1:]) == {429}
+    assert len(predictions.calls) == 1
+
+
+def test_upload_is_discarded_after_repeated_failures(backend, client, predictions, monkeypatch):
+    monkeypatch.setattr(backend.upload_sessions, 'max_attempts', 2)
+    monkeypatch.setattr(backend, 'admission', AdmissionController({}, MemoryBucketStore()))
+    upload_id = upload(client)
+
+    assert client.post(f"/predict/uploads/{upload_id}/finalize").status_code == 500
+    assert client.post(f"/predict/uploads/{upload_id}/finalize").status_code == 500
+    assert client.post(f"/predict/uploads/{upload_id}/finalize").status_code == 404
+    assert len(predictions.calls) == 2
+
+
+def test_replayed_finalize_is_not_charged(client, predictions):
+    predictions.status = 200
+    upload_id = upload(client)
+
+    responses = [client.post(f"/predict/uploads/{upload_id}/finalize") for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert responses[1].headers['Idempotent-Replayed'] == 'true'
+    assert len(predictions.calls) == 1
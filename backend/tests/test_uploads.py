@@ -0,0 +1,119 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import uploads
+from uploads import UploadError, UploadSessions
+
+IMAGE = bytes(range(256)) * 40
+
+
+class BrokenStream:
+    """Stream that breaks off after limit bytes, like a dropped connection"""
+
+    def __init__(self, data, limit):
+        self.stream = io.BytesIO(data[:limit])
+
+    def read(self, size):
+        return self.stream.read(size)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path), max_bytes=len(IMAGE), ttl_seconds=60)
+
+
+def send(sessions, upload_id, start, end):
+    return sessions.write(upload_id, start, end - start, io.BytesIO(IMAGE[start:end]))
+
+
+def test_chunks_are_assembled_and_finalized(sessions):
+    session = sessions.create('u1', 'hi-IN', len(IMAGE))
+    for start in range(0, len(IMAGE), 4096):
+        send(sessions, session.id, start, min(start + 4096, len(IMAGE)))
+
+    read_session, image = sessions.read(session.id, hashlib.sha256(IMAGE).hexdigest())
+    assert image == IMAGE
+    assert read_session.language_code == 'hi-IN'
+
+    sessions.finish(session.id)
+    assert not os.path.exists(session.path)
+    assert sessions.get(session.id).to_dict()['finalized']
+    with pytest.raises(UploadError) as error:
+        sessions.read(session.id)
+    assert error.value.status == 409
+
+
+def test_resume_after_a_dropped_chunk(sessions):
+    session = sessions.create('u1', 'en-US', len(IMAGE))
+    send(sessions, session.id, 0, 4096)
+
+    with pytest.raises(UploadError) as error:
+        sessions.write(session.id, 4096, 4096, BrokenStream(IMAGE[4096:8192], 1000))
+    assert error.value.offset == 5096
+    assert sessions.get(session.id).offset == 5096
+
+    # Resending the whole chunk only writes the bytes that had not arrived
+    assert send(sessions, session.id, 4096, 8192) == 8192
+    assert sessions.stats()['bytes_resent'] == 1000
+    send(sessions, session.id, 8192, len(IMAGE))
+    assert sessions.read(session.id)[1] == IMAGE
+
+
+def test_chunk_past_the_offset_is_rejected(sessions):
+    session = sessions.create('u1', 'en-US', len(IMAGE))
+    send(sessions, session.id, 0, 100)
+
+    with pytest.raises(UploadError) as error:
+        send(sessions, session.id, 200, 300)
+    assert (error.value.status, error.value.offset) == (409, 100)
+
+    with pytest.raises(UploadError) as error:
+        sessions.read(session.id)
+    assert (error.value.status, error.value.offset) == (409, 100)
+
+
+def test_hash_mismatch_discards_the_upload(sessions):
+    session = sessions.create('u1', 'en-US', len(IMAGE))
+    send(sessions, session.id, 0, len(IMAGE))
+
+    with pytest.raises(UploadError) as error:
+        sessions.read(session.id, hashlib.sha256(b'other').hexdigest())
+    assert error.value.status == 422
+    with pytest.raises(UploadError) as error:
+        sessions.get(session.id)
+    assert error.value.status == 404
+
+
+def test_idle_sessions_expire_on_lookup(sessions, monkeypatch):
+    session = sessions.create('u1', 'en-US', len(IMAGE))
+    other = sessions.create('u2', 'en-US', len(IMAGE))
+    send(sessions, session.id, 0, 100)
+
+    now = uploads.time.monotonic()
+    monkeypatch.setattr(uploads.time, 'monotonic', lambda: now + 61)
+    with pytest.raises(UploadError) as error:
+        sessions.get(other.id)
+    assert error.value.status == 404
+
+    assert sessions.stats()['sessions'] == 0
+    assert sessions.stats()['expired'] == 2
+    assert not os.path.exists(session.path)
+
+
+def test_failed_finalizes_discard_the_upload(tmp_path):
+    sessions = UploadSessions(str(tmp_path), max_bytes=len(IMAGE), max_attempts=2)
+    session = sessions.create('u1', 'en-US', len(IMAGE))
+    send(sessions, session.id, 0, len(IMAGE))
+
+    assert not sessions.fail(session.id)
+    assert sessions.read(session.id)[1] == IMAGE
+    assert sessions.fail(session.id)
+
+    with pytest.raises(UploadError) as error:
+        sessions.get(session.id)
+    assert error.value.status == 404
+    assert not os.path.exists(session.path)
+    assert sessions.stats()['abandoned'] == 1
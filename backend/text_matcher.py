@@ -0,0 +1,95 @@
+"""
+Aho-Corasick multi-pattern matcher.
+
+All keywords and aliases are compiled into a single automaton, so a message
+is scanned once no matter how many patterns there are, instead of once per
+pattern with repeated substring searches.
+"""
+
+
+class AhoCorasick:
+    """
+    Finds every occurrence of a set of patterns in one pass over the text.
+
+    Each pattern carries a payload returned with its matches. Patterns can
+    require word boundaries at the start and/or end of the match, so "treat"
+    can match "treating" while "hi" does not match inside "which".
+    """
+
+    def __init__(self, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        # Trie nodes: outgoing transitions, failure link and patterns ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._built = False
+        self.pattern_count = 0
+
+    def add(self, pattern, payload=None, word_start=True, word_end=True):
+        """Add a pattern; must be called before build()"""
+        if self._built:
+            raise RuntimeError("Cannot add patterns after the matcher is built")
+        if not pattern:
+            return
+        if not self.case_sensitive:
+            pattern = pattern.lower()
+
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._outputs[node].append((len(pattern), pattern, payload, word_start, word_end))
+        self.pattern_count += 1
+
+    def build(self):
+        """Compute failure links breadth-first; returns self for chaining"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # A node also reports every pattern that ends at its failure target
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+        self._built = True
+        return self
+
+    def find_all(self, text):
+        """List of (start, end, pattern, payload) for every match, in order of end position"""
+        if not self._built:
+            self.build()
+        if not self.case_sensitive:
+            text = text.lower()
+
+        matches = []
+        node = 0
+        goto = self._goto
+        fail = self._fail
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, pattern, payload, word_start, word_end in self._outputs[node]:
+                start = index - length + 1
+                if word_start and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if word_end and index + 1 < len(text) and _is_word_char(text[index + 1]):
+                    continue
+                matches.append((start, index + 1, pattern, payload))
+        return matches
+
+    def payloads(self, text):
+        """Set of payloads of every pattern found in text"""
+        return {payload for _, _, _, payload in self.find_all(text)}
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
@@ -0,0 +1,120 @@
+"""
+Reusable NLP preprocessing for chatbot messages.
+
+Everything expensive is done once when the preprocessor is created: the
+tokenizer pattern is compiled, the stopword list is read from the bundled
+backend/nltk_data directory and the WordNet lemmatizer is loaded if its
+corpus is available. Nothing is ever downloaded. Lemmas are memoized in a
+bounded LRU, so a typical message costs a regex scan and a few dict lookups.
+"""
+import os
+import re
+from functools import lru_cache
+
+try:
+    import nltk
+    NLTK_AVAILABLE = True
+except ImportError:
+    NLTK_AVAILABLE = False
+
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+
+# Runs of letters and digits; word_tokenize followed by the isalnum() filter
+# keeps the same words, except that contractions split into stopwords
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+class TextPreprocessor:
+    """
+    Lowercases, tokenizes, removes stopwords and lemmatizes text.
+
+    available is False when the stopword list cannot be loaded; preprocess
+    then returns the lowercased text unchanged, like the original fallback.
+    Lemmatization is skipped when the WordNet corpus is not installed.
+    keep_words are never removed as stopwords, for callers that look for
+    words such as "what" or "why".
+    """
+
+    def __init__(self, nltk_data_dir=NLTK_DATA_DIR, language='english', lemma_cache_size=10000,
+                 keep_words=()):
+        self.nltk_data_dir = nltk_data_dir
+        self.language = language
+        self.keep_words = frozenset(keep_words)
+        self.stop_words = frozenset()
+        self.lemmatizer = None
+        self.available = False
+        self.messages = 0
+        self._lemma = lru_cache(maxsize=lemma_cache_size)(self._lemmatize)
+        self._load()
+
+    def _load(self):
+        if not NLTK_AVAILABLE:
+            print("NLTK is not installed; chatbot preprocessing is limited to lowercasing")
+            return
+
+        # Only look in the bundled directory first; never trigger a download
+        if self.nltk_data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, self.nltk_data_dir)
+
+        try:
+            from nltk.corpus import stopwords
+            self.stop_words = frozenset(stopwords.words(self.language)) - self.keep_words
+            self.available = True
+        except Exception as e:
+            print(f"NLTK stopwords not found in {self.nltk_data_dir}: {str(e).strip().splitlines()[0]}")
+            return
+
+        try:
+            nltk.data.find('corpora/wordnet')
+            from nltk.stem import WordNetLemmatizer
+            self.lemmatizer = WordNetLemmatizer()
+            # Load the corpus now rather than on the first request
+            self.lemmatizer.lemmatize('leaves')
+        except Exception:
+            print(f"WordNet not found in {self.nltk_data_dir}; chatbot preprocessing will not lemmatize")
+            self.lemmatizer = None
+
+        print(f"Text preprocessor ready: {len(self.stop_words)} stopwords, "
+              f"lemmatizer {'enabled' if self.lemmatizer else 'disabled'}")
+
+    def _lemmatize(self, word):
+        return self.lemmatizer.lemmatize(word) if self.lemmatizer else word
+
+    def tokens(self, text):
+        """Preprocessed tokens of text"""
+        stop_words = self.stop_words
+        lemma = self._lemma
+        return [lemma(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in stop_words]
+
+    def preprocess(self, text):
+        """Preprocessed text as a single space-separated string"""
+        self.messages += 1
+        if not self.available:
+            return text.lower()
+        return ' '.join(self.tokens(text))
+
+    def preprocess_batch(self, texts):
+        """
+        Preprocess many texts at once, e.g. to warm the lemma cache or to
+        build an index. Repeated texts are only processed once.
+        """
+        results = {}
+        for text in texts:
+            if text not in results:
+                results[text] = self.preprocess(text)
+        return [results[text] for text in texts]
+
+    def stats(self):
+        cache = self._lemma.cache_info()
+        return {
+            "available": self.available,
+            "lemmatizer": self.lemmatizer is not None,
+            "stopwords": len(self.stop_words),
+            "messages": self.messages,
+            "lemma_cache": {
+                "size": cache.currsize,
+                "max_size": cache.maxsize,
+                "hits": cache.hits,
+                "misses": cache.misses
+            }
+        }
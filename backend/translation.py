@@ -0,0 +1,441 @@
+"""
+Translation layer used by the CropCare backend.
+
+Wraps the public Google Translate endpoint with a pooled keep-alive HTTP
+session, per-call timeouts and an LRU+TTL cache keyed by a hash of the text
+and the language pair. An optional SQLite file keeps translations across
+restarts so the same knowledge-base phrases are only ever translated once.
+
+Long texts are split at paragraph and sentence boundaries and the pieces
+are translated concurrently. Each piece is cached on its own, so sentences
+repeated across different answers are only sent upstream once.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single"
+
+# Keep each GET well under URL length limits once the text is percent-encoded
+MAX_SEGMENT_BYTES = 1500
+
+# Whitespace after a sentence terminator (but not after a list number like
+# "1."), or any run of whitespace containing a line break
+SEGMENT_BOUNDARY = re.compile(r'((?<=[.!?\u0964\u0965])(?<!\d\.)\s+|\s*\n\s*)')
+
+# Map to language codes supported by the translation API
+LANGUAGE_MAP = {
+    'en': 'en',   # English
+    'hi': 'hi',   # Hindi
+    'te': 'te',   # Telugu
+    'ta': 'ta',   # Tamil
+    'kn': 'kn',   # Kannada
+    'ml': 'ml'    # Malayalam
+}
+
+
+def normalize_language(language_code):
+    """Reduce a locale such as 'hi-IN' to the code the translation API expects"""
+    if not language_code:
+        return 'auto'
+    base = language_code.split('-')[0].lower()
+    return LANGUAGE_MAP.get(base, base)
+
+
+def _split_oversized(segment, max_bytes):
+    """Break a single over-long sentence at word boundaries"""
+    pieces = []
+    current = ""
+    for word in re.split(r'(\s+)', segment):
+        candidate = current + word
+        if current and len(candidate.encode('utf-8')) > max_bytes:
+            pieces.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text_for_translation(text, max_bytes=MAX_SEGMENT_BYTES):
+    """
+    Split text at paragraph and sentence boundaries.
+
+    Returns a list of (segment, separator) pairs; joining every segment with
+    its separator reproduces the original text exactly.
+    """
+    parts = SEGMENT_BOUNDARY.split(text)
+    segments = []
+    for i in range(0, len(parts), 2):
+        segment = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        if len(segment.encode('utf-8')) <= max_bytes:
+            segments.append((segment, separator))
+            continue
+        pieces = _split_oversized(segment, max_bytes)
+        for piece in pieces[:-1]:
+            segments.append((piece, ""))
+        segments.append((pieces[-1], separator))
+    return segments
+
+
+class TranslationCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and an optional SQLite tier.
+
+    Memory entries are evicted least-recently-used first once max_entries is
+    reached. Entries found only in the persistent tier are promoted back
+    into memory on read.
+    """
+
+    def __init__(self, max_entries=2000, ttl_seconds=24 * 3600, persistent_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_path = persistent_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persistent_path:
+            try:
+                directory = os.path.dirname(persistent_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(persistent_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.commit()
+                print(f"Translation cache persisting to {persistent_path}")
+            except Exception as e:
+                print(f"Could not open persistent translation cache: {str(e)}")
+                self._db = None
+
+    @staticmethod
+    def make_key(text, source_language, target_language):
+        """Build a cache key from a hash of the text and the language pair"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{source_language}:{target_language}:{digest}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, created_at FROM translations WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    print(f"Persistent translation cache read failed: {str(e)}")
+                    row = None
+                if row and now - row[1] <= self.ttl_seconds:
+                    self._store_in_memory(key, row[0], row[1])
+                    self.persistent_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store_in_memory(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO translations (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, value, now)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Persistent translation cache write failed: {str(e)}")
+
+    def _store_in_memory(self, key, value, created_at):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class Translator:
+    """
+    Client for the Google Translate endpoint.
+
+    A single requests.Session with a sized connection pool is shared by all
+    callers so connections are kept alive between requests. Upstream calls
+    run on executor, by default a bounded thread pool of the same size;
+    segments of long texts are translated in parallel. on_timeout is called
+    whenever an upstream call times out.
+    """
+
+    def __init__(self, cache=None, timeout=(3.05, 10), pool_size=10,
+                 max_segment_bytes=MAX_SEGMENT_BYTES, on_timeout=None, executor=None):
+        self.cache = cache or TranslationCache()
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.max_segment_bytes = max_segment_bytes
+        self.executor = executor or ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="translate")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.segments = 0
+        self.upstream_calls = 0
+        self.upstream_calls_avoided = 0
+        self.upstream_errors = 0
+        self.upstream_timeouts = 0
+
+    def translate(self, text, target_language, source_language='auto', timeout=None):
+        """
+        Translate text, serving repeated sentences from the cache.
+        Segments whose upstream call fails are returned untranslated.
+        timeout (seconds) shortens the configured timeouts, e.g. to the time
+        left in a request.
+        """
+        plan = self._plan(text, target_language, source_language)
+        if plan is None:
+            return text
+        segments, translations, pending, source, target = plan
+
+        timeout = self.call_timeout(timeout)
+        futures = [self._submit(segment, source, target, timeout) for segment in pending]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # Rejected or dropped by the executor; the segment stays untranslated
+                self._record_error(e)
+                results.append(None)
+        return self._assemble(segments, translations, pending, results, source, target)
+
+    def _submit(self, segment, source, target, timeout):
+        try:
+            return self.executor.submit(self._call_upstream, segment, source, target, timeout)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def call_timeout(self, timeout=None):
+        """(connect, read) timeouts, each limited to timeout when given"""
+        connect_timeout, read_timeout = self.timeout
+        if timeout is None:
+            return connect_timeout, read_timeout
+        return min(connect_timeout, timeout), min(read_timeout, timeout)
+
+    def _plan(self, text, target_language, source_language):
+        """
+        Split text into segments and resolve the cached ones. Returns None
+        when there is nothing to translate, otherwise (segments,
+        translations, pending, source, target).
+        """
+        if not text or not text.strip():
+            return None
+
+        target = normalize_language(target_language)
+        source = normalize_language(source_language)
+        if source == target:
+            return None
+
+        segments = split_text_for_translation(text, self.max_segment_bytes)
+        with self._lock:
+            self.requests += 1
+            self.segments += len(segments)
+
+        # Resolve cached segments first; identical segments are looked up once
+        translations = {}
+        pending = []
+        hits = 0
+        for segment, _ in segments:
+            if segment in translations or segment in pending:
+                continue
+            if not segment.strip():
+                translations[segment] = segment
+                continue
+            cached = self.cache.get(TranslationCache.make_key(segment, source, target))
+            if cached is not None:
+                translations[segment] = cached
+                hits += 1
+            else:
+                pending.append(segment)
+
+        with self._lock:
+            self.upstream_calls_avoided += hits
+        return segments, translations, pending, source, target
+
+    def _assemble(self, segments, translations, pending, results, source, target):
+        """Cache the upstream results and join all segments in their original order"""
+        for segment, translated in zip(pending, results):
+            if translated is None:
+                translations[segment] = segment
+                continue
+            self.cache.set(TranslationCache.make_key(segment, source, target), translated)
+            translations[segment] = translated
+
+        # Reassemble in the original order, keeping the original separators
+        return "".join(translations[segment] + separator for segment, separator in segments)
+
+    def _call_upstream(self, text, source, target, timeout):
+        with self._lock:
+            self.upstream_calls += 1
+
+        try:
+            response = self.session.get(TRANSLATE_URL, params=self._params(text, source, target), timeout=timeout)
+            return self._parse(response.status_code, response.json)
+        except requests.Timeout as e:
+            self._record_timeout(e)
+            return None
+        except Exception as e:
+            self._record_error(e)
+            return None
+
+    @staticmethod
+    def _params(text, source, target):
+        return {
+            "client": "gtx",
+            "sl": source,  # Source language ('auto' to detect)
+            "tl": target,  # Target language
+            "dt": "t",  # Return text
+            "q": text
+        }
+
+    def _parse(self, status_code, read_json):
+        if status_code != 200:
+            print(f"Translation API error: {status_code}")
+            with self._lock:
+                self.upstream_errors += 1
+            return None
+
+        # Parse the response (it comes in a nested list structure)
+        result = read_json()
+
+        # Extract all translated parts and join them
+        translated_text = ""
+        for part in result[0]:
+            if part[0]:
+                translated_text += part[0]
+        return translated_text
+
+    def _record_error(self, error):
+        print(f"*** Translation error: {str(error)} ***")
+        with self._lock:
+            self.upstream_errors += 1
+
+    def _record_timeout(self, error):
+        self._record_error(error)
+        with self._lock:
+            self.upstream_timeouts += 1
+        if self.on_timeout is not None:
+            self.on_timeout()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "requests": self.requests,
+                "segments": self.segments,
+                "upstream_calls": self.upstream_calls,
+                "upstream_errors": self.upstream_errors,
+                "upstream_timeouts": self.upstream_timeouts,
+                "upstream_calls_avoided": self.upstream_calls_avoided
+            }
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+class AsyncTranslator:
+    """
+    asyncio front end for a Translator, used by the ASGI server.
+
+    Shares the translator's cache and counters, but calls the upstream API
+    through an httpx.AsyncClient and translates the segments of a long text
+    with asyncio.gather instead of a thread pool.
+    """
+
+    def __init__(self, translator, max_connections=100):
+        import httpx
+
+        self._httpx = httpx
+        self.translator = translator
+        connect_timeout, read_timeout = translator.timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def translate(self, text, target_language, source_language='auto', timeout=None):
+        """Async equivalent of Translator.translate"""
+        translator = self.translator
+        plan = translator._plan(text, target_language, source_language)
+        if plan is None:
+            return text
+        segments, translations, pending, source, target = plan
+
+        connect_timeout, read_timeout = translator.call_timeout(timeout)
+        timeout = self._httpx.Timeout(read_timeout, connect=connect_timeout)
+        results = await asyncio.gather(*[
+            self._call_upstream(segment, source, target, timeout) for segment in pending
+        ])
+        return translator._assemble(segments, translations, pending, list(results), source, target)
+
+    async def _call_upstream(self, text, source, target, timeout):
+        translator = self.translator
+        with translator._lock:
+            translator.upstream_calls += 1
+
+        try:
+            response = await self.client.get(
+                TRANSLATE_URL,
+                params=Translator._params(text, source, target),
+                timeout=timeout
+            )
+            return translator._parse(response.status_code, response.json)
+        except self._httpx.TimeoutException as e:
+            translator._record_timeout(e)
+            return None
+        except Exception as e:
+            translator._record_error(e)
+            return None
+
+    async def close(self):
+        await self.client.aclose()
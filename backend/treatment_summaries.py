@@ -0,0 +1,297 @@
+"""
+Precomputed LLM treatment summaries.
+
+Every prediction is one of a fixed set of disease classes (the keys of
+treatments and basic_treatments), so the LLM explanation of each class is
+generated offline for every supported language instead of on request. The
+results are stored in treatment_summaries/<language>.json. Each entry records
+the hash of the prompt it was generated from, the model that generated it and
+a hash of the knowledge-base text it was based on; a rebuild only regenerates
+entries where one of those changed.
+
+Build summaries with:
+    python treatment_summaries.py [--languages en hi te ta kn ml] [--stub]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+DEFAULT_SUMMARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'treatment_summaries')
+
+# Languages summaries are generated in, with the name used in the prompt
+SUMMARY_LANGUAGES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'te': 'Telugu',
+    'ta': 'Tamil',
+    'kn': 'Kannada',
+    'ml': 'Malayalam'
+}
+
+SYSTEM_PROMPT = (
+    "You are an expert agricultural assistant. Write practical, farmer-friendly "
+    "treatment advice. Start with cultural practices, then organic options, then "
+    "conventional chemical treatments, and always mention safety precautions."
+)
+
+PROMPT_TEMPLATE = """Crop disease class: {name}
+
+Knowledge-base treatment notes:
+{notes}
+
+Write a treatment summary of at most 150 words covering what to do now, how to treat it and how to prevent it next season.
+Respond in {language_name}."""
+
+
+def base_language(language_code):
+    return (language_code or 'en').split('-')[0].lower()
+
+
+def display_name(class_key):
+    """'Tomato___Late_blight' -> 'Tomato - Late blight'"""
+    return ' - '.join(part.replace('_', ' ').strip() for part in class_key.split('___') if part.strip())
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+
+def source_notes(snapshot, class_key):
+    """The knowledge-base text a class's summary is generated from"""
+    entry = snapshot.treatments.get(class_key)
+    if isinstance(entry, dict):
+        return '\n'.join(value for value in (entry.get('treatment'), entry.get('details')) if value)
+    if entry:
+        return str(entry)
+    return str(snapshot.basic_treatments.get(class_key, ''))
+
+
+def source_hashes(snapshot):
+    """{class_key: hash of its source notes} for a knowledge-base snapshot"""
+    return {class_key: _hash(source_notes(snapshot, class_key)) for class_key in snapshot.all_treatment_keys}
+
+
+def build_prompt(class_key, notes, language):
+    return PROMPT_TEMPLATE.format(
+        name=display_name(class_key),
+        notes=notes,
+        language_name=SUMMARY_LANGUAGES.get(language, language)
+    )
+
+
+class GroqLLM:
+    """Generates summaries with the backend's Groq model"""
+
+    def __init__(self, model='llama3-70b-8192', client=None):
+        if client is None:
+            import groq
+            client = groq.Client(api_key=os.environ.get("GROQ_API_KEY"))
+        self.client = client
+        self.model = model
+
+    def complete(self, system_prompt, prompt):
+        completion = self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            model=self.model,
+            temperature=0.3,
+            max_tokens=400,
+            top_p=1,
+            stream=False
+        )
+        return completion.choices[0].message.content.strip()
+
+
+class StubLLM:
+    """Deterministic offline LLM for tests and local development"""
+
+    model = 'stub-llm-1'
+
+    def complete(self, system_prompt, prompt):
+        name = re.search(r"^Crop disease class: (.*)$", prompt, re.MULTILINE).group(1)
+        language = re.search(r"Respond in (\w+)\.", prompt).group(1)
+        notes = prompt.split("Knowledge-base treatment notes:\n", 1)[1].split("\n\n", 1)[0]
+        return f"[{language}] {name}: {notes.splitlines()[0] if notes else ''}"
+
+
+class TreatmentSummaries:
+    """
+    Loads the precomputed summaries and looks them up by class and language.
+    With a check_interval, lookups reload the summaries when their files have
+    changed, checking at most that often. version changes whenever the loaded
+    summaries do.
+    """
+
+    def __init__(self, summary_dir=DEFAULT_SUMMARY_DIR, check_interval=None):
+        self.summary_dir = summary_dir
+        self.check_interval = check_interval
+        self.entries = {}
+        self.version = None
+        self._signature = None
+        self._next_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _files_signature(self):
+        if not os.path.isdir(self.summary_dir):
+            return ()
+        signature = []
+        for file_name in sorted(os.listdir(self.summary_dir)):
+            if file_name.endswith('.json'):
+                stat = os.stat(os.path.join(self.summary_dir, file_name))
+                signature.append((file_name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def refresh(self):
+        """Reload the summaries if their files changed since they were loaded"""
+        if self.check_interval is None:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+        try:
+            changed = self._files_signature() != self._signature
+        except OSError as e:
+            print(f"Error checking treatment summaries: {str(e)}")
+            return
+        if changed:
+            self.load()
+
+    def load(self):
+        signature = self._files_signature()
+        entries = {}
+        if os.path.isdir(self.summary_dir):
+            for file_name in os.listdir(self.summary_dir):
+                if not file_name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.summary_dir, file_name), encoding='utf-8') as f:
+                        data = json.load(f)
+                    entries[data['language']] = data['entries']
+                except Exception as e:
+                    print(f"Error loading treatment summaries from {file_name}: {str(e)}")
+        self.entries = entries
+        self._signature = signature
+        self.version = _hash(json.dumps(entries, sort_keys=True)) if entries else None
+        if entries:
+            print(f"Loaded treatment summaries for: {', '.join(sorted(entries))}")
+        else:
+            print(f"No treatment summaries found in {self.summary_dir}; explanations will be generated live")
+
+    def get(self, class_key, language_code='en-US', snapshot=None):
+        """
+        Precomputed entry (summary, model, prompt_hash, ...) or None. With a
+        knowledge-base snapshot, an entry generated from treatment notes that
+        have changed since is stale and not returned.
+        """
+        self.refresh()
+        entry = self.entries.get(base_language(language_code), {}).get(class_key)
+        stale = entry is not None and snapshot is not None and \
+            entry.get('source_hash') != snapshot.derived('summary_source_hashes', source_hashes).get(class_key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif stale:
+                self.stale += 1
+            else:
+                self.hits += 1
+        return None if stale else entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "languages": sorted(self.entries),
+                "summaries": {language: len(entries) for language, entries in self.entries.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale
+            }
+
+
+def build_summaries(snapshot, llm, output_dir=DEFAULT_SUMMARY_DIR, languages=None):
+    """
+    Generate a summary for every treatment class in every language, reusing
+    existing entries whose prompt hash, model and source hash are unchanged.
+    Failed generations are left out and retried on the next build.
+    """
+    languages = [base_language(language) for language in (languages or SUMMARY_LANGUAGES)]
+    existing = TreatmentSummaries(output_dir).entries
+    hashes = snapshot.derived('summary_source_hashes', source_hashes)
+    os.makedirs(output_dir, exist_ok=True)
+
+    for language in languages:
+        previous = existing.get(language, {})
+        entries = {}
+        generated = reused = failed = 0
+        for class_key in snapshot.all_treatment_keys:
+            notes = source_notes(snapshot, class_key)
+            prompt = build_prompt(class_key, notes, language)
+            prompt_hash = _hash(SYSTEM_PROMPT + '\n' + prompt)
+            source_hash = hashes[class_key]
+
+            entry = previous.get(class_key)
+            if entry and entry.get('prompt_hash') == prompt_hash and entry.get('model') == llm.model \
+                    and entry.get('source_hash') == source_hash:
+                entries[class_key] = entry
+                reused += 1
+                continue
+
+            try:
+                summary = llm.complete(SYSTEM_PROMPT, prompt)
+            except Exception as e:
+                print(f"Failed to summarize {class_key} in {language}: {str(e)}")
+                summary = None
+            if not summary:
+                failed += 1
+                continue
+
+            entries[class_key] = {
+                "summary": summary,
+                "model": llm.model,
+                "prompt_hash": prompt_hash,
+                "source_hash": source_hash,
+                "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            }
+            generated += 1
+
+        target = os.path.join(output_dir, f"{language}.json")
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({"language": language, "entries": entries}, f, ensure_ascii=False, indent=2)
+        os.replace(target + '.tmp', target)
+        print(f"Wrote {language} summaries: {len(entries)} classes ({generated} generated, {reused} reused, {failed} failed)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate LLM treatment summaries for every disease class")
+    parser.add_argument('--languages', nargs='+', default=list(SUMMARY_LANGUAGES),
+                        help="Language codes to generate (default: en hi te ta kn ml)")
+    parser.add_argument('--output', default=DEFAULT_SUMMARY_DIR, help="Summary directory")
+    parser.add_argument('--model', default='llama3-70b-8192', help="Groq model to generate with")
+    parser.add_argument('--stub', action='store_true', help="Use the offline stub LLM instead of Groq")
+    args = parser.parse_args(argv)
+
+    if not args.stub and not os.environ.get("GROQ_API_KEY"):
+        print("ERROR: GROQ_API_KEY must be set to generate summaries (or use --stub)")
+        return 1
+
+    from knowledge_base import KnowledgeBase
+
+    llm = StubLLM() if args.stub else GroqLLM(model=args.model)
+    build_summaries(KnowledgeBase().snapshot(), llm, output_dir=args.output, languages=args.languages)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,525 @@
+"""
+Text-to-Speech service for chatbot answers.
+
+Holds one long-lived Google TextToSpeechClient for the whole process and
+stores audio content-addressed by a hash of the full text, the voice and
+the audio config. Identical requests map to the same file and URL, so the
+audio is synthesized once and browsers and CDNs can cache it.
+
+TTSJobQueue runs synthesis on a background worker pool so chat answers can
+be returned before their audio is ready; clients poll the job for its URL
+or stream the audio chunk by chunk while it is being synthesized.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from translation import split_text_for_translation
+
+try:
+    from google.cloud import texttospeech
+    TEXT_TO_SPEECH_AVAILABLE = True
+except ImportError:
+    texttospeech = None
+    TEXT_TO_SPEECH_AVAILABLE = False
+
+# Enhanced language map with more voice options
+VOICE_MAP = {
+    'en-US': {'language_code': 'en-US', 'name': 'en-US-Neural2-F', 'ssml_gender': 'FEMALE'},
+    'hi-IN': {'language_code': 'hi-IN', 'name': 'hi-IN-Neural2-A', 'ssml_gender': 'FEMALE'},
+    'te-IN': {'language_code': 'te-IN', 'name': 'te-IN-Standard-A', 'ssml_gender': 'FEMALE'},
+    'ta-IN': {'language_code': 'ta-IN', 'name': 'ta-IN-Standard-A', 'ssml_gender': 'FEMALE'},
+    'kn-IN': {'language_code': 'kn-IN', 'name': 'kn-IN-Standard-A', 'ssml_gender': 'FEMALE'},
+    'ml-IN': {'language_code': 'ml-IN', 'name': 'ml-IN-Standard-A', 'ssml_gender': 'FEMALE'}
+}
+
+# The API accepts up to 5000 bytes per request; smaller chunks start sooner
+MAX_CHUNK_BYTES = 1500
+
+# Texts up to this size are synthesized in one request
+SINGLE_CHUNK_BYTES = 300
+
+AUDIO_CONFIG = {
+    'audio_encoding': 'MP3',
+    'speaking_rate': 1.0,  # Normal speed
+    'pitch': 0.0,  # Default pitch
+    'volume_gain_db': 0.0  # Default volume
+}
+
+
+def select_voice(language_code):
+    """Pick voice parameters for a locale, falling back to the base language and then English"""
+    if language_code in VOICE_MAP:
+        return VOICE_MAP[language_code]
+
+    base_lang = language_code.split('-')[0]
+    for lang_key in VOICE_MAP.keys():
+        if lang_key.startswith(f"{base_lang}-"):
+            print(f"Using fallback voice {lang_key} for {language_code}")
+            return VOICE_MAP[lang_key]
+
+    print(f"No voice found for {language_code}, using English")
+    return VOICE_MAP['en-US']
+
+
+def audio_cache_key(text, voice_params, audio_config=AUDIO_CONFIG):
+    """Content address for a clip: hash of the full text, voice and audio config"""
+    payload = json.dumps(
+        {"text": text, "voice": voice_params, "audio": audio_config},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSService:
+    """
+    Synthesizes speech and stores it under audio_dir as tts_<hash>.mp3.
+
+    Keys known to be on disk are kept in a bounded in-memory index so cache
+    hits avoid touching the filesystem; files that survive a restart or were
+    written by another worker process are found through the disk tier.
+
+    Clips found in the pre-rendered audio pack are served from there and
+    never synthesized. Long texts are synthesized as sentence chunks in parallel. Every chunk is
+    cached as its own clip and the full clip is the chunks joined in order.
+    Chunks are synthesized on chunk_executor, by default a pool of chunk_workers threads.
+    """
+
+    def __init__(self, audio_dir, url_prefix='/static/tts', memory_entries=500,
+                 chunk_workers=4, max_chunk_bytes=MAX_CHUNK_BYTES, janitor=None, audio_pack=None,
+                 chunk_executor=None):
+        self.audio_dir = audio_dir
+        self.url_prefix = url_prefix
+        self.memory_entries = memory_entries
+        self.janitor = janitor
+        self.audio_pack = audio_pack
+        self.max_chunk_bytes = max_chunk_bytes
+        self.chunk_executor = chunk_executor or ThreadPoolExecutor(max_workers=chunk_workers, thread_name_prefix="tts-chunk")
+        self._inflight = {}
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._index = OrderedDict()
+        # Reentrant: submitting a chunk can finish another future inline (a
+        # bulkhead rejecting or displacing a call), whose callback takes the lock
+        self._lock = threading.RLock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.syntheses = 0
+        self.errors = 0
+        os.makedirs(audio_dir, exist_ok=True)
+
+    @property
+    def available(self):
+        return TEXT_TO_SPEECH_AVAILABLE
+
+    def get_client(self):
+        """Create the TextToSpeechClient on first use and reuse it afterwards"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = texttospeech.TextToSpeechClient()
+                    print("Initialized shared Text-to-Speech client")
+        return self._client
+
+    def file_name(self, key):
+        return f"tts_{key}.mp3"
+
+    def url_for(self, key):
+        return f"{self.url_prefix}/{self.file_name(key)}"
+
+    def path_for(self, key):
+        return os.path.join(self.audio_dir, self.file_name(key))
+
+    def local_path(self, key):
+        """Path of a clip on disk, preferring the pre-rendered audio pack"""
+        if self.audio_pack:
+            pack_path = self.audio_pack.path_for(key)
+            if pack_path:
+                return pack_path
+        return self.path_for(key)
+
+    def lookup(self, key):
+        """Return the URL of an already synthesized clip, or None"""
+        if self.audio_pack:
+            pack_url = self.audio_pack.url_for(key)
+            if pack_url:
+                return pack_url
+
+        name = self.file_name(key)
+        with self._lock:
+            hit = key in self._index
+            if hit:
+                self._index.move_to_end(key)
+                self.memory_hits += 1
+        if hit:
+            if self.janitor:
+                self.janitor.record_access(name)
+            return self.url_for(key)
+
+        # Other worker processes share the directory, so a clip this
+        # process has not indexed may still be on disk
+        on_disk = (self.janitor and self.janitor.contains(name)) or os.path.isfile(self.path_for(key))
+        if on_disk:
+            self._remember(key)
+            with self._lock:
+                self.disk_hits += 1
+            if self.janitor:
+                self.janitor.record_access(name)
+            return self.url_for(key)
+        return None
+
+    def forget(self, name):
+        """Drop a clip from the in-memory index after its file was removed"""
+        if name.startswith('tts_') and name.endswith('.mp3'):
+            with self._lock:
+                self._index.pop(name[4:-4], None)
+
+    def _remember(self, key):
+        with self._lock:
+            self._index[key] = True
+            self._index.move_to_end(key)
+            while len(self._index) > self.memory_entries:
+                self._index.popitem(last=False)
+
+    def key_for(self, text, language_code='en-US'):
+        return audio_cache_key(text, select_voice(language_code))
+
+    def plan_chunks(self, text, language_code='en-US'):
+        """
+        Split text into sentence groups for synthesis.
+
+        Returns a list of (key, chunk_text). Short texts stay in one chunk
+        whose key is the key of the whole clip. Longer texts get the first
+        sentence as its own chunk, so playback can start as soon as it is
+        ready, followed by groups of sentences under max_chunk_bytes.
+        """
+        voice_params = select_voice(language_code)
+        if len(text.encode('utf-8')) <= SINGLE_CHUNK_BYTES:
+            return [(audio_cache_key(text, voice_params), text)]
+
+        chunks = []
+        current = ""
+        for segment, separator in split_text_for_translation(text, self.max_chunk_bytes):
+            if not segment.strip():
+                continue
+            candidate = f"{current}{segment}{separator}"
+            if current and (not chunks or len(candidate.encode('utf-8')) > self.max_chunk_bytes):
+                chunks.append(current.strip())
+                current = f"{segment}{separator}"
+            else:
+                current = candidate
+        if current.strip():
+            chunks.append(current.strip())
+
+        return [(audio_cache_key(chunk, voice_params), chunk) for chunk in chunks]
+
+    def synthesize_chunks(self, text, language_code='en-US'):
+        """
+        Start synthesizing every chunk of text concurrently.
+
+        Returns one future per chunk, in order, resolving to the chunk's file
+        path or None on failure. Cached chunks resolve immediately and chunks
+        already being synthesized are shared rather than requested twice.
+        """
+        voice_params = select_voice(language_code)
+        futures = []
+        for key, chunk in self.plan_chunks(text, language_code):
+            if self.lookup(key):
+                future = Future()
+                future.set_result(self.local_path(key))
+                futures.append(future)
+                continue
+
+            submitted = False
+            with self._lock:
+                future = self._inflight.get(key)
+                if future is None:
+                    try:
+                        future = self.chunk_executor.submit(self._synthesize_chunk, key, chunk, voice_params)
+                    except Exception as e:
+                        print(f"TTS chunk not queued: {str(e)}")
+                        self.errors += 1
+                        future = Future()
+                        future.set_result(None)
+                        futures.append(future)
+                        continue
+                    self._inflight[key] = future
+                    submitted = True
+            # Outside the lock: a future that is already done runs its callback right here
+            if submitted:
+                future.add_done_callback(lambda done, key=key: self._forget_inflight(key, done))
+            futures.append(future)
+        return futures
+
+    @staticmethod
+    def chunk_path(future):
+        """Path of a synthesized chunk, or None if it failed or was dropped"""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"TTS chunk failed: {str(e)}")
+            return None
+
+    def _forget_inflight(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _synthesize_chunk(self, key, chunk, voice_params):
+        if self._synthesize_to_disk(key, chunk, voice_params):
+            return self.path_for(key)
+        return None
+
+    def stream(self, text, language_code='en-US'):
+        """Yield MP3 bytes chunk by chunk, in order, as each chunk becomes ready"""
+        for future in self.synthesize_chunks(text, language_code):
+            path = self.chunk_path(future)
+            if path is None:
+                return
+            try:
+                with open(path, "rb") as audio_file:
+                    yield audio_file.read()
+            except OSError as e:
+                print(f"TTS chunk disappeared while streaming: {str(e)}")
+                return
+
+    def synthesize(self, text, language_code='en-US'):
+        """Return a URL for speech of text in language_code, synthesizing it if needed"""
+        if not TEXT_TO_SPEECH_AVAILABLE:
+            print("Text-to-Speech is not available: the required library is not installed")
+            return None
+
+        voice_params = select_voice(language_code)
+        key = audio_cache_key(text, voice_params)
+
+        cached_url = self.lookup(key)
+        if cached_url:
+            print(f"Using cached TTS audio {self.file_name(key)}")
+            return cached_url
+
+        # If no API key is available, return None
+        if not os.getenv('GOOGLE_API_KEY'):
+            print("No Text-to-Speech API key available, skipping audio generation")
+            print("Set the GOOGLE_API_KEY environment variable to enable Text-to-Speech")
+            return None
+
+        futures = self.synthesize_chunks(text, language_code)
+        paths = [self.chunk_path(future) for future in futures]
+        if any(path is None for path in paths):
+            return None
+
+        if len(paths) > 1:
+            # MP3 frames can be concatenated directly into the full clip
+            try:
+                audio_content = b""
+                for path in paths:
+                    with open(path, "rb") as audio_file:
+                        audio_content += audio_file.read()
+                self._write_atomically(key, audio_content)
+                self._remember(key)
+            except Exception as e:
+                print(f"Error joining TTS chunks: {str(e)}")
+                return None
+
+        return self.url_for(key)
+
+    def _synthesize_to_disk(self, key, text, voice_params):
+        try:
+            try:
+                client = self.get_client()
+            except Exception as e:
+                print(f"Failed to initialize Text-to-Speech client: {str(e)}")
+                print("This may be due to authentication issues - ensure your API key is correct")
+                return False
+
+            audio_content = self._request_audio(client, text, voice_params)
+            self._write_atomically(key, audio_content)
+            self._remember(key)
+            with self._lock:
+                self.syntheses += 1
+            return True
+
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Error generating speech: {str(e)}")
+            print(traceback.format_exc())
+            return False
+
+    def _request_audio(self, client, text, voice_params):
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+
+        # Configure voice
+        voice = texttospeech.VoiceSelectionParams(
+            language_code=voice_params['language_code'],
+            name=voice_params['name'],
+            ssml_gender=getattr(texttospeech.SsmlVoiceGender, voice_params['ssml_gender'])
+        )
+
+        # Configure audio output
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=getattr(texttospeech.AudioEncoding, AUDIO_CONFIG['audio_encoding']),
+            speaking_rate=AUDIO_CONFIG['speaking_rate'],
+            pitch=AUDIO_CONFIG['pitch'],
+            volume_gain_db=AUDIO_CONFIG['volume_gain_db']
+        )
+
+        print(f"Requesting TTS for text in {voice_params['language_code']}")
+        response = client.synthesize_speech(
+            input=synthesis_input,
+            voice=voice,
+            audio_config=audio_config
+        )
+        return response.audio_content
+
+    def _write_atomically(self, key, audio_content):
+        # Write next to the final path so the rename cannot cross filesystems
+        fd, temp_path = tempfile.mkstemp(dir=self.audio_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(audio_content)
+            os.replace(temp_path, self.path_for(key))
+            if self.janitor:
+                self.janitor.record_write(self.file_name(key), len(audio_content))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                "available": TEXT_TO_SPEECH_AVAILABLE,
+                "client_initialized": self._client is not None,
+                "indexed_clips": len(self._index),
+                "chunks_in_flight": len(self._inflight),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "syntheses": self.syntheses,
+                "errors": self.errors
+            }
+
+
+class TTSJobQueue:
+    """
+    Background synthesis on a bounded worker pool.
+
+    Jobs are identified by the clip's content hash, so identical requests
+    share one job. When max_pending jobs are already waiting new requests
+    are dropped instead of queueing behind them.
+    """
+
+    def __init__(self, service, workers=2, max_pending=50, job_ttl_seconds=600):
+        self.service = service
+        self.workers = workers
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.synthesis_seconds_total = 0.0
+        self.synthesis_seconds_max = 0.0
+
+    def submit(self, text, language_code='en-US'):
+        """
+        Queue synthesis of text and return the job as a dict, or None if the
+        queue is full. Clips that already exist come back as ready jobs.
+        """
+        key = self.service.key_for(text, language_code)
+        url = self.service.lookup(key)
+        if url:
+            return {"id": key, "status": "ready", "audioUrl": url}
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job and job["status"] == "pending":
+                return dict(job)
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                print(f"TTS queue full ({self.pending} pending), dropping audio job")
+                return None
+            job = {
+                "id": key,
+                "status": "pending",
+                "audioUrl": None,
+                "text": text,
+                "language": language_code,
+                "submitted_at": time.time()
+            }
+            self._jobs[key] = job
+            self.pending += 1
+            self.submitted += 1
+
+        self.executor.submit(self._run, key, text, language_code)
+        return dict(job)
+
+    def _run(self, key, text, language_code):
+        start_time = time.time()
+        url = None
+        try:
+            url = self.service.synthesize(text, language_code)
+        finally:
+            elapsed = time.time() - start_time
+            with self._lock:
+                job = self._jobs.get(key)
+                if job is not None:
+                    job["status"] = "ready" if url else "failed"
+                    job["audioUrl"] = url
+                    job["finished_at"] = time.time()
+                self.pending -= 1
+                if url:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.synthesis_seconds_total += elapsed
+                self.synthesis_seconds_max = max(self.synthesis_seconds_max, elapsed)
+                self._prune_locked()
+            print(f"Background TTS job {key[:12]} finished in {elapsed:.2f} seconds")
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.job_ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] != "pending" and job.get("finished_at", 0) < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Current state of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+
+        # Finished jobs are pruned, but their audio may still be on disk
+        url = self.service.lookup(job_id)
+        if url:
+            return {"id": job_id, "status": "ready", "audioUrl": url}
+        return None
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "avg_synthesis_seconds": round(self.synthesis_seconds_total / finished, 3) if finished else 0.0,
+                "max_synthesis_seconds": round(self.synthesis_seconds_max, 3)
+            }
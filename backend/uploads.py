@@ -0,0 +1,238 @@
+"""
+Resumable image uploads for clients on slow or unreliable connections.
+
+A client creates an upload session with the image's size, sends the bytes
+in chunks with their offsets, and finalizes the session to run the
+prediction. Chunks are appended to a spool file and hashed as they arrive,
+so the image is never held in memory until it is finalized and its SHA-256
+is known without another pass. A chunk sent again after a lost response is
+accepted and only its missing bytes are written; a chunk past the end of
+what was received is rejected with the offset to resume from.
+
+Sessions live in this process's memory and their spool files in one
+directory; spool files left by a previous run are deleted at startup.
+Sessions idle for ttl_seconds are expired with their spool files whenever
+any session is created or looked up. An upload whose finalize failed
+max_attempts times is discarded and has to be sent again.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A request the upload session cannot accept; offset is where the client should resume"""
+
+    def __init__(self, message, status, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadSession:
+    __slots__ = ('id', 'user_id', 'language_code', 'size', 'offset', 'path', 'hasher', 'sha256',
+                 'finalized', 'attempts', 'updated_at', 'lock')
+
+    def __init__(self, user_id, language_code, size, directory):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.language_code = language_code
+        self.size = size
+        self.offset = 0
+        self.path = os.path.join(directory, f"{self.id}.part")
+        self.hasher = hashlib.sha256()
+        self.sha256 = None
+        self.finalized = False
+        self.attempts = 0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            "uploadId": self.id,
+            "size": self.size,
+            "offset": self.offset,
+            "complete": self.offset == self.size,
+            "finalized": self.finalized
+        }
+
+
+class UploadSessions:
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024, ttl_seconds=3600, max_sessions=200,
+                 max_attempts=3):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        os.makedirs(directory, exist_ok=True)
+        # Spool files of a previous run have no session to resume them
+        for name in os.listdir(directory):
+            if name.endswith('.part'):
+                os.remove(os.path.join(directory, name))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.finalized = 0
+        self.expired = 0
+        self.abandoned = 0
+        self.bytes_received = 0
+        self.bytes_resent = 0
+
+    def _remove_spool(self, session):
+        try:
+            os.remove(session.path)
+        except FileNotFoundError:
+            pass
+
+    def expire(self):
+        """Drop sessions idle for longer than ttl_seconds"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            stale = [session for session in self._sessions.values() if session.updated_at < cutoff]
+            for session in stale:
+                del self._sessions[session.id]
+                if not session.finalized:
+                    self.expired += 1
+        for session in stale:
+            with session.lock:
+                self._remove_spool(session)
+
+    def create(self, user_id, language_code, size):
+        if size <= 0:
+            raise UploadError("Upload size must be a positive number of bytes", 400)
+        if size > self.max_bytes:
+            raise UploadError(f"Images larger than {self.max_bytes} bytes are not accepted", 413)
+        self.expire()
+        session = UploadSession(user_id, language_code, size, self.directory)
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise UploadError("Too many uploads in progress. Please try again later.", 503)
+            self._sessions[session.id] = session
+            self.created += 1
+        open(session.path, 'wb').close()
+        return session
+
+    def get(self, upload_id):
+        self.expire()
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session is None:
+            raise UploadError("Upload not found or expired", 404)
+        return session
+
+    def write(self, upload_id, offset, length, stream):
+        """
+        Write length bytes read from stream at offset; returns the new offset.
+        Bytes before the session's offset were received already and are
+        skipped; if the stream breaks off, the bytes read so far are kept.
+        """
+        session = self.get(upload_id)
+        with session.lock:
+            if session.finalized:
+                raise UploadError("Upload was already finalized", 409, session.offset)
+            if offset > session.offset:
+                raise UploadError(f"Expected a chunk starting at byte {session.offset}", 409, session.offset)
+            if offset + length > session.size:
+                raise UploadError(f"Chunk ends past the upload size of {session.size} bytes", 416, session.offset)
+
+            skip = session.offset - offset
+            remaining = length
+            received = resent = 0
+            with open(session.path, 'r+b') as spool:
+                # Drop anything past the offset left by a write that failed halfway
+                spool.seek(session.offset)
+                spool.truncate()
+                try:
+                    while remaining > 0:
+                        data = stream.read(min(READ_SIZE, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        if skip:
+                            dropped = min(skip, len(data))
+                            skip -= dropped
+                            resent += dropped
+                            data = data[dropped:]
+                            if not data:
+                                continue
+                        spool.write(data)
+                        session.hasher.update(data)
+                        session.offset += len(data)
+                        received += len(data)
+                finally:
+                    spool.flush()
+                    session.updated_at = time.monotonic()
+                    with self._lock:
+                        self.bytes_received += received
+                        self.bytes_resent += resent
+            if remaining > 0:
+                raise UploadError("Chunk ended early", 400, session.offset)
+            return session.offset
+
+    def read(self, upload_id, expected_sha256=None):
+        """(session, image_bytes) of a fully received upload"""
+        session = self.get(upload_id)
+        with session.lock:
+            if session.finalized:
+                raise UploadError("Upload was already finalized", 409, session.offset)
+            if session.offset != session.size:
+                raise UploadError(
+                    f"Upload is incomplete: {session.offset} of {session.size} bytes received", 409, session.offset
+                )
+            if session.sha256 is None:
+                session.sha256 = session.hasher.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != session.sha256:
+                self.discard(upload_id)
+                raise UploadError("Uploaded image does not match its SHA-256; please upload it again", 422, 0)
+            session.updated_at = time.monotonic()
+            with open(session.path, 'rb') as spool:
+                return session, spool.read()
+
+    def finish(self, upload_id):
+        """Mark an upload as finalized and delete its spool; the session stays until it expires"""
+        session = self.get(upload_id)
+        with session.lock:
+            session.finalized = True
+            session.updated_at = time.monotonic()
+            self._remove_spool(session)
+        with self._lock:
+            self.finalized += 1
+
+    def fail(self, upload_id):
+        """Count a failed finalize; returns True when the upload was discarded for failing too often"""
+        session = self.get(upload_id)
+        with session.lock:
+            session.attempts += 1
+            exhausted = session.attempts >= self.max_attempts
+        if exhausted:
+            self.discard(upload_id)
+            with self._lock:
+                self.abandoned += 1
+        return exhausted
+
+    def discard(self, upload_id):
+        with self._lock:
+            session = self._sessions.pop(upload_id, None)
+        if session is not None:
+            self._remove_spool(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "finalized": self.finalized,
+                "expired": self.expired,
+                "abandoned": self.abandoned,
+                "max_attempts": self.max_attempts,
+                "bytes_received": self.bytes_received,
+                "bytes_resent": self.bytes_resent
+            }
@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import styled from 'styled-components';
 import axios from 'axios';
+import { waitForAudio } from '../utils/ttsJobs';
+import { getChatSessionId, saveChatSessionId } from '../utils/chatSession';
 
 // Styled components for chatbot
 const ChatbotContainer = styled.div`
@@ -38,8 +40,12 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
   const [poweredBy, setPoweredBy] = useState(null);
   const MAX_RETRIES = 2;
   const timeoutRef = useRef(null);
+  const retryTimerRef = useRef(null);
+  const retriesRef = useRef(0);
 
   useEffect(() => {
+    retriesRef.current = 0;
+
     const fetchChatbotResponse = async () => {
       try {
         setIsTranslating(true);
@@ -67,7 +73,8 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
         // Send user message to backend with timeout
         const fetchPromise = axios.post(`${backendUrl}/chatbot`, {
           message,
-          language: language || 'en-US' // Default to English if not specified
+          language: language || 'en-US', // Default to English if not specified
+          sessionId: getChatSessionId()
         });
         
         // Race between fetch and timeout
@@ -80,6 +87,7 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
         }
         
         if (result.data && result.data.response) {
+          saveChatSessionId(result.data.sessionId);
           setResponse(result.data.response);
           setError(false);
           setRetryCount(0); // Reset retry count on success
@@ -94,10 +102,27 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
             onResponse(result.data.response, result.data.audioUrl, result.data.poweredBy);
           }
           
+          // Audio is synthesized in the background. Start the progressive stream
+          // right away, then pick up the finished clip for the replay controls.
+          let audioPath = result.data.audioUrl;
+          if (!audioPath && result.data.audioStatus === 'pending') {
+            const streamPath = result.data.audioStreamUrl;
+            if (streamPath) {
+              const stream = new Audio(`${backendUrl}${streamPath}`);
+              stream.play().catch(e => console.warn('Audio playback failed:', e));
+            }
+            const finishedPath = await waitForAudio(backendUrl, result.data.audioJobId);
+            if (finishedPath && onResponse) {
+              onResponse(result.data.response, finishedPath, result.data.poweredBy);
+            }
+            if (streamPath) audioPath = null;
+            else audioPath = finishedPath;
+          }
+          
           // If audio URL is provided, play it
-          if (result.data.audioUrl) {
+          if (audioPath) {
             try {
-              const audioUrl = `${backendUrl}${result.data.audioUrl}`;
+              const audioUrl = `${backendUrl}${audioPath}`;
               console.log(`Playing audio from: ${audioUrl}`);
               const audio = new Audio(audioUrl);
               audio.play().catch(e => console.warn('Audio playback failed:', e));
@@ -120,11 +145,14 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
       setError(true);
       
       // Check if we should retry
-      if (retryCount < MAX_RETRIES) {
-        console.log(`Retrying request (${retryCount + 1}/${MAX_RETRIES})...`);
-        setRetryCount(prev => prev + 1);
-        // Retry after a delay
-        setTimeout(fetchChatbotResponse, 1000);
+      if (retriesRef.current < MAX_RETRIES) {
+        retriesRef.current += 1;
+        setRetryCount(retriesRef.current);
+        // Retry after a delay, as long as the server asks when it is rate limiting or busy
+        const retryAfter = Number(error.response?.data?.retryAfter || error.response?.headers?.['retry-after']);
+        const delay = retryAfter > 0 ? retryAfter * 1000 : 1000;
+        console.log(`Retrying request (${retriesRef.current}/${MAX_RETRIES}) in ${delay} ms...`);
+        retryTimerRef.current = setTimeout(fetchChatbotResponse, delay);
       } else {
         // No more retries, show error message
         const errorMessage = 'Sorry, I encountered an error. Please try again.';
@@ -142,8 +170,11 @@ const ChatbotMessage = ({ message, language, onResponse }) => {
       if (timeoutRef.current) {
         clearTimeout(timeoutRef.current);
       }
+      if (retryTimerRef.current) {
+        clearTimeout(retryTimerRef.current);
+      }
     };
-  }, [message, language, onResponse, retryCount]);
+  }, [message, language, onResponse]);
 
   return (
     <div style={{ color: error ? '#e74c3c' : 'inherit' }}>
@@ -107,75 +107,31 @@ const TreatmentDetails = ({ diseaseName }) => {
         const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5000';
         console.log(`Using backend URL: ${backendUrl}`);
         
-        // First try the new disease_info endpoint
-        const diseaseInfoResponse = await axios.get(`${backendUrl}/disease_info`, {
+        // One request returns the knowledge-base entry, the treatment text and,
+        // when the knowledge base has no entry, an LLM explanation
+        const bundleResponse = await axios.get(`${backendUrl}/treatment_bundle`, {
           params: { disease: normalizedDiseaseName }
         });
         
-        console.log('Disease info response:', diseaseInfoResponse.data);
+        console.log('Treatment bundle response:', bundleResponse.data);
         
-        if (diseaseInfoResponse.data.success) {
-          const diseaseInfo = diseaseInfoResponse.data.info;
-          // We got disease information, extract the treatment
-          if (diseaseInfo.treatment) {
-            setTreatment(diseaseInfo.treatment);
+        if (bundleResponse.data.success) {
+          const bundle = bundleResponse.data;
+          const bundleTreatment = (bundle.info && bundle.info.treatment) || bundle.explanation || bundle.treatment;
+          if (bundleTreatment) {
+            setTreatment(bundleTreatment);
             setDebugInfo({
-              source: 'disease_info_api',
-              disease: diseaseInfoResponse.data.disease,
-              fullInfo: diseaseInfo
+              source: bundle.info && bundle.info.treatment ? 'treatment_bundle_info'
+                : bundle.explanation ? 'treatment_bundle_explanation' : 'treatment_bundle_treatment',
+              disease: bundle.disease,
+              fullInfo: bundle.info,
+              explanationModel: bundle.explanationModel
             });
             setLoading(false);
             return;
           }
         }
         
-        // If the disease_info endpoint didn't work, try the chatbot endpoint
-        const backendResponse = await axios.post(`${backendUrl}/chatbot`, {
-          message: `What is the treatment for ${normalizedDiseaseName}?`,
-          language: 'en-US'
-        });
-        
-        console.log('Chatbot response:', backendResponse.data);
-        
-        if (backendResponse.data.success && backendResponse.data.response) {
-          // Check if the response is useful (not just a description)
-          const response = backendResponse.data.response;
-          if (response.includes("treatment") || 
-              response.includes("fungicide") || 
-              response.includes("apply") || 
-              response.includes("remove") ||
-              response.includes("control")) {
-            setTreatment(response);
-            setDebugInfo({
-              source: 'chatbot_api_direct',
-              query: `What is the treatment for ${normalizedDiseaseName}?`
-            });
-            setLoading(false);
-            return;
-          } else {
-            console.log("Chatbot response doesn't contain treatment information, trying another query");
-          }
-        }
-        
-        // Try another query format
-        const secondResponse = await axios.post(`${backendUrl}/chatbot`, {
-          message: `How to treat ${formattedDisease}?`,
-          language: 'en-US'
-        });
-        
-        console.log('Second chatbot response:', secondResponse.data);
-        
-        if (secondResponse.data.success && secondResponse.data.response &&
-            secondResponse.data.response !== backendResponse.data.response) {
-          setTreatment(secondResponse.data.response);
-          setDebugInfo({
-            source: 'chatbot_api_alternative',
-            query: `How to treat ${formattedDisease}?`
-          });
-          setLoading(false);
-          return;
-        }
-        
         // Fallback to HuggingFace if needed
         const hfToken = process.env.NEXT_PUBLIC_HF_TOKEN || '';
         
@@ -1,5 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { waitForAudio } from '../utils/ttsJobs';
+import { getChatSessionId, saveChatSessionId } from '../utils/chatSession';
 import Head from 'next/head';
 import Link from 'next/link';
 import styles from '../styles/Chatbot.module.css';
@@ -56,11 +58,13 @@ const ChatbotPage = () => {
       // Send message to backend
       const response = await axios.post('http://localhost:5000/chatbot', {
         message: userInput,
-        language: selectedLanguage
+        language: selectedLanguage,
+        sessionId: getChatSessionId()
       });
 
       // Add bot response
       if (response.data.success) {
+        saveChatSessionId(response.data.sessionId);
         const botMessage = { 
           text: response.data.response, 
           sender: 'bot',
@@ -68,9 +72,18 @@ const ChatbotPage = () => {
         };
         setMessages(prev => [...prev, botMessage]);
 
+        // Audio is synthesized in the background; wait for it if it isn't ready yet
+        let audioPath = response.data.audioUrl;
+        if (!audioPath && response.data.audioStatus === 'pending') {
+          audioPath = await waitForAudio('http://localhost:5000', response.data.audioJobId);
+          if (audioPath) {
+            setMessages(prev => prev.map(msg => msg === botMessage ? { ...msg, audioUrl: audioPath } : msg));
+          }
+        }
+
         // Play audio if available
-        if (response.data.audioUrl) {
-          audioRef.current.src = `http://localhost:5000${response.data.audioUrl}`;
+        if (audioPath) {
+          audioRef.current.src = `http://localhost:5000${audioPath}`;
           audioRef.current.play();
         }
       } else {
@@ -83,7 +96,10 @@ const ChatbotPage = () => {
     } catch (error) {
       console.error('Error sending message:', error);
       setMessages(prev => [...prev, { 
-        text: "Sorry, I couldn't connect to the server. Please try again later.", 
+        // Rate-limit and busy responses explain when to try again
+        text: [429, 503].includes(error.response?.status) && error.response.data?.error
+          ? error.response.data.error
+          : "Sorry, I couldn't connect to the server. Please try again later.", 
         sender: 'bot' 
       }]);
     }
@@ -6,6 +6,10 @@ import TreatmentDetails from '../components/TreatmentDetails';
 import Navbar from '../components/Navbar';
 import { useAuth } from '../utils/AuthContext';
 import { useRouter } from 'next/router';
+import { uploadResumable } from '../utils/resumableUpload';
+
+// Images larger than this are sent through a resumable upload session
+const RESUMABLE_UPLOAD_BYTES = 512 * 1024;
 
 export default function Home() {
   const [showChatbot, setShowChatbot] = useState(false);
@@ -16,6 +20,8 @@ export default function Home() {
   const [error, setError] = useState(null);
   const [userId, setUserId] = useState('');
   const [showLanguageModal, setShowLanguageModal] = useState(false);
+  // One Idempotency-Key per selected image, so re-analyzing after a lost response replays it
+  const idempotencyKeyRef = useRef(null);
   const { user } = useAuth();
   const router = useRouter();
   const fileInputRef = useRef(null);
@@ -60,6 +66,7 @@ export default function Home() {
   const processSelectedFile = (file) => {
     if (file) {
       setSelectedFile(file);
+      idempotencyKeyRef.current = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
       setImagePreview(URL.createObjectURL(file));
       setPrediction(null); // Reset prediction when new file is selected
       setError(null);
@@ -77,24 +84,32 @@ export default function Home() {
     setPrediction(null);
     setError(null);
 
-    // Create form data for API request
-    const formData = new FormData();
-    formData.append('image', selectedFile);
-    formData.append('user_id', userId);
-
     try {
       console.log(`Sending prediction request for user: ${userId}`);
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5000';
-      const response = await axios.post(`${backendUrl}/predict`, formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data'
-        }
-      });
+      let response;
+      if (selectedFile.size > RESUMABLE_UPLOAD_BYTES) {
+        // Large images go up in chunks, so a dropped connection resumes instead of restarting
+        response = { data: await uploadResumable(backendUrl, selectedFile, { userId }) };
+      } else {
+        // Create form data for API request
+        const formData = new FormData();
+        formData.append('image', selectedFile);
+        formData.append('user_id', userId);
+
+        response = await axios.post(`${backendUrl}/predict`, formData, {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+            'Idempotency-Key': idempotencyKeyRef.current
+          }
+        });
+      }
 
       console.log('Prediction response:', response.data);
       
       if (response.data.success) {
-        setPrediction(response.data.prediction);
+        // Degraded results come from an earlier analysis of the same image while the model is unavailable
+        setPrediction({ ...response.data.prediction, degraded: Boolean(response.data.degraded) });
       } else {
         setError(response.data.error || 'Analysis failed');
       }
@@ -205,6 +220,11 @@ export default function Home() {
                 <h3>Analysis Result:</h3>
                 <p className="disease-name">{prediction.name}</p>
                 <p className="confidence">Confidence: {prediction.value}%</p>
+                {prediction.degraded && (
+                  <p className="degraded-note">
+                    Live analysis is temporarily unavailable. This result is from an earlier analysis of the same image.
+                  </p>
+                )}
                 
                 {/* Show treatment information directly if available */}
                 {prediction.treatment && (
@@ -477,6 +497,11 @@ export default function Home() {
           font-weight: bold;
         }
         
+        .degraded-note {
+          color: #e67e22;
+          font-size: 0.9rem;
+        }
+        
         .prediction-result {
           margin-top: 1rem;
           padding: 1rem;
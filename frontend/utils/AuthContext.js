@@ -1,4 +1,5 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
+import axios from 'axios';
 import { supabase } from './supabaseClient';
 import { useRouter } from 'next/router';
 
@@ -32,6 +33,21 @@ export function AuthProvider({ children }) {
     checkSession();
   }, []);
 
+  // Send the access token with backend requests, so rate limits count per signed-in account
+  useEffect(() => {
+    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5000';
+    const interceptor = axios.interceptors.request.use(async (config) => {
+      if (config.url?.startsWith(backendUrl) && !config.headers?.Authorization) {
+        const { data: { session } } = await supabase.auth.getSession();
+        if (session?.access_token) {
+          config.headers.Authorization = `Bearer ${session.access_token}`;
+        }
+      }
+      return config;
+    });
+    return () => axios.interceptors.request.eject(interceptor);
+  }, []);
+
   // Sign up function
   const signUp = async (email, password) => {
     try {
@@ -0,0 +1,13 @@
+// The backend keeps the conversation history; the browser only remembers
+// the session id it was given, for the lifetime of the tab.
+const STORAGE_KEY = 'chatSessionId';
+
+export const getChatSessionId = () => {
+  if (typeof window === 'undefined') return null;
+  return window.sessionStorage.getItem(STORAGE_KEY);
+};
+
+export const saveChatSessionId = (sessionId) => {
+  if (typeof window === 'undefined' || !sessionId) return;
+  window.sessionStorage.setItem(STORAGE_KEY, sessionId);
+};
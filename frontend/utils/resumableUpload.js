@@ -0,0 +1,55 @@
+import axios from 'axios';
+
+const wait = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Send an image through a resumable upload session and finalize it into a prediction.
+// A failed chunk is resent from the offset the server reports, so a dropped
+// connection only costs the bytes that had not arrived yet.
+// Resolves with the same response body as POST /predict.
+export const uploadResumable = async (backendUrl, file, { userId, language, maxRetries = 5, retryDelay = 2000 } = {}) => {
+  const base = `${backendUrl}/predict/uploads`;
+  const { data: session } = await axios.post(base, { user_id: userId, language, size: file.size });
+  const uploadUrl = `${base}/${session.uploadId}`;
+  const chunkSize = session.chunkSize || 256 * 1024;
+
+  let offset = session.offset;
+  let failures = 0;
+  while (offset < file.size) {
+    const end = Math.min(offset + chunkSize, file.size);
+    try {
+      const { data } = await axios.put(uploadUrl, file.slice(offset, end), {
+        headers: {
+          'Content-Type': 'application/octet-stream',
+          'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`
+        }
+      });
+      offset = data.offset;
+      failures = 0;
+    } catch (err) {
+      const status = err.response?.status;
+      if ((status && status !== 409 && status < 500) || ++failures > maxRetries) throw err;
+      if (err.response?.data?.offset !== undefined) {
+        offset = err.response.data.offset;
+        continue;
+      }
+      await wait(retryDelay * failures);
+      try {
+        const { data } = await axios.get(uploadUrl);
+        offset = data.offset;
+      } catch (statusErr) {
+        console.warn('Could not fetch upload status, resending chunk:', statusErr);
+      }
+    }
+  }
+
+  // Finalizing again after a lost response replays the same prediction
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const { data } = await axios.post(`${uploadUrl}/finalize`, {});
+      return data;
+    } catch (err) {
+      if (err.response || attempt >= maxRetries) throw err;
+      await wait(retryDelay * (attempt + 1));
+    }
+  }
+};
@@ -0,0 +1,20 @@
+import axios from 'axios';
+
+// Poll a background TTS job until its audio is ready.
+// Resolves with the audio URL path, or null if the job failed or timed out.
+export const waitForAudio = async (backendUrl, jobId, { interval = 1000, maxAttempts = 30 } = {}) => {
+  if (!jobId) return null;
+
+  for (let attempt = 0; attempt < maxAttempts; attempt++) {
+    try {
+      const result = await axios.get(`${backendUrl}/tts/${jobId}`);
+      if (result.data.status === 'ready') return result.data.audioUrl;
+      if (result.data.status === 'failed') return null;
+    } catch (err) {
+      console.warn('Error polling audio job:', err);
+      return null;
+    }
+    await new Promise(resolve => setTimeout(resolve, interval));
+  }
+  return null;
+};